@@ -7,4 +7,18 @@ DB_CONFIG = {
     "user": "postgres",
     "password": "postgres",
     "port": "5432"
-} 
\ No newline at end of file
+} 
+
+# Connection pool configuration (see db_pool.py)
+DB_POOL_CONFIG = {
+    "minconn": 1,
+    "maxconn": 10,
+    "timeout": 30,                # seconds to wait for a free connection
+    "health_check_interval": 30   # seconds a connection may idle before it is pinged
+}
+
+# Query latency instrumentation (see db_metrics.py)
+DB_METRICS_CONFIG = {
+    "enabled": True,
+    "slow_query_ms": None         # report statements slower than this; None disables
+}
@@ -0,0 +1,286 @@
+#!/usr/bin/env python3
+
+import contextvars
+import functools
+import inspect
+import json
+import math
+import re
+import sys
+import threading
+import time
+import psycopg2.extensions
+from config import DB_METRICS_CONFIG
+
+# Histogram buckets grow by 2**(1/8), about 9%, from one microsecond, so
+# percentiles are accurate to within one bucket at any latency
+BUCKET_BASE = 2 ** (1 / 8)
+BUCKET_MIN = 1e-6
+
+# Name of the data-access method running in this thread or task
+current_operation = contextvars.ContextVar('current_operation', default=None)
+
+STATEMENT_TAG = re.compile(
+    r'\s*(?:PREPARE\s+(\w+)|(?:EXECUTE|CALL)\s+(\w+)|SELECT\b.*?\bFROM\s+(\w+)\s*\(|(\w+))',
+    re.IGNORECASE | re.DOTALL)
+
+def statement_tag(sql):
+    """Short label for a statement: the prepared statement, procedure or
+    set-returning function it runs, or else its leading keyword"""
+    match = STATEMENT_TAG.match(sql[:500])
+    if not match:
+        return 'unknown'
+    if match.group(1):
+        return f"PREPARE {match.group(1)}"
+    return match.group(2) or match.group(3) or match.group(4).upper()
+
+class LatencyHistogram:
+    """Log-bucketed latency histogram with running totals"""
+    def __init__(self):
+        self.buckets = {}
+        self.count = 0
+        self.errors = 0
+        self.rows = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, seconds, rows, failed):
+        bucket = max(0, int(math.log(max(seconds, BUCKET_MIN) / BUCKET_MIN, BUCKET_BASE)))
+        self.buckets[bucket] = self.buckets.get(bucket, 0) + 1
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+        if rows is not None and rows > 0:
+            self.rows += rows
+        if failed:
+            self.errors += 1
+
+    def percentile(self, fraction):
+        """Upper bound of the bucket holding the given fraction of calls, in seconds"""
+        rank = fraction * self.count
+        seen = 0
+        for bucket in sorted(self.buckets):
+            seen += self.buckets[bucket]
+            if seen >= rank:
+                return min(BUCKET_MIN * BUCKET_BASE ** (bucket + 1), self.max)
+        return self.max
+
+    def summary(self):
+        return {
+            'count': self.count,
+            'errors': self.errors,
+            'rows': self.rows,
+            'mean_ms': round(1000 * self.total / self.count, 3) if self.count else 0.0,
+            'p50_ms': round(1000 * self.percentile(0.50), 3),
+            'p95_ms': round(1000 * self.percentile(0.95), 3),
+            'p99_ms': round(1000 * self.percentile(0.99), 3),
+            'max_ms': round(1000 * self.max, 3),
+            'total_ms': round(1000 * self.total, 3)
+        }
+
+class LatencyRecorder:
+    """Default hook: per-statement histograms and an optional slow-query log"""
+    def __init__(self, slow_query_ms=None, slow_query_log=None):
+        self.histograms = {}
+        self.lock = threading.Lock()
+        self.slow_query_ms = slow_query_ms
+        self.slow_query_log = slow_query_log
+
+    def __call__(self, event):
+        with self.lock:
+            histogram = self.histograms.get(event['name'])
+            if histogram is None:
+                histogram = self.histograms[event['name']] = LatencyHistogram()
+            histogram.add(event['duration'], event['rows'], event['error'] is not None)
+
+        if self.slow_query_ms is not None and event['duration'] * 1000 >= self.slow_query_ms:
+            status = f" failed: {event['error']}" if event['error'] is not None else ""
+            print(f"Slow query {event['duration'] * 1000:.1f} ms in {event['name']}{status}: "
+                  f"{' '.join(event['sql'].split())[:300]}",
+                  file=self.slow_query_log or sys.stderr)
+
+    def snapshot(self):
+        with self.lock:
+            return {name: histogram.summary() for name, histogram in sorted(self.histograms.items())}
+
+    def reset(self):
+        with self.lock:
+            self.histograms = {}
+
+recorder = LatencyRecorder(DB_METRICS_CONFIG.get('slow_query_ms'))
+hooks = [recorder] if DB_METRICS_CONFIG.get('enabled', True) else []
+
+def add_hook(hook):
+    """Call hook(event) after every instrumented statement
+
+    event is a dictionary with name, sql, duration (seconds), rows
+    (cursor rowcount, None if unknown) and error (the exception or None).
+    """
+    hooks.append(hook)
+
+def remove_hook(hook):
+    """Stop calling a hook added with add_hook"""
+    hooks.remove(hook)
+
+def set_slow_query_threshold(milliseconds, log=None):
+    """Report statements slower than milliseconds to log (stderr); None turns it off"""
+    recorder.slow_query_ms = milliseconds
+    recorder.slow_query_log = log
+
+def snapshot():
+    """Return latency statistics per statement name"""
+    return recorder.snapshot()
+
+def reset():
+    """Forget all recorded latencies"""
+    recorder.reset()
+
+def dump(output=sys.stdout):
+    """Write the current snapshot as JSON to a file path or file object"""
+    data = snapshot()
+    if isinstance(output, str):
+        with open(output, 'w') as file:
+            json.dump(data, file, indent=2)
+    else:
+        json.dump(data, output, indent=2)
+        output.write("\n")
+    return data
+
+def print_report(limit=None):
+    """Print the statements that took the most total time first"""
+    stats = sorted(snapshot().items(), key=lambda item: item[1]['total_ms'], reverse=True)
+    print("{:<60} {:>8} {:>6} {:>9} {:>9} {:>9} {:>10}".format(
+        "Statement", "calls", "errors", "p50 ms", "p95 ms", "p99 ms", "total ms"))
+    print("-" * 117)
+    for name, stat in stats[:limit]:
+        print("{:<60} {:>8} {:>6} {:>9.2f} {:>9.2f} {:>9.2f} {:>10.1f}".format(
+            name[:60], stat['count'], stat['errors'], stat['p50_ms'], stat['p95_ms'],
+            stat['p99_ms'], stat['total_ms']))
+
+def emit(cur, fallback_sql, default_tag, started, error):
+    """Build the event for one statement and pass it to every hook"""
+    duration = time.perf_counter() - started
+    sql = cur.query.decode(errors='replace') if cur.query else str(fallback_sql)
+    tag = default_tag or statement_tag(sql)
+    operation = current_operation.get()
+    event = {
+        'name': f"{operation}:{tag}" if operation else tag,
+        'sql': sql,
+        'duration': duration,
+        'rows': cur.rowcount if cur.rowcount >= 0 else None,
+        'error': error
+    }
+    for hook in list(hooks):
+        try:
+            hook(event)
+        except Exception as hook_error:
+            # Instrumentation must never break the query it measures
+            print(f"Error in query instrumentation hook: {hook_error}", file=sys.stderr)
+
+class InstrumentedCursorMixin:
+    """Times every statement a cursor runs and reports it to the hooks"""
+    def execute(self, query, vars=None):
+        if not hooks:
+            return super().execute(query, vars)
+        started = time.perf_counter()
+        error = None
+        try:
+            return super().execute(query, vars)
+        except Exception as exc:
+            error = exc
+            raise
+        finally:
+            emit(self, query, None, started, error)
+
+    def executemany(self, query, vars_list):
+        if not hooks:
+            return super().executemany(query, vars_list)
+        started = time.perf_counter()
+        error = None
+        try:
+            return super().executemany(query, vars_list)
+        except Exception as exc:
+            error = exc
+            raise
+        finally:
+            emit(self, query, None, started, error)
+
+    def callproc(self, procname, parameters=None):
+        if not hooks:
+            return super().callproc(procname, parameters)
+        started = time.perf_counter()
+        error = None
+        try:
+            return super().callproc(procname, parameters)
+        except Exception as exc:
+            error = exc
+            raise
+        finally:
+            emit(self, procname, procname, started, error)
+
+    def copy_expert(self, sql, file, size=8192):
+        if not hooks:
+            return super().copy_expert(sql, file, size)
+        started = time.perf_counter()
+        error = None
+        try:
+            return super().copy_expert(sql, file, size)
+        except Exception as exc:
+            error = exc
+            raise
+        finally:
+            emit(self, sql, 'COPY', started, error)
+
+_cursor_classes = {}
+_cursor_classes_lock = threading.Lock()
+
+def instrumented_cursor(base=None):
+    """Return an instrumented subclass of a cursor class, e.g. DictCursor"""
+    base = base or psycopg2.extensions.cursor
+    with _cursor_classes_lock:
+        cls = _cursor_classes.get(base)
+        if cls is None:
+            cls = _cursor_classes[base] = type(
+                'Instrumented' + base.__name__, (InstrumentedCursorMixin, base), {})
+        return cls
+
+def instrumented(cls):
+    """Class decorator naming the statements run by each public method
+
+    Statements are recorded as '<Class>.<method>:<statement>', so the
+    snapshot shows which calls dominate, not just which SQL.
+    """
+    for attr, method in list(vars(cls).items()):
+        if attr.startswith('_') or not inspect.isfunction(method):
+            continue
+        setattr(cls, attr, _named(f"{cls.__name__}.{attr}", method))
+    return cls
+
+def _named(name, method):
+    if inspect.isgeneratorfunction(method):
+        @functools.wraps(method)
+        def generator(*args, **kwargs):
+            # Statements run while the generator resumes, not when it is created
+            gen = method(*args, **kwargs)
+            try:
+                while True:
+                    token = current_operation.set(name)
+                    try:
+                        item = next(gen)
+                    except StopIteration:
+                        return
+                    finally:
+                        current_operation.reset(token)
+                    yield item
+            finally:
+                gen.close()
+        return generator
+
+    @functools.wraps(method)
+    def wrapper(*args, **kwargs):
+        token = current_operation.set(name)
+        try:
+            return method(*args, **kwargs)
+        finally:
+            current_operation.reset(token)
+    return wrapper
@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+
+import threading
+import time
+from contextlib import contextmanager
+import psycopg2
+import psycopg2.extensions
+import psycopg2.pool
+from config import DB_CONFIG, DB_POOL_CONFIG
+from db_metrics import instrumented_cursor
+
+class PooledConnection(psycopg2.extensions.connection):
+    """Connection that remembers when it was last known to be healthy
+
+    It also tracks the names of the statements PREPAREd on it, which last
+    as long as the session does.
+    """
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.last_checked = time.monotonic()
+        self.prepared = set()
+
+class ConnectionPool:
+    """Thread-safe pool of PostgreSQL connections
+
+    Wraps psycopg2's ThreadedConnectionPool so that a checkout waits for a
+    free connection instead of failing when the pool is exhausted, and so
+    that connections which have been idle for a while are pinged before
+    they are handed out.
+    """
+    def __init__(self, minconn, maxconn, timeout=30, health_check_interval=30, **connect_kwargs):
+        self.pool = psycopg2.pool.ThreadedConnectionPool(
+            minconn, maxconn, connection_factory=PooledConnection, **connect_kwargs)
+        self.slots = threading.BoundedSemaphore(maxconn)
+        self.timeout = timeout
+        self.health_check_interval = health_check_interval
+
+    def is_healthy(self, conn):
+        """Check a connection, pinging it if it has been idle too long"""
+        if conn.closed:
+            return False
+        now = time.monotonic()
+        if now - conn.last_checked < self.health_check_interval:
+            return True
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1")
+            conn.rollback()
+            conn.last_checked = now
+            return True
+        except psycopg2.Error:
+            return False
+
+    def getconn(self):
+        """Check out a healthy connection, waiting up to timeout seconds"""
+        if not self.slots.acquire(timeout=self.timeout):
+            raise psycopg2.pool.PoolError("Timed out waiting for a database connection")
+        try:
+            conn = self.pool.getconn()
+            if not self.is_healthy(conn):
+                self.pool.putconn(conn, close=True)
+                conn = self.pool.getconn()
+            return conn
+        except Exception:
+            self.slots.release()
+            raise
+
+    def putconn(self, conn):
+        """Return a connection to the pool; broken connections are discarded"""
+        try:
+            if not conn.closed:
+                conn.last_checked = time.monotonic()
+            self.pool.putconn(conn, close=bool(conn.closed))
+        finally:
+            self.slots.release()
+
+    def closeall(self):
+        """Close every connection in the pool"""
+        self.pool.closeall()
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def get_pool():
+    """Return the process-wide connection pool, creating it on first use"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ConnectionPool(**DB_POOL_CONFIG, **DB_CONFIG)
+        return _pool
+
+def close_pool():
+    """Close the process-wide connection pool"""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.closeall()
+            _pool = None
+
+@contextmanager
+def connection():
+    """Check out a connection from the shared pool for the duration of a block"""
+    pool = get_pool()
+    conn = pool.getconn()
+    try:
+        yield conn
+    finally:
+        pool.putconn(conn)
+
+@contextmanager
+def transaction(cursor_factory=None, name=None):
+    """Yield a cursor on a pooled connection inside one transaction
+
+    The transaction is committed when the block exits normally and rolled
+    back if it raises. Passing a name opens a server-side cursor, which
+    fetches rows in batches of cur.itersize as they are iterated. Every
+    statement run on the cursor is timed by db_metrics.
+    """
+    with connection() as conn:
+        cur = conn.cursor(name=name, cursor_factory=instrumented_cursor(cursor_factory))
+        try:
+            yield cur
+            # Close first: a server-side cursor does not outlive its transaction
+            cur.close()
+            conn.commit()
+        except BaseException:
+            if not conn.closed:
+                conn.rollback()
+            raise
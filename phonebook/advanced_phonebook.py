@@ -3,21 +3,37 @@
 import psycopg2
 import psycopg2.extras
 import sys
+import base64
+import json
 import pandas as pd
 import re
 sys.path.append("..")
-from config import DB_CONFIG
+from db_pool import connection, transaction, close_pool
+from db_metrics import instrumented
+from phone_utils import normalize_phone
+from prepared_statements import execute_prepared
+from buffered_writer import BufferedContactWriter
+from contact_autocomplete import ContactAutocomplete, load_autocomplete
 
+@instrumented
 class AdvancedPhoneBook:
-    def __init__(self):
-        self.conn = None
-        self.cur = None
+    """Contacts data access through the database functions
+    
+    Every call checks out its own connection from the shared pool in
+    db_pool, so one instance can be used from several threads at once.
+    
+    Pass a ContactCache to serve repeated searches from memory; see
+    PhoneBook for how it is kept fresh, and likewise a ContactAutocomplete.
+    """
+    def __init__(self, cache=None, autocomplete=None):
+        self.cache = cache
+        self.autocomplete = autocomplete
         
     def connect(self):
         """Connect to the PostgreSQL database server"""
         try:
-            self.conn = psycopg2.connect(**DB_CONFIG)
-            self.cur = self.conn.cursor(cursor_factory=psycopg2.extras.DictCursor)
+            with connection():
+                pass
             print("Connected to the database")
             return True
         except (Exception, psycopg2.DatabaseError) as error:
@@ -25,19 +41,56 @@ class AdvancedPhoneBook:
             return False
             
     def disconnect(self):
-        """Close database connection"""
-        if self.cur is not None:
-            self.cur.close()
-        if self.conn is not None:
-            self.conn.close()
-            print("Database connection closed.")
+        """Close the shared connection pool"""
+        close_pool()
+        print("Database connection closed.")
+
+    def invalidate(self, first_names=(), phones=()):
+        """Pass the contact keys a committed write touched to the cache and
+        the autocomplete index"""
+        if self.cache:
+            self.cache.invalidate(first_names=first_names, phones=phones)
+        if self.autocomplete:
+            self.autocomplete.invalidate(first_names=first_names, phones=phones)
+
+    def search_by_pattern(self, pattern, limit=None):
+        """Search contacts based on a pattern using the database function
+        
+        Uses the trigram-indexed search, so results come back ordered by
+        similarity to the pattern; on a server without pg_trgm they are
+        found with plain ILIKE, exact phone and prefix matches first.
+        limit caps the number of results. A pattern shorter than 3
+        characters finds nothing, since it would rank most of the table.
+        """
+        def load():
+            with transaction(psycopg2.extras.DictCursor) as cur:
+                cur.callproc('search_contacts_indexed', [pattern, limit])
+                return cur.fetchall()
+        
+        try:
+            if self.cache:
+                return self.cache.get_or_load(('search', pattern, limit), load)
+            return load()
+        except (Exception, psycopg2.DatabaseError) as error:
+            print(f"Error searching contacts: {error}")
+            return []
             
-    def search_by_pattern(self, pattern):
-        """Search contacts based on a pattern using the database function"""
+    def search_fulltext(self, query, limit=20):
+        """Search contacts by words in their names and email
+        
+        Every word must start a word of the first name, last name or email,
+        in any order, so 'john smith gmail' finds john.smith@gmail.com.
+        Results come back most relevant first, with a rank column.
+        """
+        def load():
+            with transaction(psycopg2.extras.DictCursor) as cur:
+                cur.callproc('search_contacts_fulltext', [query, limit])
+                return cur.fetchall()
+        
         try:
-            self.cur.callproc('search_contacts_by_pattern', [pattern])
-            rows = self.cur.fetchall()
-            return rows
+            if self.cache:
+                return self.cache.get_or_load(('fulltext', query, limit), load)
+            return load()
         except (Exception, psycopg2.DatabaseError) as error:
             print(f"Error searching contacts: {error}")
             return []
@@ -45,18 +98,33 @@ class AdvancedPhoneBook:
     def upsert_contact(self, first_name, last_name, phone, email=None):
         """Insert a new contact or update if exists using the stored procedure"""
         try:
-            # Call the stored procedure
-            self.cur.execute(
-                "CALL upsert_contact(%s, %s, %s, %s)",
-                (first_name, last_name, phone, email)
-            )
-            self.conn.commit()
+            with transaction() as cur:
+                old_phones = []
+                if self.cache or self.autocomplete:
+                    cur.execute(
+                        "SELECT phone_normalized FROM contacts WHERE first_name = %s AND last_name IS NOT DISTINCT FROM %s",
+                        (first_name, last_name)
+                    )
+                    old_phones = [row[0] for row in cur.fetchall()]
+                cur.execute(
+                    "CALL upsert_contact(%s, %s, %s, %s)",
+                    (first_name, last_name, phone, email)
+                )
+            self.invalidate(first_names=[first_name], phones=[normalize_phone(phone)] + old_phones)
             return True
         except (Exception, psycopg2.DatabaseError) as error:
-            self.conn.rollback()
             print(f"Error upserting contact: {error}")
             return False
             
+    def buffered_writer(self, **options):
+        """Return a write-behind writer for adding many contacts
+        
+        Use it as a context manager and call insert() or upsert() on it;
+        contacts are written in batches instead of one commit per call.
+        Options are passed to BufferedContactWriter.
+        """
+        return BufferedContactWriter(cache=self.cache, autocomplete=self.autocomplete, **options)
+        
     def is_valid_phone(self, phone):
         """Validate phone number format using regex"""
         # Phone should start with optional + and have 10-15 digits
@@ -66,11 +134,15 @@ class AdvancedPhoneBook:
     def insert_multiple_contacts(self, contact_list):
         """Insert multiple contacts with validation
         
+        All contacts are validated and upserted by a single call to the
+        insert_multiple_contacts database function.
+        
         Args:
             contact_list: List of tuples (first_name, last_name, phone, email)
         
         Returns:
-            List of dictionaries with results
+            List of dictionaries with results, one per contact, with status
+            'Inserted', 'Updated' or 'Invalid phone number'
         """
         # Extract data into separate lists
         first_names = []
@@ -79,101 +151,158 @@ class AdvancedPhoneBook:
         emails = []
         
         for contact in contact_list:
-            first_name, last_name, phone = contact[0], contact[1], contact[2]
-            email = contact[3] if len(contact) > 3 else None
+            first_names.append(contact[0])
+            last_names.append(contact[1])
+            phones.append(contact[2])
+            emails.append(contact[3] if len(contact) > 3 else None)
             
-            first_names.append(first_name)
-            last_names.append(last_name)
-            phones.append(phone)
-            if email:
-                emails.append(email)
-                
-        results = []
-        
-        # Validate locally first
-        validation_results = []
-        for i, phone in enumerate(phones):
-            result = {
-                'first_name': first_names[i],
-                'last_name': last_names[i],
-                'phone': phone
-            }
-            
-            if not self.is_valid_phone(phone):
-                result['status'] = 'Invalid phone number'
-                validation_results.append(result)
-                
-        if validation_results:
-            print("Found invalid phone numbers:")
-            for result in validation_results:
-                print(f"  {result['first_name']} {result['last_name']}: {result['phone']} - {result['status']}")
-            return validation_results
-            
-        # All phones are valid, proceed with database insertion
         try:
-            # Use batch processing
-            for i in range(len(first_names)):
-                first_name, last_name, phone = first_names[i], last_names[i], phones[i]
-                email = emails[i] if i < len(emails) else None
-                
-                # Check if contact exists
-                self.cur.execute(
-                    "SELECT EXISTS(SELECT 1 FROM contacts WHERE first_name = %s AND last_name = %s)",
-                    (first_name, last_name)
+            with transaction(psycopg2.extras.DictCursor) as cur:
+                old_phones = []
+                if self.cache or self.autocomplete:
+                    # Updated contacts drop their old phone from the cache too
+                    cur.execute("SELECT phone_normalized FROM contacts WHERE first_name = ANY(%s)", (first_names,))
+                    old_phones = [row[0] for row in cur.fetchall()]
+                cur.execute(
+                    """
+                    SELECT first_name, last_name, phone, status
+                    FROM insert_multiple_contacts(%s::varchar[], %s::varchar[], %s::varchar[], %s::varchar[])
+                    """,
+                    (first_names, last_names, phones, emails)
                 )
-                exists = self.cur.fetchone()[0]
-                
-                if exists:
-                    # Update
-                    self.cur.execute(
-                        "UPDATE contacts SET phone = %s, email = COALESCE(%s, email) WHERE first_name = %s AND last_name = %s",
-                        (phone, email, first_name, last_name)
-                    )
-                    status = "Updated"
-                else:
-                    # Insert
-                    self.cur.execute(
-                        "INSERT INTO contacts (first_name, last_name, phone, email) VALUES (%s, %s, %s, %s)",
-                        (first_name, last_name, phone, email)
-                    )
-                    status = "Inserted"
-                    
-                results.append({
-                    'first_name': first_name,
-                    'last_name': last_name,
-                    'phone': phone,
-                    'status': status
-                })
-                
-            self.conn.commit()
+                results = [dict(row) for row in cur.fetchall()]
+            self.invalidate(
+                first_names=first_names, phones=[normalize_phone(phone) for phone in phones] + old_phones)
             return results
             
         except (Exception, psycopg2.DatabaseError) as error:
-            self.conn.rollback()
             print(f"Error inserting multiple contacts: {error}")
             return []
             
     def get_contacts_paginated(self, limit=10, offset=0):
         """Get contacts with pagination using the database function"""
         try:
-            self.cur.callproc('get_contacts_paginated', [limit, offset])
-            rows = self.cur.fetchall()
+            with transaction(psycopg2.extras.DictCursor) as cur:
+                execute_prepared(cur, 'get_contacts_paginated', (limit, offset))
+                rows = cur.fetchall()
             return rows
         except (Exception, psycopg2.DatabaseError) as error:
             print(f"Error getting paginated contacts: {error}")
             return []
             
+    def encode_cursor(self, sort, contact):
+        """Build an opaque pagination cursor pointing after the given contact"""
+        key = [contact['id']]
+        if sort == 'name':
+            key += [contact['last_name'], contact['first_name']]
+        payload = json.dumps({'sort': sort, 'key': key}).encode()
+        return base64.urlsafe_b64encode(payload).decode()
+        
+    def decode_cursor(self, cursor):
+        """Return (sort, key) from a cursor built by encode_cursor"""
+        try:
+            payload = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+            return payload['sort'], payload['key']
+        except (ValueError, KeyError, TypeError):
+            raise ValueError("Invalid pagination cursor")
+            
+    def get_contacts_keyset(self, limit=10, cursor=None, sort='id'):
+        """Get a page of contacts with keyset pagination
+        
+        Every page costs the same as the first, no matter how deep.
+        
+        Args:
+            limit: Number of contacts per page, at least 1
+            cursor: Cursor returned with the previous page, None for the first page
+            sort: 'id' or 'name' (last name, first name); ignored when a
+                cursor is given, since the cursor carries its own sort order
+        
+        Returns:
+            Tuple (contacts, next_cursor); next_cursor is None on the last page
+        """
+        if limit < 1:
+            raise ValueError("Page size must be at least 1")
+        after = [None, None, None]
+        if cursor:
+            sort, key = self.decode_cursor(cursor)
+            after[:len(key)] = key
+        if sort not in ('id', 'name'):
+            raise ValueError(f"Unsupported sort order: {sort}")
+            
+        try:
+            with transaction(psycopg2.extras.DictCursor) as cur:
+                cur.callproc('get_contacts_keyset', [limit, sort] + after)
+                rows = cur.fetchall()
+        except (Exception, psycopg2.DatabaseError) as error:
+            print(f"Error getting paginated contacts: {error}")
+            return [], None
+            
+        next_cursor = self.encode_cursor(sort, rows[-1]) if len(rows) == limit else None
+        return rows, next_cursor
+            
     def delete_contact_by_identifier(self, identifier):
-        """Delete contact by username or phone using the stored procedure"""
+        """Delete contact by username or phone using the stored procedure
+        
+        Phone numbers match however they are formatted.
+        """
         try:
-            self.cur.execute("CALL delete_contact_by_identifier(%s)", (identifier,))
-            self.conn.commit()
+            with transaction() as cur:
+                deleted = []
+                if self.cache or self.autocomplete:
+                    cur.execute(
+                        """
+                        SELECT first_name, phone_normalized FROM contacts
+                        WHERE first_name = %s OR phone_normalized = normalize_phone(%s)
+                        FOR UPDATE
+                        """,
+                        (identifier, identifier)
+                    )
+                    deleted = cur.fetchall()
+                cur.execute("CALL delete_contact_by_identifier(%s)", (identifier,))
+            self.invalidate(
+                first_names=[row[0] for row in deleted],
+                phones=[row[1] for row in deleted]
+            )
             return True
         except (Exception, psycopg2.DatabaseError) as error:
-            self.conn.rollback()
             print(f"Error deleting contact: {error}")
             return False
             
+    def delete_contacts_by_identifiers(self, identifiers):
+        """Delete contacts for many usernames or phones using the database function
+        
+        Everything is deleted by one statement in one transaction.
+        
+        Returns:
+            Dictionary of identifier: number of contacts deleted, or None
+            if the batch failed and nothing was deleted
+        """
+        identifiers = list(identifiers)
+        try:
+            with transaction() as cur:
+                deleted = []
+                if self.cache or self.autocomplete:
+                    cur.execute(
+                        """
+                        SELECT first_name, phone_normalized FROM contacts
+                        WHERE first_name = ANY(%s)
+                           OR phone_normalized = ANY(ARRAY(SELECT normalize_phone(i) FROM unnest(%s::varchar[]) i))
+                        FOR UPDATE
+                        """,
+                        (identifiers, identifiers)
+                    )
+                    deleted = cur.fetchall()
+                cur.callproc('delete_contacts_by_identifiers', [identifiers])
+                counts = dict(cur.fetchall())
+            self.invalidate(
+                first_names=[row[0] for row in deleted],
+                phones=[row[1] for row in deleted]
+            )
+            return counts
+        except (Exception, psycopg2.DatabaseError) as error:
+            print(f"Error deleting contacts: {error}")
+            return None
+            
     def print_contacts(self, contacts):
         """Pretty print contacts list"""
         if not contacts:
@@ -195,9 +324,10 @@ class AdvancedPhoneBook:
                 contact['created_at'].strftime('%Y-%m-%d %H:%M:%S') if contact['created_at'] else ''))
 
 def main():
-    phonebook = AdvancedPhoneBook()
+    phonebook = AdvancedPhoneBook(autocomplete=ContactAutocomplete())
     if not phonebook.connect():
         return
+    load_autocomplete(phonebook.autocomplete)
     
     while True:
         print("\nAdvanced PhoneBook Application")
@@ -206,14 +336,19 @@ def main():
         print("3. Add multiple contacts")
         print("4. List contacts (paginated)")
         print("5. Delete contact by identifier")
+        print("6. Full-text search")
         print("0. Exit")
         
-        choice = input("\nEnter your choice (0-5): ")
+        choice = input("\nEnter your choice (0-6): ")
         
         if choice == '1':
             pattern = input("Enter search pattern (part of name, phone, etc.): ")
-            contacts = phonebook.search_by_pattern(pattern)
-            phonebook.print_contacts(contacts)
+            try:
+                limit = int(input("Maximum number of results (press Enter for all): ") or 0) or None
+                contacts = phonebook.search_by_pattern(pattern, limit)
+                phonebook.print_contacts(contacts)
+            except ValueError:
+                print("Invalid input. Please enter a valid number.")
             
         elif choice == '2':
             first_name = input("Enter first name: ")
@@ -255,22 +390,37 @@ def main():
         elif choice == '4':
             try:
                 limit = int(input("Enter number of records per page (default 10): ") or 10)
-                page = int(input("Enter page number (starting from 1): ") or 1)
+                sort = input("Sort by id or name (default id): ").strip().lower() or 'id'
                 
-                offset = (page - 1) * limit
-                contacts = phonebook.get_contacts_paginated(limit, offset)
+                page = 1
+                contacts, cursor = phonebook.get_contacts_keyset(limit, sort=sort)
+                while True:
+                    phonebook.print_contacts(contacts)
+                    print(f"\nShowing page {page} with {limit} records per page.")
+                    if cursor is None:
+                        break
+                    if input("Press Enter for the next page or 'q' to stop: ").strip().lower() == 'q':
+                        break
+                    page += 1
+                    contacts, cursor = phonebook.get_contacts_keyset(limit, cursor)
                 
-                phonebook.print_contacts(contacts)
-                print(f"\nShowing page {page} with {limit} records per page.")
-                
-            except ValueError:
-                print("Invalid input. Please enter valid numbers.")
+            except ValueError as error:
+                print(f"Invalid input: {error}")
                 
         elif choice == '5':
             identifier = input("Enter first name or phone number to delete: ")
             if phonebook.delete_contact_by_identifier(identifier):
                 print(f"Contacts with identifier '{identifier}' deleted.")
                 
+        elif choice == '6':
+            query = input("Enter words to search for (names, email): ")
+            try:
+                limit = int(input("Maximum number of results (default 20): ") or 20)
+                contacts = phonebook.search_fulltext(query, limit)
+                phonebook.print_contacts(contacts)
+            except ValueError:
+                print("Invalid input. Please enter a valid number.")
+                
         elif choice == '0':
             break
             
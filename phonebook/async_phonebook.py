@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+
+import asyncio
+import asyncpg
+import sys
+sys.path.append("..")
+from config import DB_CONFIG, DB_POOL_CONFIG
+from advanced_phonebook import AdvancedPhoneBook
+
+class AsyncPhoneBook:
+    """Asyncio counterpart of AdvancedPhoneBook
+
+    Every method is a coroutine running on its own connection from an
+    asyncpg pool, so independent queries can be awaited concurrently
+    (see gather). Results have the same columns as the sync class and
+    support the same row['column'] access.
+    """
+    # Pure helpers shared with the sync class
+    is_valid_phone = AdvancedPhoneBook.is_valid_phone
+    encode_cursor = AdvancedPhoneBook.encode_cursor
+    decode_cursor = AdvancedPhoneBook.decode_cursor
+    print_contacts = AdvancedPhoneBook.print_contacts
+
+    def __init__(self):
+        self.pool = None
+
+    async def connect(self):
+        """Create the async connection pool"""
+        try:
+            self.pool = await asyncpg.create_pool(
+                host=DB_CONFIG['host'],
+                port=int(DB_CONFIG['port']),
+                database=DB_CONFIG['database'],
+                user=DB_CONFIG['user'],
+                password=DB_CONFIG['password'],
+                min_size=DB_POOL_CONFIG['minconn'],
+                max_size=DB_POOL_CONFIG['maxconn']
+            )
+            print("Connected to the database")
+            return True
+        except (Exception, asyncpg.PostgresError) as error:
+            print(f"Error connecting to the database: {error}")
+            return False
+
+    async def disconnect(self):
+        """Close the async connection pool"""
+        if self.pool is not None:
+            await self.pool.close()
+            self.pool = None
+            print("Database connection closed.")
+
+    async def gather(self, *coroutines):
+        """Run independent queries concurrently and return their results in order"""
+        return await asyncio.gather(*coroutines)
+
+    async def search_by_pattern(self, pattern, limit=None):
+        """Search contacts based on a pattern using the database function"""
+        try:
+            return await self.pool.fetch(
+                "SELECT * FROM search_contacts_indexed($1, $2)", pattern, limit)
+        except (Exception, asyncpg.PostgresError) as error:
+            print(f"Error searching contacts: {error}")
+            return []
+
+    async def search_fulltext(self, query, limit=20):
+        """Search contacts by words in their names and email, most relevant first"""
+        try:
+            return await self.pool.fetch(
+                "SELECT * FROM search_contacts_fulltext($1, $2)", query, limit)
+        except (Exception, asyncpg.PostgresError) as error:
+            print(f"Error searching contacts: {error}")
+            return []
+
+    async def upsert_contact(self, first_name, last_name, phone, email=None):
+        """Insert a new contact or update if exists using the stored procedure"""
+        try:
+            await self.pool.execute(
+                "CALL upsert_contact($1, $2, $3, $4)",
+                first_name, last_name, phone, email
+            )
+            return True
+        except (Exception, asyncpg.PostgresError) as error:
+            print(f"Error upserting contact: {error}")
+            return False
+
+    async def insert_multiple_contacts(self, contact_list):
+        """Insert multiple contacts with validation
+
+        Args:
+            contact_list: List of tuples (first_name, last_name, phone, email)
+
+        Returns:
+            List of dictionaries with results, one per contact
+        """
+        first_names = [contact[0] for contact in contact_list]
+        last_names = [contact[1] for contact in contact_list]
+        phones = [contact[2] for contact in contact_list]
+        emails = [contact[3] if len(contact) > 3 else None for contact in contact_list]
+
+        try:
+            rows = await self.pool.fetch(
+                """
+                SELECT first_name, last_name, phone, status
+                FROM insert_multiple_contacts($1::varchar[], $2::varchar[], $3::varchar[], $4::varchar[])
+                """,
+                first_names, last_names, phones, emails
+            )
+            return [dict(row) for row in rows]
+        except (Exception, asyncpg.PostgresError) as error:
+            print(f"Error inserting multiple contacts: {error}")
+            return []
+
+    async def get_contacts_paginated(self, limit=10, offset=0):
+        """Get contacts with pagination using the database function"""
+        try:
+            return await self.pool.fetch(
+                "SELECT * FROM get_contacts_paginated($1, $2)", limit, offset)
+        except (Exception, asyncpg.PostgresError) as error:
+            print(f"Error getting paginated contacts: {error}")
+            return []
+
+    async def get_contacts_keyset(self, limit=10, cursor=None, sort='id'):
+        """Get a page of contacts with keyset pagination
+
+        Returns:
+            Tuple (contacts, next_cursor); next_cursor is None on the last page
+        """
+        if limit < 1:
+            raise ValueError("Page size must be at least 1")
+        after = [None, None, None]
+        if cursor:
+            sort, key = self.decode_cursor(cursor)
+            after[:len(key)] = key
+        if sort not in ('id', 'name'):
+            raise ValueError(f"Unsupported sort order: {sort}")
+
+        try:
+            rows = await self.pool.fetch(
+                "SELECT * FROM get_contacts_keyset($1, $2, $3, $4, $5)", limit, sort, *after)
+        except (Exception, asyncpg.PostgresError) as error:
+            print(f"Error getting paginated contacts: {error}")
+            return [], None
+
+        next_cursor = self.encode_cursor(sort, rows[-1]) if len(rows) == limit else None
+        return rows, next_cursor
+
+    async def delete_contact_by_identifier(self, identifier):
+        """Delete contact by username or phone using the stored procedure"""
+        try:
+            await self.pool.execute("CALL delete_contact_by_identifier($1)", identifier)
+            return True
+        except (Exception, asyncpg.PostgresError) as error:
+            print(f"Error deleting contact: {error}")
+            return False
+
+    async def delete_contacts_by_identifiers(self, identifiers):
+        """Delete contacts for many usernames or phones using the database function"""
+        try:
+            rows = await self.pool.fetch(
+                "SELECT * FROM delete_contacts_by_identifiers($1)", list(identifiers))
+            return {row['identifier']: row['deleted_count'] for row in rows}
+        except (Exception, asyncpg.PostgresError) as error:
+            print(f"Error deleting contacts: {error}")
+            return None
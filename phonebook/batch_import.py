@@ -1,105 +1,493 @@
 #!/usr/bin/env python3
 
+import argparse
+import csv
+import io
+import multiprocessing
+import os
+import uuid
 import pandas as pd
 import psycopg2
 import psycopg2.extras
+from psycopg2 import sql
 import sys
+import time
 sys.path.append("..")
 from config import DB_CONFIG
+from db_metrics import instrumented_cursor
+from db_pool import get_pool
+from phone_utils import is_valid_phone
 
-def import_from_csv(file_path):
-    """Import contacts from CSV using stored procedures"""
+CONTACT_COLUMNS = ('first_name', 'last_name', 'phone', 'email')
+DEFAULT_CHUNK_SIZE = 10000
+DEFAULT_WORKERS = os.cpu_count() or 1
+
+# Every import path trims these from each field and treats a field left
+# empty as a missing value, so a file gives the same rows whichever is used
+FIELD_WHITESPACE = ' \t\r\n'
+
+# contacts_staging with its fields cleaned as clean_field does; run with
+# {'whitespace': FIELD_WHITESPACE}
+STAGED_CONTACTS = "(SELECT line_no, {} FROM contacts_staging) staged".format(", ".join(
+    f"NULLIF(btrim({column}, %(whitespace)s), '') AS {column}" for column in CONTACT_COLUMNS))
+
+def clean_field(value):
+    """Trim a CSV field, returning None for a missing or empty one"""
+    if value is None:
+        return None
+    return value.strip(FIELD_WHITESPACE) or None
+
+def print_invalid_records(invalid_records):
+    """Pretty print records rejected during import"""
+    print("\nInvalid Records:")
+    print("{:<15} {:<15} {:<20} {:<30} {:<30}".format(
+        "First Name", "Last Name", "Phone", "Email", "Reason"))
+    print("-" * 110)
+    
+    for record in invalid_records:
+        print("{:<15} {:<15} {:<20} {:<30} {:<30}".format(
+            record['first_name'] or '', 
+            record['last_name'] or '', 
+            record['phone'] or '', 
+            record['email'] or '', 
+            record['reason']))
+
+def read_csv_chunks(file_path, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Read a contacts CSV file lazily, chunk_size rows at a time
+    
+    Yields lists of (first_name, last_name, phone, email) tuples with fields
+    cleaned by clean_field, so only one chunk is ever held in memory.
+    """
+    # keep_default_na=False: a field reading 'NA' or 'null' is kept as text,
+    # as COPY and the csv module do
+    for chunk in pd.read_csv(file_path, chunksize=chunk_size, dtype=str, keep_default_na=False):
+        # Short rows still read as NaN
+        chunk = chunk.astype(object).where(chunk.notna(), None)
+        emails = chunk['email'] if 'email' in chunk else [None] * len(chunk)
+        yield [tuple(clean_field(value) for value in row)
+               for row in zip(chunk['first_name'], chunk['last_name'], chunk['phone'], emails)]
+
+def print_progress(rows_done, started):
+    """Print an in-place progress line with the current throughput"""
+    elapsed = time.perf_counter() - started
+    rate = rows_done / elapsed if elapsed > 0 else 0
+    print(f"\rProcessed {rows_done} rows ({rate:,.0f} rows/sec)", end="", flush=True)
+
+def import_from_csv(file_path, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Import contacts from CSV using stored procedures
+    
+    The file is streamed chunk_size rows at a time: each chunk is validated
+    and upserted by a single insert_multiple_contacts call before the next
+    one is read, so memory use does not grow with the size of the file.
+    Each chunk is committed on its own.
+    
+    Returns True if the import ran to the end, False if it failed.
+    """
     conn = None
+    cur = None
     try:
-        # Read the CSV file
-        print(f"Reading contacts from {file_path}...")
-        df = pd.read_csv(file_path)
-        print(f"Found {len(df)} contacts in CSV file.")
-        
         # Connect to the database
         print("Connecting to the database...")
-        conn = psycopg2.connect(**DB_CONFIG)
-        cur = conn.cursor(cursor_factory=psycopg2.extras.DictCursor)
+        conn = get_pool().getconn()
+        cur = conn.cursor(cursor_factory=instrumented_cursor(psycopg2.extras.DictCursor))
         
-        # Validate phone numbers
-        print("Validating phone numbers...")
-        invalid_records = []
-        valid_records = []
-        
-        for index, row in df.iterrows():
-            first_name = row['first_name']
-            last_name = row['last_name']
-            phone = row['phone']
-            email = row['email'] if 'email' in row and pd.notna(row['email']) else None
+        print(f"Reading contacts from {file_path} in chunks of {chunk_size} rows...")
+        total_count = 0
+        valid_count = 0
+        invalid_count = 0
+        started = time.perf_counter()
+        
+        for records in read_csv_chunks(file_path, chunk_size):
+            # Validate and upsert the whole chunk with one set-based call
+            first_names, last_names, phones, emails = (list(column) for column in zip(*records))
+            cur.execute(
+                """
+                SELECT first_name, last_name, phone, status
+                FROM insert_multiple_contacts(%s::varchar[], %s::varchar[], %s::varchar[], %s::varchar[])
+                """,
+                (first_names, last_names, phones, emails)
+            )
             
-            # Check if phone number is valid using the database function
-            cur.execute("SELECT is_valid_phone(%s) AS is_valid", (phone,))
-            is_valid = cur.fetchone()['is_valid']
+            invalid_records = []
+            chunk_valid = 0
+            for record, row in zip(records, cur.fetchall()):
+                if row['status'] == 'Invalid phone number':
+                    first_name, last_name, phone, email = record
+                    invalid_records.append({
+                        'first_name': first_name,
+                        'last_name': last_name,
+                        'phone': phone,
+                        'email': email,
+                        'reason': 'Invalid phone number format'
+                    })
+                else:
+                    chunk_valid += 1
+            conn.commit()
             
-            if is_valid:
-                valid_records.append((first_name, last_name, phone, email))
-            else:
-                invalid_records.append({
-                    'first_name': first_name,
-                    'last_name': last_name,
-                    'phone': phone,
-                    'email': email,
-                    'reason': 'Invalid phone number format'
-                })
-        
-        # Print invalid records
-        if invalid_records:
-            print("\nInvalid Records:")
-            print("{:<15} {:<15} {:<20} {:<30} {:<30}".format(
-                "First Name", "Last Name", "Phone", "Email", "Reason"))
-            print("-" * 110)
+            if invalid_records:
+                print()
+                print_invalid_records(invalid_records)
             
-            for record in invalid_records:
-                print("{:<15} {:<15} {:<20} {:<30} {:<30}".format(
-                    record['first_name'], 
-                    record['last_name'], 
-                    record['phone'], 
-                    record['email'] or '', 
-                    record['reason']))
-        
-        # Insert valid records
-        if valid_records:
-            print(f"\nInserting {len(valid_records)} valid contacts...")
+            total_count += len(records)
+            valid_count += chunk_valid
+            invalid_count += len(invalid_records)
+            print_progress(total_count, started)
+        
+        print()
+        if valid_count:
+            print("Contacts imported successfully!")
+        else:
+            print("No valid contacts to import.")
+        
+        # Summary
+        print("\nImport Summary:")
+        print(f"Total records: {total_count}")
+        print(f"Valid records: {valid_count}")
+        print(f"Invalid records: {invalid_count}")
+        return True
+        
+    except Exception as error:
+        print(f"Error: {error}")
+        if conn:
+            conn.rollback()
+        return False
+    finally:
+        if conn:
+            if cur:
+                cur.close()
+            get_pool().putconn(conn)
+            print("Database connection released.")
+
+def import_from_csv_bulk(file_path):
+    """Import contacts from CSV with COPY and set-based validation and merge
+    
+    The file is streamed into a temporary staging table with COPY FROM STDIN,
+    so the whole import costs a handful of statements instead of one or two
+    round-trips per row. When the same contact appears more than once, the
+    last row in the file wins, exactly like calling upsert_contact row by row.
+    
+    Returns True if the import ran to the end, False if it failed.
+    """
+    conn = None
+    cur = None
+    try:
+        print("Connecting to the database...")
+        conn = get_pool().getconn()
+        cur = conn.cursor(cursor_factory=instrumented_cursor(psycopg2.extras.DictCursor))
+        
+        with open(file_path, 'r', newline='') as csv_file:
+            header = [column.strip() for column in next(csv.reader([csv_file.readline()]))]
+            missing = [column for column in CONTACT_COLUMNS[:3] if column not in header]
+            if missing:
+                raise ValueError(f"CSV file is missing required column(s): {', '.join(missing)}")
             
-            for record in valid_records:
-                first_name, last_name, phone, email = record
-                
-                cur.execute(
-                    "CALL upsert_contact(%s, %s, %s, %s)",
-                    (first_name, last_name, phone, email)
+            # Staging table has the contact columns plus any extra CSV columns,
+            # all as TEXT so that COPY never rejects a row before validation
+            staging_columns = list(CONTACT_COLUMNS) + [
+                column for column in header if column not in CONTACT_COLUMNS]
+            cur.execute(sql.SQL("""
+                CREATE TEMP TABLE contacts_staging (
+                    line_no BIGSERIAL,
+                    {}
+                ) ON COMMIT DROP
+                """).format(sql.SQL(', ').join(
+                    sql.SQL("{} TEXT").format(sql.Identifier(column))
+                    for column in staging_columns)))
+            
+            print(f"Streaming contacts from {file_path} into staging table...")
+            cur.copy_expert(
+                sql.SQL("COPY contacts_staging ({}) FROM STDIN WITH (FORMAT csv)").format(
+                    sql.SQL(', ').join(sql.Identifier(column) for column in header)),
+                csv_file)
+        
+        # Validate phone numbers in one pass
+        print("Validating phone numbers...")
+        cur.execute(f"""
+            SELECT COUNT(*) AS total,
+                   COUNT(*) FILTER (WHERE is_valid_phone(phone)) AS valid
+            FROM {STAGED_CONTACTS}
+        """, {'whitespace': FIELD_WHITESPACE})
+        counts = cur.fetchone()
+        total, valid = counts['total'], counts['valid']
+        
+        if total > valid:
+            # Server-side cursor so a file full of bad rows is not buffered
+            invalid_cur = conn.cursor(name='invalid_records',
+                                      cursor_factory=instrumented_cursor(psycopg2.extras.DictCursor))
+            invalid_cur.execute(f"""
+                SELECT first_name, last_name, phone, email,
+                       'Invalid phone number format' AS reason
+                FROM {STAGED_CONTACTS}
+                WHERE is_valid_phone(phone) IS NOT TRUE
+                ORDER BY line_no
+            """, {'whitespace': FIELD_WHITESPACE})
+            print_invalid_records(invalid_cur)
+            invalid_cur.close()
+        
+        inserted = 0
+        if valid:
+            print(f"\nMerging {valid} valid contacts...")
+            
+            # Collapse duplicates: latest phone wins, latest non-null email wins
+            cur.execute(f"""
+                CREATE TEMP TABLE contacts_merge ON COMMIT DROP AS
+                SELECT first_name, last_name,
+                       (array_agg(phone ORDER BY line_no DESC))[1] AS phone,
+                       (array_agg(email ORDER BY line_no DESC)
+                           FILTER (WHERE email IS NOT NULL))[1] AS email
+                FROM {STAGED_CONTACTS}
+                WHERE is_valid_phone(phone)
+                GROUP BY first_name, last_name
+            """, {'whitespace': FIELD_WHITESPACE})
+            cur.execute("""
+                WITH upserted AS (
+                    INSERT INTO contacts (first_name, last_name, phone, email)
+                    SELECT m.first_name, m.last_name, m.phone, m.email
+                    FROM contacts_merge m
+                    ON CONFLICT (first_name, last_name) DO UPDATE
+                    SET phone = EXCLUDED.phone,
+                        email = COALESCE(EXCLUDED.email, contacts.email)
+                    RETURNING (xmax = 0) AS inserted
                 )
+                SELECT COUNT(*) FILTER (WHERE inserted) AS inserted FROM upserted
+            """)
+            inserted = cur.fetchone()['inserted']
+            
+            conn.commit()
+            print("Contacts imported successfully!")
+        else:
+            conn.commit()
+            print("No valid contacts to import.")
+        
+        # Summary: a valid row either creates its contact or updates one that
+        # already existed (possibly created by an earlier row of the same file)
+        print("\nImport Summary:")
+        print(f"Total records: {total}")
+        print(f"Valid records: {valid}")
+        print(f"Invalid records: {total - valid}")
+        print(f"Inserted contacts: {inserted}")
+        print(f"Updated contacts: {valid - inserted}")
+        return True
+        
+    except Exception as error:
+        print(f"Error: {error}")
+        if conn:
+            conn.rollback()
+        return False
+    finally:
+        if conn:
+            if cur:
+                cur.close()
+            get_pool().putconn(conn)
+            print("Database connection released.")
+
+def partition_file(file_path, partitions):
+    """Split a CSV file into byte ranges that start and end on line boundaries
+    
+    Returns the header line and a list of (start, end) offsets covering
+    every data line exactly once. Assumes no quoted field spans lines.
+    """
+    size = os.path.getsize(file_path)
+    with open(file_path, 'rb') as file:
+        header = file.readline()
+        data_start = file.tell()
+        bounds = [data_start]
+        for k in range(1, partitions):
+            file.seek(max(data_start, size * k // partitions))
+            # Skip to the start of the next line
+            if file.tell() > data_start:
+                file.readline()
+            bounds.append(max(file.tell(), bounds[-1]))
+        bounds.append(size)
+    ranges = [(start, end) for start, end in zip(bounds, bounds[1:]) if end > start]
+    return header, ranges
+
+def import_partition(file_path, start, end, columns, staging_table, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Worker: parse, validate and COPY one byte range of the file
+    
+    Runs in its own process with its own connection. Every row is staged
+    with its partition start and line number, so the merge can replay the
+    rows in file order. Returns (total, valid, invalid_records).
+    """
+    positions = {column: columns.index(column) for column in CONTACT_COLUMNS if column in columns}
+    conn = psycopg2.connect(**DB_CONFIG)
+    total = valid = 0
+    invalid = []
+    try:
+        cur = conn.cursor(cursor_factory=instrumented_cursor())
+        copy_sql = sql.SQL("COPY {} (part_start, line_no, first_name, last_name, phone, email) "
+                           "FROM STDIN WITH (FORMAT csv)").format(sql.Identifier(staging_table))
+        with open(file_path, 'rb') as file:
+            file.seek(start)
+            offset = start
+            while offset < end:
+                lines = []
+                while offset < end and len(lines) < chunk_size:
+                    line = file.readline()
+                    offset += len(line)
+                    lines.append(line.decode('utf-8'))
                 
+                buffer = io.StringIO()
+                writer = csv.writer(buffer)
+                for row in csv.reader(lines):
+                    if not row:
+                        continue
+                    total += 1
+                    contact = [clean_field(row[positions[column]])
+                               if column in positions and positions[column] < len(row) else None
+                               for column in CONTACT_COLUMNS]
+                    if is_valid_phone(contact[2]):
+                        valid += 1
+                        writer.writerow([start, total] + contact)
+                    else:
+                        invalid.append(dict(zip(CONTACT_COLUMNS, contact),
+                                            reason='Invalid phone number format'))
+                buffer.seek(0)
+                cur.copy_expert(copy_sql, buffer)
+        conn.commit()
+        cur.close()
+    finally:
+        conn.close()
+    return total, valid, invalid
+
+def import_from_csv_parallel(file_path, workers=DEFAULT_WORKERS, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Import contacts from CSV with a pool of worker processes
+    
+    The file is split into one byte range per worker. Each worker parses
+    and validates its range and COPYs the valid rows into a shared staging
+    table over its own connection, so parsing uses every core. One
+    set-based merge then upserts the staged rows; when the same contact
+    appears more than once, the last row in the file wins, exactly like a
+    serial import.
+    
+    Returns True if the import ran to the end, False if it failed.
+    """
+    conn = None
+    cur = None
+    staging_table = f"contacts_import_{uuid.uuid4().hex[:12]}"
+    try:
+        started = time.perf_counter()
+        header, ranges = partition_file(file_path, workers)
+        columns = [column.strip() for column in next(csv.reader([header.decode('utf-8')]))]
+        missing = [column for column in CONTACT_COLUMNS[:3] if column not in columns]
+        if missing:
+            raise ValueError(f"CSV file is missing required column(s): {', '.join(missing)}")
+        
+        print("Connecting to the database...")
+        conn = get_pool().getconn()
+        cur = conn.cursor(cursor_factory=instrumented_cursor(psycopg2.extras.DictCursor))
+        # Workers write from other sessions, so this cannot be a TEMP table;
+        # UNLOGGED skips the WAL, since the rows are dropped after the merge
+        cur.execute(sql.SQL("""
+            CREATE UNLOGGED TABLE {} (
+                part_start BIGINT NOT NULL,
+                line_no BIGINT NOT NULL,
+                first_name TEXT,
+                last_name TEXT,
+                phone TEXT,
+                email TEXT
+            )
+            """).format(sql.Identifier(staging_table)))
+        conn.commit()
+        
+        print(f"Loading {file_path} with {len(ranges)} worker process(es)...")
+        # spawn, so no worker inherits the parent's pooled connections
+        context = multiprocessing.get_context('spawn')
+        with context.Pool(len(ranges) or 1) as pool:
+            results = pool.starmap(import_partition, [
+                (file_path, start, end, columns, staging_table, chunk_size) for start, end in ranges])
+        
+        total = sum(result[0] for result in results)
+        valid = sum(result[1] for result in results)
+        invalid_records = [record for result in results for record in result[2]]
+        if invalid_records:
+            print_invalid_records(invalid_records)
+        
+        inserted = 0
+        if valid:
+            print(f"\nMerging {valid} valid contacts...")
+            # Same merge as import_from_csv_bulk, in file order across partitions
+            cur.execute(sql.SQL("""
+                CREATE TEMP TABLE contacts_merge ON COMMIT DROP AS
+                SELECT first_name, last_name,
+                       (array_agg(phone ORDER BY part_start DESC, line_no DESC))[1] AS phone,
+                       (array_agg(email ORDER BY part_start DESC, line_no DESC)
+                           FILTER (WHERE email IS NOT NULL))[1] AS email
+                FROM {}
+                GROUP BY first_name, last_name
+                """).format(sql.Identifier(staging_table)))
+            cur.execute("""
+                WITH upserted AS (
+                    INSERT INTO contacts (first_name, last_name, phone, email)
+                    SELECT m.first_name, m.last_name, m.phone, m.email
+                    FROM contacts_merge m
+                    ON CONFLICT (first_name, last_name) DO UPDATE
+                    SET phone = EXCLUDED.phone,
+                        email = COALESCE(EXCLUDED.email, contacts.email)
+                    RETURNING (xmax = 0) AS inserted
+                )
+                SELECT COUNT(*) FILTER (WHERE inserted) AS inserted FROM upserted
+            """)
+            inserted = cur.fetchone()['inserted']
             conn.commit()
             print("Contacts imported successfully!")
         else:
             print("No valid contacts to import.")
         
-        # Summary
+        elapsed = time.perf_counter() - started
         print("\nImport Summary:")
-        print(f"Total records: {len(df)}")
-        print(f"Valid records: {len(valid_records)}")
-        print(f"Invalid records: {len(invalid_records)}")
+        print(f"Worker processes: {len(ranges)}")
+        print(f"Total records: {total}")
+        print(f"Valid records: {valid}")
+        print(f"Invalid records: {total - valid}")
+        print(f"Inserted contacts: {inserted}")
+        print(f"Updated contacts: {valid - inserted}")
+        print(f"Elapsed: {elapsed:.2f}s ({total / elapsed:,.0f} rows/sec)")
+        return True
         
     except Exception as error:
         print(f"Error: {error}")
         if conn:
             conn.rollback()
+        return False
     finally:
         if conn:
             if cur:
+                # A failed cleanup must not replace the error that got us here
+                try:
+                    cur.execute(sql.SQL("DROP TABLE IF EXISTS {}").format(sql.Identifier(staging_table)))
+                    conn.commit()
+                except (Exception, psycopg2.DatabaseError) as error:
+                    print(f"Error dropping staging table {staging_table}: {error}")
+                    if not conn.closed:
+                        conn.rollback()
                 cur.close()
-            conn.close()
-            print("Database connection closed.")
+            get_pool().putconn(conn)
+            print("Database connection released.")
 
 if __name__ == "__main__":
-    if len(sys.argv) > 1:
-        file_path = sys.argv[1]
+    parser = argparse.ArgumentParser(description="Import contacts from a CSV file")
+    parser.add_argument("file_path", nargs="?", default="data/contacts_batch.csv",
+                        help="path to the CSV file (default: data/contacts_batch.csv)")
+    parser.add_argument("--bulk", action="store_true",
+                        help="load the file with COPY and merge it with set-based SQL")
+    parser.add_argument("--chunk-size", type=int,
+                        help=f"rows read and written per chunk (default: {DEFAULT_CHUNK_SIZE}); "
+                             "not used by --bulk, which streams the whole file with one COPY")
+    parser.add_argument("--parallel", action="store_true",
+                        help="parse and load the file with a pool of worker processes")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS,
+                        help=f"worker processes for --parallel (default: {DEFAULT_WORKERS})")
+    args = parser.parse_args()
+    if args.chunk_size is not None and args.bulk and not args.parallel:
+        parser.error("--chunk-size cannot be used with --bulk")
+    if args.chunk_size is not None and args.chunk_size < 1:
+        parser.error("--chunk-size must be at least 1")
+    chunk_size = args.chunk_size or DEFAULT_CHUNK_SIZE
+    
+    if args.parallel:
+        import_from_csv_parallel(args.file_path, args.workers, chunk_size)
+    elif args.bulk:
+        import_from_csv_bulk(args.file_path)
     else:
-        file_path = "data/contacts_batch.csv"
-        
-    import_from_csv(file_path) 
\ No newline at end of file
+        import_from_csv(args.file_path, chunk_size)
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+
+import argparse
+import asyncio
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+import sys
+sys.path.append("..")
+from config import DB_POOL_CONFIG
+from db_pool import connection, close_pool
+from advanced_phonebook import AdvancedPhoneBook
+from async_phonebook import AsyncPhoneBook
+from benchmark_search import seed_contacts, sample_patterns
+
+def run_sync_sequential(phonebook, patterns, limit):
+    """One search after another on the sync API"""
+    return [phonebook.search_by_pattern(pattern, limit) for pattern in patterns]
+
+def run_sync_threaded(phonebook, patterns, limit, workers):
+    """Searches spread over a thread pool sharing the sync API"""
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(lambda pattern: phonebook.search_by_pattern(pattern, limit), patterns))
+
+async def run_async(phonebook, patterns, limit):
+    """All searches in flight at once on the async API"""
+    return await phonebook.gather(*(phonebook.search_by_pattern(pattern, limit) for pattern in patterns))
+
+def timed(label, run, requests):
+    """Time a run, print its throughput and return its results"""
+    started = time.perf_counter()
+    results = run()
+    elapsed = time.perf_counter() - started
+    print("{:<25} {:>10.3f} {:>12,.0f}".format(label, elapsed, requests / elapsed))
+    return results
+
+def contact_ids(results):
+    """Reduce search results to comparable lists of contact ids"""
+    return [[row['id'] for row in rows] for rows in results]
+
+async def main():
+    parser = argparse.ArgumentParser(description="Load test the sync and async phonebook APIs")
+    parser.add_argument("--rows", type=int, default=100000,
+                        help="number of synthetic contacts to search over (default: 100000)")
+    parser.add_argument("--requests", type=int, default=1000,
+                        help="number of search requests per run (default: 1000)")
+    parser.add_argument("--limit", type=int, default=20,
+                        help="result limit per search (default: 20)")
+    args = parser.parse_args()
+
+    with connection() as conn:
+        seed_contacts(conn, args.rows)
+    random.seed(42)
+    patterns = sample_patterns(args.rows, args.requests)
+
+    sync_phonebook = AdvancedPhoneBook()
+    async_phonebook = AsyncPhoneBook()
+    if not sync_phonebook.connect() or not await async_phonebook.connect():
+        return
+
+    workers = DB_POOL_CONFIG['maxconn']
+    print(f"\n{args.requests} searches, {workers} pooled connections")
+    print("{:<25} {:>10} {:>12}".format("API", "seconds", "requests/s"))
+    print("-" * 49)
+    sequential = timed("sync sequential", lambda: run_sync_sequential(
+        sync_phonebook, patterns, args.limit), args.requests)
+    threaded = timed(f"sync {workers} threads", lambda: run_sync_threaded(
+        sync_phonebook, patterns, args.limit, workers), args.requests)
+
+    started = time.perf_counter()
+    concurrent = await run_async(async_phonebook, patterns, args.limit)
+    elapsed = time.perf_counter() - started
+    print("{:<25} {:>10.3f} {:>12,.0f}".format("async gather", elapsed, args.requests / elapsed))
+
+    matches = contact_ids(sequential) == contact_ids(threaded) == contact_ids(concurrent)
+    print(f"\nResults identical across APIs: {'yes' if matches else 'NO'}")
+
+    await async_phonebook.disconnect()
+    close_pool()
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+
+import argparse
+import random
+import re
+import statistics
+import time
+import sys
+sys.path.append("..")
+from db_pool import connection, close_pool
+from benchmark_search import FIRST_NAMES, seed_contacts
+from prepared_statements import STATEMENTS, execute_prepared
+
+def sample_params(rows, count):
+    """Build parameters for each benchmarked statement from the seeded data"""
+    ids = [random.randint(1, rows) for _ in range(count)]
+    return {
+        'lookup_by_phone': [('+1' + str(g).zfill(10),) for g in ids],
+        'lookup_by_name': [(f"{FIRST_NAMES[g % 10]}{g}",) for g in ids],
+        'get_contacts_paginated': [(20, g % 1000) for g in ids],
+        'insert_contact': [(f"{FIRST_NAMES[g % 10]}{g}", f"Prepared{g}", '+1' + str(g).zfill(10), None)
+                           for g in ids],
+    }
+
+def time_statement(conn, name, params, prepared):
+    """Run a statement once per parameter tuple and return latencies in ms
+
+    Every call is rolled back, so statements that write leave no trace.
+    """
+    # The unprepared form of a registered statement is the same text with
+    # client-side placeholders, sent and planned in full every time
+    sql = re.sub(r'\$\d+', '%s', STATEMENTS[name][1])
+    cur = conn.cursor()
+    latencies = []
+    for values in params:
+        started = time.perf_counter()
+        if prepared:
+            execute_prepared(cur, name, values)
+        else:
+            cur.execute(sql, values)
+        cur.fetchall()
+        latencies.append((time.perf_counter() - started) * 1000)
+        conn.rollback()
+    cur.close()
+    return latencies
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark prepared vs plain phonebook statements")
+    parser.add_argument("--rows", type=int, default=100000,
+                        help="number of synthetic contacts to query (default: 100000)")
+    parser.add_argument("--calls", type=int, default=2000,
+                        help="number of calls per statement and mode (default: 2000)")
+    args = parser.parse_args()
+
+    with connection() as conn:
+        seed_contacts(conn, args.rows)
+        random.seed(42)
+        samples = sample_params(args.rows, args.calls)
+
+        print(f"\n{args.calls} calls per statement (times in ms)")
+        print("{:<25} {:>10} {:>10} {:>10} {:>10}".format(
+            "Statement", "plain p50", "prep p50", "saved", "saved %"))
+        print("-" * 69)
+        for name, params in samples.items():
+            # Warm up both paths, which also prepares the statement
+            time_statement(conn, name, params[:20], False)
+            time_statement(conn, name, params[:20], True)
+            plain = statistics.median(time_statement(conn, name, params, False))
+            prepared = statistics.median(time_statement(conn, name, params, True))
+            print("{:<25} {:>10.3f} {:>10.3f} {:>10.3f} {:>9.1f}%".format(
+                name, plain, prepared, plain - prepared, 100 * (plain - prepared) / plain))
+    close_pool()
+
+if __name__ == "__main__":
+    main()
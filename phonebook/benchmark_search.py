@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+
+import argparse
+import random
+import statistics
+import time
+import psycopg2
+import sys
+sys.path.append("..")
+from config import DB_CONFIG
+
+BENCH_EMAIL_DOMAIN = "bench.example"
+FIRST_NAMES = ['John', 'Jane', 'Alex', 'Sarah', 'David', 'Emma', 'Michael', 'Olivia', 'Ryan', 'Jessica']
+LAST_NAMES = ['Smith', 'Johnson', 'Williams', 'Brown', 'Taylor', 'Davis', 'Miller', 'Anderson', 'Wilson', 'Moore']
+SEED_BATCH_SIZE = 1000000
+
+def seed_contacts(conn, rows):
+    """Top up the contacts table with synthetic benchmark contacts"""
+    cur = conn.cursor()
+    cur.execute("SELECT COUNT(*) FROM contacts WHERE email LIKE %s", (f"%@{BENCH_EMAIL_DOMAIN}",))
+    existing = cur.fetchone()[0]
+    if existing >= rows:
+        print(f"Found {existing} benchmark contacts, no seeding needed.")
+        cur.close()
+        return
+
+    print(f"Seeding {rows - existing} benchmark contacts...")
+    for start in range(existing + 1, rows + 1, SEED_BATCH_SIZE):
+        end = min(start + SEED_BATCH_SIZE - 1, rows)
+        cur.execute(
+            """
+            INSERT INTO contacts (first_name, last_name, phone, email)
+            SELECT (%(first_names)s::varchar[])[1 + g %% 10] || g,
+                   (%(last_names)s::varchar[])[1 + (g / 10) %% 10] || g,
+                   '+1' || lpad(g::text, 10, '0'),
+                   'user' || g || '@' || %(domain)s
+            FROM generate_series(%(start)s, %(end)s) AS g
+            ON CONFLICT (first_name, last_name) DO NOTHING
+            """,
+            {'first_names': FIRST_NAMES, 'last_names': LAST_NAMES,
+             'domain': BENCH_EMAIL_DOMAIN, 'start': start, 'end': end}
+        )
+        conn.commit()
+        print(f"  {end} / {rows}")
+
+    cur.execute("ANALYZE contacts")
+    conn.commit()
+    cur.close()
+
+def cleanup_contacts(conn):
+    """Remove the synthetic benchmark contacts"""
+    cur = conn.cursor()
+    cur.execute("DELETE FROM contacts WHERE email LIKE %s", (f"%@{BENCH_EMAIL_DOMAIN}",))
+    print(f"Removed {cur.rowcount} benchmark contacts.")
+    conn.commit()
+    cur.close()
+
+def sample_patterns(rows, count):
+    """Build a mix of type-ahead style patterns that hit the seeded data
+
+    Includes the first few keystrokes of a name or number, which match a
+    large share of the contacts.
+    """
+    patterns = []
+    for _ in range(count):
+        g = random.randint(1, rows)
+        kind = random.choice(('first_name', 'last_name', 'phone', 'email', 'short'))
+        if kind == 'short':
+            prefix = random.choice((FIRST_NAMES[g % 10], LAST_NAMES[(g // 10) % 10], str(g)))
+            patterns.append(prefix[:random.randint(1, 3)])
+        elif kind == 'first_name':
+            patterns.append(f"{FIRST_NAMES[g % 10]}{g}")
+        elif kind == 'last_name':
+            patterns.append(f"{LAST_NAMES[(g // 10) % 10]}{g}")
+        elif kind == 'phone':
+            patterns.append(str(g).zfill(10)[-7:])
+        else:
+            patterns.append(f"user{g}@")
+    return patterns
+
+def has_trigram_indexes(conn):
+    """Check whether pg_trgm is installed, so search_contacts_indexed uses its indexes"""
+    cur = conn.cursor()
+    cur.execute("SELECT EXISTS (SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm')")
+    installed = cur.fetchone()[0]
+    cur.close()
+    return installed
+
+def time_function(conn, function, patterns, limit):
+    """Run a search function once per pattern and return latencies in ms"""
+    cur = conn.cursor()
+    latencies = []
+    for pattern in patterns:
+        args = [pattern] if limit is None else [pattern, limit]
+        started = time.perf_counter()
+        cur.callproc(function, args)
+        cur.fetchall()
+        latencies.append((time.perf_counter() - started) * 1000)
+    cur.close()
+    return latencies
+
+def report(name, latencies):
+    """Print latency percentiles for one search function"""
+    latencies = sorted(latencies)
+    p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+    print("{:<30} {:>10.2f} {:>10.2f} {:>10.2f}".format(
+        name, statistics.median(latencies), p95, latencies[-1]))
+    return p95
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark contact pattern search")
+    parser.add_argument("--rows", type=int, default=100000,
+                        help="number of synthetic contacts to search over (default: 100000)")
+    parser.add_argument("--queries", type=int, default=200,
+                        help="number of search queries to time (default: 200)")
+    parser.add_argument("--limit", type=int, default=20,
+                        help="result limit for the indexed search (default: 20)")
+    parser.add_argument("--target-ms", type=float, default=10.0,
+                        help="p95 latency target for the indexed search (default: 10)")
+    parser.add_argument("--skip-scan", action="store_true",
+                        help="do not time the unindexed search_contacts_by_pattern")
+    parser.add_argument("--cleanup", action="store_true",
+                        help="remove the benchmark contacts and exit")
+    args = parser.parse_args()
+
+    conn = psycopg2.connect(**DB_CONFIG)
+    try:
+        if args.cleanup:
+            cleanup_contacts(conn)
+            return
+
+        seed_contacts(conn, args.rows)
+        random.seed(42)
+        patterns = sample_patterns(args.rows, args.queries)
+
+        # Warm up caches so the first queries do not skew the results
+        time_function(conn, 'search_contacts_indexed', patterns[:10], args.limit)
+
+        print(f"\n{args.queries} queries over {args.rows} benchmark contacts (times in ms)")
+        print("{:<30} {:>10} {:>10} {:>10}".format("Function", "p50", "p95", "max"))
+        print("-" * 63)
+        p95 = report('search_contacts_indexed',
+                     time_function(conn, 'search_contacts_indexed', patterns, args.limit))
+        if not args.skip_scan:
+            report('search_contacts_by_pattern',
+                   time_function(conn, 'search_contacts_by_pattern', patterns, None))
+
+        if has_trigram_indexes(conn):
+            status = "PASS" if p95 <= args.target_ms else "FAIL"
+        else:
+            # The ILIKE fallback is not what the target is for
+            status = "NOT MEASURED (pg_trgm is not installed, the ILIKE fallback was timed)"
+        print(f"\nIndexed search p95 {p95:.2f} ms, target {args.target_ms:.2f} ms: {status}")
+    finally:
+        conn.close()
+
+if __name__ == "__main__":
+    main()
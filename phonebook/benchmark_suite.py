@@ -0,0 +1,298 @@
+#!/usr/bin/env python3
+
+import argparse
+import contextlib
+import datetime
+import io
+import json
+import os
+import platform
+import random
+import statistics
+import tempfile
+import time
+import sys
+sys.path.append("..")
+from db_pool import connection, close_pool
+import batch_import
+from phonebook import PhoneBook
+from advanced_phonebook import AdvancedPhoneBook
+from benchmark_search import (BENCH_EMAIL_DOMAIN, FIRST_NAMES, LAST_NAMES, cleanup_contacts,
+                              sample_patterns)
+from generate_contacts import generate_contacts, write_contacts_csv
+
+# Allowed slowdown against a baseline before a result counts as a regression
+DEFAULT_TOLERANCE = 0.2
+
+class StepFailed(Exception):
+    """A timed operation failed instead of doing its work"""
+
+@contextlib.contextmanager
+def quiet():
+    """Silence the progress and result printing of the code being timed
+
+    The data access code reports a failure by printing an error and
+    returning, so an error line in the output fails the step.
+    """
+    output = io.StringIO()
+    with contextlib.redirect_stdout(output):
+        yield
+    errors = [line for line in output.getvalue().splitlines() if line.startswith("Error")]
+    if errors:
+        raise StepFailed(errors[0])
+
+def timed(call, check):
+    """Run call and return its time in seconds, failing if check rejects its result"""
+    started = time.perf_counter()
+    result = call()
+    elapsed = time.perf_counter() - started
+    if check is not None and not check(result):
+        raise StepFailed(f"unexpected result: {result!r:.100}")
+    return elapsed
+
+def throughput(rows, run, check=None):
+    """Time one run over rows contacts
+
+    check, if given, is called with what run returned and must be true.
+    A failed run gives {'error': message} instead of timings.
+    """
+    try:
+        with quiet():
+            elapsed = timed(run, check)
+    except StepFailed as error:
+        return {'error': str(error)}
+    return {'rows': rows, 'seconds': round(elapsed, 4), 'rows_per_sec': round(rows / elapsed, 1)}
+
+def latency(calls, check=None):
+    """Time each call and summarize the latencies in ms
+
+    As with throughput, a failed call fails the whole step.
+    """
+    try:
+        with quiet():
+            latencies = sorted(timed(call, check) * 1000 for call in calls)
+    except StepFailed as error:
+        return {'error': str(error)}
+    return {
+        'calls': len(latencies),
+        'mean_ms': round(statistics.fmean(latencies), 3),
+        'p50_ms': round(statistics.median(latencies), 3),
+        'p95_ms': round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))], 3),
+        'max_ms': round(latencies[-1], 3)
+    }
+
+def analyze_contacts():
+    """Refresh planner statistics after a bulk change"""
+    with connection() as conn:
+        cur = conn.cursor()
+        cur.execute("ANALYZE contacts")
+        conn.commit()
+        cur.close()
+
+def reset_contacts():
+    """Remove benchmark contacts left by an earlier step or run"""
+    with connection() as conn, quiet():
+        cleanup_contacts(conn)
+    analyze_contacts()
+
+def sample_contact_phones(count, seed):
+    """Return the phones of up to count benchmark contacts, the same ones for a seed"""
+    with connection() as conn:
+        cur = conn.cursor()
+        # Ordering by a hash of the phone does not depend on where rows sit
+        cur.execute(
+            "SELECT phone FROM contacts WHERE email LIKE %s ORDER BY md5(phone || %s) LIMIT %s",
+            (f"%@{BENCH_EMAIL_DOMAIN}", str(seed), count))
+        phones = [row[0] for row in cur.fetchall()]
+        conn.rollback()
+        cur.close()
+    return phones
+
+def server_version():
+    """Return the PostgreSQL server version string"""
+    with connection() as conn:
+        cur = conn.cursor()
+        cur.execute("SHOW server_version")
+        version = cur.fetchone()[0]
+        conn.rollback()
+        cur.close()
+    return version
+
+def run_suite(args, csv_path):
+    """Time every phonebook operation and return the results by name"""
+    phonebook = PhoneBook()
+    advanced = AdvancedPhoneBook()
+    rng = random.Random(args.seed)
+    results = {}
+
+    def record(name, result):
+        results[name] = result
+        print(f"  {name:<32} {format_result(result)}")
+
+    print(f"\nTiming against {args.rows} contacts:")
+    reset_contacts()
+    record('import_from_csv', throughput(args.rows, lambda: batch_import.import_from_csv(csv_path), bool))
+    reset_contacts()
+    record('import_from_csv_bulk', throughput(
+        args.rows, lambda: batch_import.import_from_csv_bulk(csv_path), bool))
+    analyze_contacts()
+
+    # New contacts numbered after the imported ones
+    batches = [list(generate_contacts(args.batch_size, 0, args.invalid_ratio, args.seed + n,
+                                      start=args.rows + 1 + n * args.batch_size))
+               for n in range(args.batches)]
+    record('insert_multiple_contacts', throughput(
+        args.batch_size * args.batches,
+        lambda: [advanced.insert_multiple_contacts(batch) for batch in batches],
+        lambda results: all(len(result) == len(batch) for result, batch in zip(results, batches))))
+
+    # sample_patterns draws from the global generator
+    random.seed(args.seed)
+    patterns = sample_patterns(args.rows, args.queries)
+    record('search_by_pattern', latency(
+        [lambda p=p: advanced.search_by_pattern(p, 20) for p in patterns]))
+
+    offsets = [rng.randrange(args.rows) for _ in range(args.queries)]
+    record('get_contacts_paginated', latency(
+        [lambda o=o: advanced.get_contacts_paginated(20, o) for o in offsets]))
+
+    filters = []
+    for _ in range(args.queries):
+        g = rng.randint(1, args.rows)
+        filters.append(rng.choice([
+            {'first_name': f"{FIRST_NAMES[g % 10]}{g}"},
+            {'last_name': f"{LAST_NAMES[(g // 10) % 10]}{g}"},
+            {'phone': str(g).zfill(10)[-7:]},
+        ]))
+    record('query_contacts', latency(
+        [lambda f=f: phonebook.query_contacts(f) for f in filters]))
+
+    # Distinct contacts that exist, so every delete removes one
+    phones = sample_contact_phones(args.queries + 2 * args.batch_size, args.seed)
+    single, batch, by_identifier = (phones[:args.queries],
+                                    phones[args.queries:args.queries + args.batch_size],
+                                    phones[args.queries + args.batch_size:])
+    record('delete_contact', latency(
+        [lambda p=p: phonebook.delete_contact(p) for p in single]))
+    # The batch deletes return None when nothing could be deleted
+    succeeded = lambda counts: counts is not None and all(counts.values())
+    record('delete_contacts', throughput(len(batch), lambda: phonebook.delete_contacts(batch), succeeded))
+    record('delete_contacts_by_identifiers', throughput(
+        len(by_identifier), lambda: advanced.delete_contacts_by_identifiers(by_identifier), succeeded))
+    return results
+
+def format_result(result):
+    """One-line summary of a throughput or latency result"""
+    if 'error' in result:
+        return f"FAILED: {result['error']}"
+    if 'rows_per_sec' in result:
+        return f"{result['rows_per_sec']:>12,.0f} rows/s  ({result['seconds']:.2f}s)"
+    return f"p50 {result['p50_ms']:>8.2f} ms  p95 {result['p95_ms']:>8.2f} ms  max {result['max_ms']:>8.2f} ms"
+
+def compare(results, baseline, tolerance):
+    """Print each result against a baseline run and return the regressions"""
+    regressions = []
+    print(f"\nAgainst baseline from {baseline['meta']['timestamp']} (tolerance {tolerance:.0%}):")
+    for name, result in results.items():
+        before = baseline['results'].get(name)
+        if 'error' in result:
+            regressions.append(name)
+            print(f"  {name:<32} {'':>8}  FAILED")
+            continue
+        if before is None or 'error' in before:
+            print(f"  {name:<32} no baseline")
+            continue
+        # Throughput should not drop, latency should not grow
+        if 'rows_per_sec' in result:
+            change = result['rows_per_sec'] / before['rows_per_sec'] - 1
+            worse = change < -tolerance
+        else:
+            change = result['p95_ms'] / before['p95_ms'] - 1
+            worse = change > tolerance
+        if worse:
+            regressions.append(name)
+        print(f"  {name:<32} {change:>+8.1%}  {'REGRESSION' if worse else 'ok'}")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark phonebook operations on synthetic data")
+    parser.add_argument("--rows", type=int, default=100000,
+                        help="number of contacts to generate and import, 1k to 10M (default: 100000)")
+    parser.add_argument("--duplicate-ratio", type=float, default=0.1,
+                        help="share of generated rows repeating an earlier contact (default: 0.1)")
+    parser.add_argument("--invalid-ratio", type=float, default=0.05,
+                        help="share of generated rows with an invalid phone (default: 0.05)")
+    parser.add_argument("--seed", type=int, default=42, help="random seed (default: 42)")
+    parser.add_argument("--queries", type=int, default=200,
+                        help="calls per latency benchmark (default: 200)")
+    parser.add_argument("--batch-size", type=int, default=1000,
+                        help="contacts per insert_multiple_contacts call and delete batch (default: 1000)")
+    parser.add_argument("--batches", type=int, default=10,
+                        help="number of insert_multiple_contacts calls (default: 10)")
+    parser.add_argument("--csv", help="reuse this generated CSV instead of writing a temporary one")
+    parser.add_argument("-o", "--output", default="benchmark_results.json",
+                        help="JSON file for the results (default: benchmark_results.json)")
+    parser.add_argument("--baseline", help="JSON results of an earlier run to compare against")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE,
+                        help="allowed slowdown against the baseline (default: 0.2)")
+    parser.add_argument("--keep", action="store_true",
+                        help="leave the benchmark contacts in the database")
+    args = parser.parse_args()
+
+    if not 1000 <= args.rows <= 10000000:
+        parser.error("--rows must be between 1000 and 10000000")
+    if args.queries + 2 * args.batch_size > args.rows:
+        parser.error("--rows is too small for the requested queries and batch size")
+
+    csv_path = args.csv
+    temporary = None
+    if csv_path is None:
+        temporary = tempfile.NamedTemporaryFile(suffix='.csv', delete=False)
+        temporary.close()
+        csv_path = temporary.name
+        print(f"Generating {args.rows} contacts...")
+        started = time.perf_counter()
+        write_contacts_csv(csv_path, args.rows, args.duplicate_ratio, args.invalid_ratio, args.seed)
+        print(f"Generated in {time.perf_counter() - started:.2f}s")
+
+    try:
+        results = run_suite(args, csv_path)
+    finally:
+        if temporary is not None:
+            os.unlink(csv_path)
+        if not args.keep:
+            reset_contacts()
+
+    report = {
+        'meta': {
+            'timestamp': datetime.datetime.now().isoformat(timespec='seconds'),
+            'rows': args.rows,
+            'duplicate_ratio': args.duplicate_ratio,
+            'invalid_ratio': args.invalid_ratio,
+            'seed': args.seed,
+            'queries': args.queries,
+            'batch_size': args.batch_size,
+            'batches': args.batches,
+            'postgres': server_version(),
+            'python': platform.python_version(),
+            'platform': platform.platform()
+        },
+        'results': results
+    }
+    with open(args.output, 'w') as file:
+        json.dump(report, file, indent=2)
+    print(f"\nResults written to {args.output}")
+
+    regressions = []
+    if args.baseline:
+        with open(args.baseline) as file:
+            regressions = compare(results, json.load(file), args.tolerance)
+    failed = [name for name, result in results.items() if 'error' in result]
+    if failed:
+        print(f"\n{len(failed)} step(s) failed: {', '.join(failed)}")
+    close_pool()
+    if regressions or failed:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
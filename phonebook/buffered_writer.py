@@ -0,0 +1,261 @@
+#!/usr/bin/env python3
+
+import itertools
+import threading
+import psycopg2
+import psycopg2.extras
+import sys
+sys.path.append("..")
+from db_metrics import instrumented, instrumented_cursor
+from db_pool import get_pool
+from phone_utils import normalize_phone
+from prepared_statements import execute_prepared
+
+DEFAULT_MAX_ROWS = 1000
+DEFAULT_MAX_DELAY = 1.0
+
+# 'flush' commits every flush on its own; 'explicit' keeps one transaction
+# open across flushes until commit() or a clean exit from the with block
+COMMIT_MODES = ('flush', 'explicit')
+
+BATCH_SQL = {
+    'insert': "INSERT INTO contacts (first_name, last_name, phone, email) VALUES %s",
+    # Same conflict handling as the upsert_contact procedure
+    'upsert': """
+        INSERT INTO contacts (first_name, last_name, phone, email) VALUES %s
+        ON CONFLICT (first_name, last_name) DO UPDATE
+        SET phone = EXCLUDED.phone,
+            email = COALESCE(EXCLUDED.email, contacts.email)
+    """,
+}
+
+def merge_upserts(rows):
+    """Collapse upserts of the same contact, as if they ran one after another
+
+    ON CONFLICT cannot touch the same row twice in one statement, so the
+    latest phone wins and the latest non-null email is kept.
+    """
+    merged = {}
+    for first_name, last_name, phone, email in rows:
+        previous = merged.get((first_name, last_name))
+        if email is None and previous is not None:
+            email = previous[3]
+        merged[(first_name, last_name)] = (first_name, last_name, phone, email)
+    return list(merged.values())
+
+@instrumented
+class BufferedContactWriter:
+    """Write-behind buffer for contact inserts and upserts
+
+    insert() and upsert() only queue the contact. Queued contacts are
+    written with one multi-row statement per run of the same operation
+    once max_rows are queued, max_delay seconds after the first was queued,
+    on flush(), or when the with block exits cleanly, so a loop adding
+    contacts pays for one round-trip and one commit per batch instead of
+    per row. If the block raises, contacts still queued are discarded, as
+    is everything uncommitted in 'explicit' mode; batches already committed
+    in 'flush' mode stay.
+
+    If a batch statement fails, its rows are retried one at a time so that
+    only the offending rows are rejected; an insert of a contact that
+    already exists is rejected too. If no connection can be had or the
+    transaction fails, every row it held is rejected. Rejected rows are
+    returned by flush(), collected in errors, and passed to on_error if
+    given.
+
+    Args:
+        max_rows: Flush once this many contacts are queued
+        max_delay: Flush this many seconds after the first contact was
+            queued; None to flush on size only
+        commit: 'flush' to commit every flush, or 'explicit' to commit
+            only on commit() or a clean exit, and roll back otherwise
+        synchronous_commit: Value for SET LOCAL synchronous_commit, e.g.
+            'off' to trade the last few batches on a crash for not waiting
+            on the WAL flush; None keeps the server setting
+        cache: ContactCache to invalidate once written rows are committed
+        autocomplete: ContactAutocomplete to update once written rows are committed
+        on_error: Called with each rejected row's error dictionary
+    """
+    def __init__(self, max_rows=DEFAULT_MAX_ROWS, max_delay=DEFAULT_MAX_DELAY, commit='flush',
+                 synchronous_commit=None, cache=None, autocomplete=None, on_error=None):
+        if commit not in COMMIT_MODES:
+            raise ValueError(f"Unsupported commit mode: {commit}")
+        self.max_rows = max_rows
+        self.max_delay = max_delay
+        self.commit_mode = commit
+        self.synchronous_commit = synchronous_commit
+        self.cache = cache
+        self.autocomplete = autocomplete
+        self.on_error = on_error
+        self.pending = []
+        self.errors = []
+        self.written = []
+        # Phones the written upserts replaced, dropped from the indexes too
+        self.replaced_phones = []
+        self.conn = None
+        self.timer = None
+        self.lock = threading.RLock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        if exc_type is not None:
+            self.rollback()
+        else:
+            self.close()
+        return False
+
+    def insert(self, first_name, last_name, phone, email=None):
+        """Queue a new contact"""
+        self.add('insert', (first_name, last_name, phone, email))
+
+    def upsert(self, first_name, last_name, phone, email=None):
+        """Queue a contact to insert, or to update if it exists"""
+        self.add('upsert', (first_name, last_name, phone, email))
+
+    def add(self, operation, row):
+        """Queue one row and flush if a threshold has been reached"""
+        with self.lock:
+            self.pending.append((operation, row))
+            if len(self.pending) >= self.max_rows:
+                self.flush()
+            elif self.timer is None and self.max_delay is not None:
+                self.timer = threading.Timer(self.max_delay, self.flush)
+                self.timer.daemon = True
+                self.timer.start()
+
+    def flush(self):
+        """Write every queued contact and return the rows rejected by this flush
+
+        In 'flush' mode the rows are committed before this returns.
+        """
+        with self.lock:
+            if self.timer is not None:
+                self.timer.cancel()
+                self.timer = None
+            batch, self.pending = self.pending, []
+            if not batch:
+                return []
+
+            errors = []
+            try:
+                cur = self.checkout().cursor(cursor_factory=instrumented_cursor())
+                if self.synchronous_commit is not None:
+                    cur.execute("SET LOCAL synchronous_commit = %s", (self.synchronous_commit,))
+                for operation, group in itertools.groupby(batch, key=lambda item: item[0]):
+                    errors += self.write(cur, operation, [row for _, row in group])
+                cur.close()
+            except (Exception, psycopg2.DatabaseError) as error:
+                # Not a bad row but a failed transaction: nothing since the
+                # last commit was kept
+                lost = [row for _, row in batch]
+                if self.commit_mode == 'explicit':
+                    lost = self.written + lost
+                print(f"Error flushing contacts: {error}")
+                errors += [{'operation': 'flush', 'contact': row, 'error': str(error)} for row in lost]
+                if self.conn is not None:
+                    self.release(commit=False)
+            else:
+                self.written += [row for _, row in batch]
+                if self.commit_mode == 'flush':
+                    self.release(commit=True)
+
+            self.report(errors)
+            return errors
+
+    def commit(self):
+        """Flush and commit everything written so far"""
+        with self.lock:
+            errors = self.flush()
+            if self.conn is not None:
+                self.release(commit=True)
+            return errors
+
+    def rollback(self):
+        """Discard queued contacts and, in 'explicit' mode, uncommitted writes"""
+        with self.lock:
+            if self.timer is not None:
+                self.timer.cancel()
+                self.timer = None
+            self.pending = []
+            if self.conn is not None:
+                self.release(commit=False)
+
+    def close(self):
+        """Flush and commit, then give the connection back to the pool"""
+        return self.commit()
+
+    def checkout(self):
+        """Return the connection for this writer's open transaction"""
+        if self.conn is None:
+            self.conn = get_pool().getconn()
+        return self.conn
+
+    def release(self, commit):
+        """End the open transaction and return its connection to the pool"""
+        conn, self.conn = self.conn, None
+        written, self.written = self.written, []
+        replaced_phones, self.replaced_phones = self.replaced_phones, []
+        try:
+            if commit:
+                conn.commit()
+            elif not conn.closed:
+                conn.rollback()
+        finally:
+            get_pool().putconn(conn)
+        if commit and written:
+            first_names = [row[0] for row in written]
+            phones = [normalize_phone(row[2]) for row in written] + replaced_phones
+            for index in (self.cache, self.autocomplete):
+                if index:
+                    index.invalidate(first_names=first_names, phones=phones)
+
+    def current_phones(self, cur, rows):
+        """Return the normalized phones the contacts in rows have now"""
+        found = psycopg2.extras.execute_values(cur, """
+            SELECT c.phone_normalized
+            FROM contacts c
+            JOIN (VALUES %s) AS v(first_name, last_name)
+              ON c.first_name = v.first_name AND c.last_name IS NOT DISTINCT FROM v.last_name
+            """, list({(row[0], row[1]) for row in rows}),
+            template="(%s::varchar, %s::varchar)", page_size=len(rows), fetch=True)
+        return [row[0] for row in found]
+
+    def write(self, cur, operation, rows):
+        """Write a run of rows with one statement, falling back to one per row"""
+        if operation == 'upsert' and (self.cache or self.autocomplete):
+            # An upsert that updates a contact changes its phone
+            self.replaced_phones += self.current_phones(cur, rows)
+        cur.execute("SAVEPOINT contact_batch")
+        try:
+            values = merge_upserts(rows) if operation == 'upsert' else rows
+            psycopg2.extras.execute_values(cur, BATCH_SQL[operation], values, page_size=len(values))
+            cur.execute("RELEASE SAVEPOINT contact_batch")
+            return []
+        except psycopg2.Error:
+            cur.execute("ROLLBACK TO SAVEPOINT contact_batch")
+
+        errors = []
+        for row in rows:
+            cur.execute("SAVEPOINT contact_row")
+            try:
+                if operation == 'upsert':
+                    cur.execute("CALL upsert_contact(%s, %s, %s, %s)", row)
+                else:
+                    execute_prepared(cur, 'insert_contact', row)
+                    if cur.fetchone() is None:
+                        errors.append({'operation': operation, 'contact': row,
+                                       'error': f"Contact already exists: {row[0]} {row[1]}"})
+                cur.execute("RELEASE SAVEPOINT contact_row")
+            except psycopg2.Error as error:
+                cur.execute("ROLLBACK TO SAVEPOINT contact_row")
+                errors.append({'operation': operation, 'contact': row, 'error': str(error).strip()})
+        return errors
+
+    def report(self, errors):
+        """Record rejected rows and hand them to on_error"""
+        self.errors += errors
+        if self.on_error:
+            for error in errors:
+                self.on_error(error)
@@ -0,0 +1,321 @@
+#!/usr/bin/env python3
+
+import argparse
+import heapq
+import random
+import sys
+import threading
+import time
+from itertools import islice
+import psycopg2
+from sortedcontainers import SortedList
+sys.path.append("..")
+from db_pool import transaction, close_pool
+from phone_utils import normalize_phone
+
+# Position of each indexed field in a contact tuple (first_name, last_name, phone)
+FIELDS = ('first_name', 'last_name', 'phone')
+
+DEFAULT_LIMIT = 10
+
+# Rows fetched per round-trip while loading
+LOAD_ITERSIZE = 10000
+
+class ContactAutocomplete:
+    """In-memory prefix index over first name, last name and normalized phone
+
+    Every field is kept as a SortedList of (key, contact id) entries, keys
+    being names lowercased and phones in their '+digits' form, so the
+    completions for a prefix are a bisect to the first key and a scan of
+    the keys that follow, a few microseconds whatever the table size, and
+    adding or dropping a contact costs O(log n).
+
+    load() reads every contact once. After that, pass the index to
+    PhoneBook or AdvancedPhoneBook and writes made through them keep it up
+    to date: with apply() when the write returned the rows it changed, or
+    else invalidate(), just as they do a ContactCache. Writes made by other
+    processes show up on the next load().
+    """
+    def __init__(self):
+        self.contacts = {}
+        self.entries = {field: SortedList() for field in FIELDS}
+        self.lock = threading.Lock()
+        # Serializes refreshes, so an older read is never applied over a newer one
+        self.refresh_lock = threading.Lock()
+
+    def load(self):
+        """Replace the index with every contact in the database
+
+        Returns the number of contacts indexed.
+        """
+        with self.refresh_lock:
+            contacts = {}
+            with transaction(name='autocomplete_load') as cur:
+                cur.itersize = LOAD_ITERSIZE
+                cur.execute("SELECT id, first_name, last_name, phone_normalized FROM contacts")
+                for contact_id, first_name, last_name, phone in cur:
+                    contacts[contact_id] = (first_name, last_name, phone)
+
+            # Sort the keys once instead of inserting them one by one
+            entries = {
+                field: SortedList((index_key(position, contact[position]), contact_id)
+                                  for contact_id, contact in contacts.items()
+                                  if contact[position] is not None)
+                for position, field in enumerate(FIELDS)}
+
+            with self.lock:
+                self.contacts, self.entries = contacts, entries
+            return len(contacts)
+
+    def add(self, contact_id, first_name, last_name, phone):
+        """Index a contact, replacing any entry with the same id
+
+        phone is normalized here, so any formatting can be passed.
+        """
+        with self.lock:
+            self.put(contact_id, (first_name, last_name, normalize_phone(phone)))
+
+    def remove(self, contact_id):
+        """Drop a contact from the index"""
+        with self.lock:
+            self.discard(contact_id)
+
+    def apply(self, changed=(), deleted=()):
+        """Index the rows a write returned, without reading the database
+
+        Args:
+            changed: (id, first_name, last_name, phone_normalized) rows of
+                inserted or updated contacts, as they are after the write
+            deleted: Ids of deleted contacts
+        """
+        with self.lock:
+            for contact_id in deleted:
+                self.discard(contact_id)
+            for contact_id, first_name, last_name, phone in changed:
+                self.put(contact_id, (first_name, last_name, phone))
+
+    def put(self, contact_id, contact):
+        """Index a (first_name, last_name, phone_normalized) contact under
+        its id, replacing its old entries; the caller holds the lock"""
+        self.discard(contact_id)
+        self.contacts[contact_id] = contact
+        for position, field in enumerate(FIELDS):
+            if contact[position] is not None:
+                self.entries[field].add((index_key(position, contact[position]), contact_id))
+
+    def discard(self, contact_id):
+        """Drop a contact's entries; the caller holds the lock"""
+        contact = self.contacts.pop(contact_id, None)
+        if contact is None:
+            return
+        for position, field in enumerate(FIELDS):
+            if contact[position] is not None:
+                self.entries[field].discard((index_key(position, contact[position]), contact_id))
+
+    def invalidate(self, first_names=(), phones=()):
+        """Re-read the contacts with the given first names or phones
+
+        For writes that do not return the rows they changed. Called with
+        the keys before and after a write, the same way as
+        ContactCache.invalidate, so renamed, updated and deleted contacts
+        all end up matching the database. The write has already been
+        committed, so a failed refresh is reported and returns False.
+        """
+        first_names = sorted({name for name in first_names if name is not None})
+        phones = sorted({phone for phone in phones if phone is not None})
+        if not first_names and not phones:
+            return True
+        with self.refresh_lock:
+            try:
+                with transaction() as cur:
+                    cur.execute(
+                        """
+                        SELECT id, first_name, last_name, phone_normalized FROM contacts
+                        WHERE first_name = ANY(%s) OR phone_normalized = ANY(%s)
+                        """,
+                        (first_names, phones)
+                    )
+                    rows = cur.fetchall()
+            except (Exception, psycopg2.DatabaseError) as error:
+                print(f"Error refreshing autocomplete index: {error}")
+                return False
+            with self.lock:
+                stale = set()
+                for name in first_names:
+                    stale.update(contact_id for contact_id in self.matching('first_name', index_key(0, name))
+                                 if self.contacts[contact_id][0] == name)
+                for phone in phones:
+                    stale.update(self.matching('phone', phone))
+                for contact_id in stale:
+                    self.discard(contact_id)
+                for contact_id, first_name, last_name, phone in rows:
+                    self.put(contact_id, (first_name, last_name, phone))
+        return True
+
+    def clear(self):
+        """Rebuild the index after a bulk change, such as a CSV import"""
+        self.load()
+
+    def matching(self, field, key):
+        """Ids indexed under exactly key; the caller holds the lock"""
+        ids = []
+        for entry_key, contact_id in self.entries[field].irange((key,)):
+            if entry_key != key:
+                break
+            ids.append(contact_id)
+        return ids
+
+    def scan(self, field, prefix, limit):
+        """Yield up to limit (key, id, field) entries of a field starting with prefix"""
+        for key, contact_id in islice(self.entries[field].irange((prefix,)), limit):
+            if not key.startswith(prefix):
+                break
+            yield key, contact_id, field
+
+    def complete(self, prefix, limit=DEFAULT_LIMIT):
+        """Return up to limit contacts with a name or phone starting with prefix
+
+        Names match case-insensitively; a prefix shaped like a phone number
+        also matches normalized phones, however it is formatted. Contacts
+        come back in alphabetical order of the matching key, each once, as
+        dictionaries with id, first_name, last_name, phone and match (the
+        value that matched).
+        """
+        prefix = prefix.strip()
+        if not prefix or limit <= 0:
+            return []
+        name_prefix = prefix.lower()
+        phone_prefix = normalize_phone(prefix)
+
+        results = []
+        seen = set()
+        with self.lock:
+            # Each field contributes at most limit entries, so this stays
+            # O(limit) however many keys share the prefix
+            scans = [self.scan('first_name', name_prefix, limit),
+                     self.scan('last_name', name_prefix, limit)]
+            if phone_prefix is not None:
+                scans.append(self.scan('phone', phone_prefix, limit))
+            for _, contact_id, field in heapq.merge(*scans):
+                if contact_id in seen:
+                    continue
+                seen.add(contact_id)
+                contact = self.contacts[contact_id]
+                results.append({
+                    'id': contact_id,
+                    'first_name': contact[0],
+                    'last_name': contact[1],
+                    'phone': contact[2],
+                    'match': contact[FIELDS.index(field)]
+                })
+                if len(results) == limit:
+                    break
+        return results
+
+    def completer(self, limit=DEFAULT_LIMIT):
+        """Return a readline completer offering the matching names and phones"""
+        matches = []
+
+        def complete(text, state):
+            if state == 0:
+                matches[:] = dict.fromkeys(result['match'] for result in self.complete(text, limit))
+            return matches[state] if state < len(matches) else None
+        return complete
+
+    def stats(self):
+        """Return the number of contacts and index entries, and the bytes they take"""
+        with self.lock:
+            seen = set()
+            size = sys.getsizeof(self.contacts)
+            for contact_id, contact in self.contacts.items():
+                size += sized(contact_id, seen) + sized(contact, seen)
+                size += sum(sized(value, seen) for value in contact)
+            for field in FIELDS:
+                # One list slot per entry, plus the entry and its key
+                entries = self.entries[field]
+                size += sys.getsizeof(entries) + 8 * len(entries)
+                size += sum(sized(entry, seen) + sized(entry[0], seen) for entry in entries)
+            return {
+                'contacts': len(self.contacts),
+                'entries': sum(len(self.entries[field]) for field in FIELDS),
+                'bytes': size
+            }
+
+def index_key(position, value):
+    """Key a field value is indexed under: phones as they are, names lowercased"""
+    return value if FIELDS[position] == 'phone' else value.lower()
+
+def sized(value, seen):
+    """Size of an object the first time it is seen, so shared objects count once"""
+    if value is None or id(value) in seen:
+        return 0
+    seen.add(id(value))
+    return sys.getsizeof(value)
+
+def enable_readline(autocomplete, limit=DEFAULT_LIMIT):
+    """Complete names and phone numbers with Tab at input() prompts
+
+    Returns False where the readline module is not available.
+    """
+    try:
+        import readline
+    except ImportError:
+        return False
+    readline.set_completer(autocomplete.completer(limit))
+    # Complete the whole input, so phones with spaces or dashes still match
+    readline.set_completer_delims('')
+    readline.parse_and_bind('tab: complete')
+    return True
+
+def load_autocomplete(autocomplete):
+    """Load the index for an interactive menu and complete names and phones with Tab"""
+    try:
+        started = time.perf_counter()
+        count = autocomplete.load()
+        megabytes = autocomplete.stats()['bytes'] / (1024 * 1024)
+        print(f"Indexed {count} contacts for autocomplete in "
+              f"{time.perf_counter() - started:.2f}s ({megabytes:.1f} MB).")
+        if enable_readline(autocomplete):
+            print("Press Tab to complete names and phone numbers.")
+    except (Exception, psycopg2.DatabaseError) as error:
+        print(f"Error loading autocomplete index: {error}")
+
+def time_keystrokes(autocomplete, words, limit):
+    """Time completing every prefix of each word, as if typed one key at a time"""
+    latencies = []
+    for word in words:
+        for length in range(1, len(word) + 1):
+            started = time.perf_counter()
+            autocomplete.complete(word[:length], limit)
+            latencies.append((time.perf_counter() - started) * 1e6)
+    latencies.sort()
+    return latencies
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load the autocomplete index and time completions")
+    parser.add_argument("prefixes", nargs="*", help="prefixes to complete; by default, time sampled names and phones")
+    parser.add_argument("--limit", type=int, default=DEFAULT_LIMIT,
+                        help="completions per prefix (default: 10)")
+    parser.add_argument("--samples", type=int, default=1000,
+                        help="contacts whose names and phones are typed (default: 1000)")
+    args = parser.parse_args()
+
+    autocomplete = ContactAutocomplete()
+    started = time.perf_counter()
+    count = autocomplete.load()
+    print(f"Indexed {count} contacts in {time.perf_counter() - started:.2f}s")
+    stats = autocomplete.stats()
+    print(f"{stats['entries']} entries, {stats['bytes'] / (1024 * 1024):.1f} MB")
+
+    if args.prefixes:
+        for prefix in args.prefixes:
+            print(f"\n{prefix}:")
+            for result in autocomplete.complete(prefix, args.limit):
+                print(f"  {result['match']:<20} {result['first_name']} {result['last_name']} {result['phone']}")
+    elif count:
+        contacts = random.Random(42).sample(list(autocomplete.contacts.values()), min(args.samples, count))
+        words = [value for contact in contacts for value in contact if value is not None]
+        latencies = time_keystrokes(autocomplete, words, args.limit)
+        print(f"\n{len(latencies)} keystrokes: p50 {latencies[len(latencies) // 2]:.1f} us, "
+              f"p99 {latencies[int(len(latencies) * 0.99)]:.1f} us, max {latencies[-1]:.1f} us")
+    close_pool()
@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+
+import json
+import select
+import threading
+import time
+from collections import OrderedDict
+import psycopg2
+import psycopg2.extensions
+import sys
+sys.path.append("..")
+from config import DB_CONFIG
+
+NOTIFY_CHANNEL = "contacts_changed"
+
+# Exact lookups are keyed ('name', first_name) or ('phone', phone); anything
+# else (pattern searches, filtered queries) cannot be matched to the contacts
+# a change touched, so it is dropped on every change.
+EXACT_KINDS = ('name', 'phone')
+
+class ContactCache:
+    """In-process LRU cache for phonebook reads
+
+    Entries expire after ttl seconds and the least recently used entry is
+    evicted once maxsize is reached. With listen(), a background thread
+    LISTENs on the contacts_changed channel fed by triggers on contacts, so
+    changes made by any process invalidate the affected entries.
+    """
+    def __init__(self, maxsize=10000, ttl=60.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.pattern_keys = set()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        # Bumped by every invalidation, so a load that raced with one is not stored
+        self.generation = 0
+        self.listener = None
+        self.stopping = threading.Event()
+
+    def get_or_load(self, key, loader):
+        """Return the cached value for key, calling loader() on a miss"""
+        now = time.monotonic()
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry[0] > now:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return list(entry[1])
+            self.misses += 1
+            generation = self.generation
+
+        value = loader()
+        self.put(key, value, generation)
+        return value
+
+    def put(self, key, value, generation=None):
+        """Store a value, evicting the least recently used entries if full
+
+        If generation is given and the cache has been invalidated since it
+        was read, the value may be stale and is not stored.
+        """
+        with self.lock:
+            if generation is not None and generation != self.generation:
+                return
+            self.entries[key] = (time.monotonic() + self.ttl, tuple(value))
+            self.entries.move_to_end(key)
+            if key[0] not in EXACT_KINDS:
+                self.pattern_keys.add(key)
+            while len(self.entries) > self.maxsize:
+                old_key, _ = self.entries.popitem(last=False)
+                self.pattern_keys.discard(old_key)
+                self.evictions += 1
+
+    def invalidate(self, first_names=(), phones=()):
+        """Drop entries for the given contact keys and every pattern entry"""
+        with self.lock:
+            self.generation += 1
+            keys = [('name', name) for name in first_names]
+            keys += [('phone', phone) for phone in phones]
+            keys += list(self.pattern_keys)
+            for key in keys:
+                if self.entries.pop(key, None) is not None:
+                    self.invalidations += 1
+            self.pattern_keys.clear()
+
+    def clear(self):
+        """Drop every entry"""
+        with self.lock:
+            self.generation += 1
+            self.invalidations += len(self.entries)
+            self.entries.clear()
+            self.pattern_keys.clear()
+
+    def stats(self):
+        """Return hit/miss/eviction/invalidation counters and current size"""
+        with self.lock:
+            return {
+                'size': len(self.entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations
+            }
+
+    def handle_notification(self, payload):
+        """Apply a contacts_changed notification to the cache"""
+        try:
+            message = json.loads(payload)
+        except ValueError:
+            message = {'all': True}
+        if message.get('all'):
+            self.clear()
+            return
+        contacts = message.get('contacts') or []
+        self.invalidate(
+            first_names=[contact['first_name'] for contact in contacts],
+            phones=[contact['phone'] for contact in contacts]
+        )
+
+    def listen(self, channel=NOTIFY_CHANNEL):
+        """Start invalidating entries from database change notifications"""
+        if self.listener is not None:
+            return
+        self.stopping.clear()
+        self.listener = threading.Thread(
+            target=self.listen_loop, args=(channel,), name="contact-cache-listener", daemon=True)
+        self.listener.start()
+
+    def stop(self):
+        """Stop the notification listener"""
+        if self.listener is not None:
+            self.stopping.set()
+            self.listener.join()
+            self.listener = None
+
+    def listen_loop(self, channel):
+        """Hold a dedicated LISTEN connection, reconnecting if it drops"""
+        while not self.stopping.is_set():
+            conn = None
+            try:
+                # LISTEN needs a connection of its own for as long as it runs,
+                # so this one does not come from the shared pool
+                conn = psycopg2.connect(**DB_CONFIG)
+                conn.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+                cur = conn.cursor()
+                cur.execute(f"LISTEN {channel}")
+                # Anything may have changed while we were not listening
+                self.clear()
+
+                while not self.stopping.is_set():
+                    if select.select([conn], [], [], 1.0) == ([], [], []):
+                        continue
+                    conn.poll()
+                    while conn.notifies:
+                        self.handle_notification(conn.notifies.pop(0).payload)
+            except (Exception, psycopg2.DatabaseError) as error:
+                print(f"Contact cache listener error: {error}")
+                self.clear()
+                self.stopping.wait(1.0)
+            finally:
+                if conn is not None:
+                    conn.close()
@@ -20,6 +20,118 @@ BEGIN
 END;
 $$ LANGUAGE plpgsql;
 
+-- Function to search contacts by pattern using the trigram indexes
+-- (created by migration 5 in migrations.py)
+-- Results are ordered by best similarity to the pattern; p_limit NULL
+-- returns every match. Without the pg_trgm extension the same rows are
+-- found by plain ILIKE and ordered exact phone match first, then values
+-- starting with the pattern, then the rest.
+-- Every match is ranked before the limit applies, so a pattern shorter
+-- than 3 characters returns nothing: it has no trigram for the indexes to
+-- narrow on and matches most of the table.
+CREATE OR REPLACE FUNCTION search_contacts_indexed(
+    search_pattern TEXT,
+    p_limit INTEGER DEFAULT NULL
+)
+RETURNS TABLE (
+    id INTEGER,
+    first_name VARCHAR(50),
+    last_name VARCHAR(50),
+    phone VARCHAR(20),
+    email VARCHAR(100),
+    created_at TIMESTAMP,
+    rank REAL
+) AS $$
+BEGIN
+    IF search_pattern IS NULL OR length(btrim(search_pattern)) < 3 THEN
+        RETURN;
+    END IF;
+    
+    IF EXISTS (SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm') THEN
+        RETURN QUERY
+        SELECT c.id, c.first_name, c.last_name, c.phone, c.email, c.created_at,
+               GREATEST(
+                   -- An exact phone match, however formatted, ranks first
+                   CASE WHEN c.phone_normalized = normalize_phone(search_pattern) THEN 1 ELSE 0 END,
+                   similarity(c.first_name, search_pattern),
+                   similarity(c.last_name, search_pattern),
+                   similarity(c.phone, search_pattern),
+                   similarity(c.email, search_pattern)
+               ) AS rank
+        FROM contacts c
+        WHERE 
+            c.phone_normalized = normalize_phone(search_pattern) OR
+            c.first_name ILIKE '%' || search_pattern || '%' OR
+            c.last_name ILIKE '%' || search_pattern || '%' OR
+            c.phone ILIKE '%' || search_pattern || '%' OR
+            c.email ILIKE '%' || search_pattern || '%'
+        ORDER BY rank DESC, c.id
+        LIMIT p_limit;
+    ELSE
+        RETURN QUERY
+        SELECT c.id, c.first_name, c.last_name, c.phone, c.email, c.created_at,
+               (CASE
+                   WHEN c.phone_normalized = normalize_phone(search_pattern) THEN 1
+                   WHEN c.first_name ILIKE search_pattern || '%' OR
+                        c.last_name ILIKE search_pattern || '%' OR
+                        c.phone ILIKE search_pattern || '%' OR
+                        c.email ILIKE search_pattern || '%' THEN 0.5
+                   ELSE 0
+               END)::REAL AS rank
+        FROM contacts c
+        WHERE 
+            c.phone_normalized = normalize_phone(search_pattern) OR
+            c.first_name ILIKE '%' || search_pattern || '%' OR
+            c.last_name ILIKE '%' || search_pattern || '%' OR
+            c.phone ILIKE '%' || search_pattern || '%' OR
+            c.email ILIKE '%' || search_pattern || '%'
+        ORDER BY rank DESC, c.id
+        LIMIT p_limit;
+    END IF;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Function to search contacts by words in their names and email
+-- Every word must match the start of a word in the first name, last name
+-- or email, in any order ("john smith gmail"); results are ordered by
+-- relevance, names weighing more than email. Uses the GIN index on
+-- search_vector (migration 7 in migrations.py).
+CREATE OR REPLACE FUNCTION search_contacts_fulltext(
+    search_query TEXT,
+    p_limit INTEGER DEFAULT 20
+)
+RETURNS TABLE (
+    id INTEGER,
+    first_name VARCHAR(50),
+    last_name VARCHAR(50),
+    phone VARCHAR(20),
+    email VARCHAR(100),
+    created_at TIMESTAMP,
+    rank REAL
+) AS $$
+DECLARE
+    v_query tsquery;
+BEGIN
+    -- Quote every word so user input can never be tsquery syntax
+    SELECT to_tsquery('simple', string_agg(quote_literal(w) || ':*', ' & '))
+    INTO v_query
+    FROM regexp_split_to_table(lower(search_query), '[^[:alnum:]]+') AS w
+    WHERE w <> '';
+    
+    IF v_query IS NULL THEN
+        RETURN;
+    END IF;
+    
+    RETURN QUERY
+    SELECT c.id, c.first_name, c.last_name, c.phone, c.email, c.created_at,
+           ts_rank_cd(c.search_vector, v_query) AS rank
+    FROM contacts c
+    WHERE c.search_vector @@ v_query
+    ORDER BY rank DESC, c.id
+    LIMIT p_limit;
+END;
+$$ LANGUAGE plpgsql;
+
 -- Procedure to insert or update a contact
 CREATE OR REPLACE PROCEDURE upsert_contact(
     p_first_name VARCHAR(50),
@@ -29,29 +141,20 @@ CREATE OR REPLACE PROCEDURE upsert_contact(
 )
 AS $$
 DECLARE
-    v_user_exists BOOLEAN;
+    v_inserted BOOLEAN;
 BEGIN
-    -- Check if user exists with the given first name
-    SELECT EXISTS (
-        SELECT 1 
-        FROM contacts 
-        WHERE first_name = p_first_name AND last_name = p_last_name
-    ) INTO v_user_exists;
+    -- Insert, or update the phone if the contact already exists
+    INSERT INTO contacts (first_name, last_name, phone, email)
+    VALUES (p_first_name, p_last_name, p_phone, p_email)
+    ON CONFLICT (first_name, last_name) DO UPDATE
+    SET phone = EXCLUDED.phone,
+        email = COALESCE(EXCLUDED.email, contacts.email)
+    RETURNING (xmax = 0) INTO v_inserted;
     
-    IF v_user_exists THEN
-        -- Update phone if user exists
-        UPDATE contacts
-        SET phone = p_phone,
-            email = COALESCE(p_email, email)
-        WHERE first_name = p_first_name AND last_name = p_last_name;
-        
-        RAISE NOTICE 'Contact updated: % %', p_first_name, p_last_name;
-    ELSE
-        -- Insert new contact
-        INSERT INTO contacts (first_name, last_name, phone, email)
-        VALUES (p_first_name, p_last_name, p_phone, p_email);
-        
+    IF v_inserted THEN
         RAISE NOTICE 'New contact added: % %', p_first_name, p_last_name;
+    ELSE
+        RAISE NOTICE 'Contact updated: % %', p_first_name, p_last_name;
     END IF;
 END;
 $$ LANGUAGE plpgsql;
@@ -66,6 +169,7 @@ END;
 $$ LANGUAGE plpgsql;
 
 -- Table type for bulk insert results
+DROP TYPE IF EXISTS contact_insert_result CASCADE;
 CREATE TYPE contact_insert_result AS (
     first_name VARCHAR(50),
     last_name VARCHAR(50),
@@ -73,72 +177,65 @@ CREATE TYPE contact_insert_result AS (
     status VARCHAR(50)
 );
 
--- Procedure to insert multiple contacts with validation
-CREATE OR REPLACE PROCEDURE insert_multiple_contacts(
+-- Function to insert multiple contacts with validation
+-- All valid rows are upserted with a single INSERT ... ON CONFLICT and one
+-- result row is returned per input row, in input order. When a contact
+-- appears more than once, the last occurrence wins, as if the rows had been
+-- upserted one at a time.
+DROP PROCEDURE IF EXISTS insert_multiple_contacts(VARCHAR[], VARCHAR[], VARCHAR[], VARCHAR[]);
+CREATE OR REPLACE FUNCTION insert_multiple_contacts(
     p_first_names VARCHAR(50)[],
     p_last_names VARCHAR(50)[],
     p_phones VARCHAR(20)[],
     p_emails VARCHAR(100)[] DEFAULT NULL
 )
 RETURNS SETOF contact_insert_result AS $$
-DECLARE
-    v_count INTEGER;
-    v_result contact_insert_result;
-    v_email VARCHAR(100);
 BEGIN
-    -- Get the count of input arrays
-    v_count := array_length(p_first_names, 1);
-    
     -- Check if all arrays have the same length
-    IF v_count != array_length(p_last_names, 1) OR v_count != array_length(p_phones, 1) THEN
+    IF array_length(p_last_names, 1) IS DISTINCT FROM array_length(p_first_names, 1)
+       OR array_length(p_phones, 1) IS DISTINCT FROM array_length(p_first_names, 1) THEN
         RAISE EXCEPTION 'Input arrays must have the same length';
     END IF;
     
-    -- Process each contact
-    FOR i IN 1..v_count LOOP
-        v_result.first_name := p_first_names[i];
-        v_result.last_name := p_last_names[i];
-        v_result.phone := p_phones[i];
-        
-        -- Validate phone number
-        IF NOT is_valid_phone(p_phones[i]) THEN
-            v_result.status := 'Invalid phone number';
-            RETURN NEXT v_result;
-            CONTINUE;
-        END IF;
-        
-        -- Get email if provided
-        IF p_emails IS NOT NULL AND i <= array_length(p_emails, 1) THEN
-            v_email := p_emails[i];
-        ELSE
-            v_email := NULL;
-        END IF;
-        
-        -- Check if contact exists
-        IF EXISTS (
-            SELECT 1 
-            FROM contacts 
-            WHERE first_name = p_first_names[i] AND last_name = p_last_names[i]
-        ) THEN
-            -- Update existing contact
-            UPDATE contacts
-            SET phone = p_phones[i],
-                email = COALESCE(v_email, email)
-            WHERE first_name = p_first_names[i] AND last_name = p_last_names[i];
-            
-            v_result.status := 'Updated';
-        ELSE
-            -- Insert new contact
-            INSERT INTO contacts (first_name, last_name, phone, email)
-            VALUES (p_first_names[i], p_last_names[i], p_phones[i], v_email);
-            
-            v_result.status := 'Inserted';
-        END IF;
-        
-        RETURN NEXT v_result;
-    END LOOP;
-    
-    RETURN;
+    RETURN QUERY
+    WITH input AS (
+        SELECT i.n, i.first_name, i.last_name, i.phone, p_emails[i.n] AS email,
+               COALESCE(is_valid_phone(i.phone), FALSE) AS is_valid
+        FROM unnest(p_first_names, p_last_names, p_phones)
+             WITH ORDINALITY AS i(first_name, last_name, phone, n)
+    ),
+    latest AS (
+        -- One row per contact: latest phone, latest non-null email
+        SELECT first_name, last_name,
+               (array_agg(phone ORDER BY n DESC))[1] AS phone,
+               (array_agg(email ORDER BY n DESC) FILTER (WHERE email IS NOT NULL))[1] AS email
+        FROM input
+        WHERE is_valid
+        GROUP BY first_name, last_name
+    ),
+    upserted AS (
+        INSERT INTO contacts (first_name, last_name, phone, email)
+        SELECT first_name, last_name, phone, email
+        FROM latest
+        ON CONFLICT (first_name, last_name) DO UPDATE
+        SET phone = EXCLUDED.phone,
+            email = COALESCE(EXCLUDED.email, contacts.email)
+        RETURNING contacts.first_name, contacts.last_name, (xmax = 0) AS inserted
+    )
+    SELECT i.first_name::VARCHAR(50), i.last_name::VARCHAR(50), i.phone::VARCHAR(20),
+           (CASE
+               WHEN NOT i.is_valid THEN 'Invalid phone number'
+               -- Only the first occurrence of a new contact inserts it
+               WHEN u.inserted AND i.n = MIN(i.n) OVER (
+                   PARTITION BY i.is_valid, i.first_name, i.last_name) THEN 'Inserted'
+               ELSE 'Updated'
+           END)::VARCHAR(50)
+    FROM input i
+    LEFT JOIN upserted u
+        ON i.is_valid
+       AND u.first_name = i.first_name
+       AND u.last_name IS NOT DISTINCT FROM i.last_name
+    ORDER BY i.n;
 END;
 $$ LANGUAGE plpgsql;
 
@@ -165,16 +262,75 @@ BEGIN
 END;
 $$ LANGUAGE plpgsql;
 
+-- Function to get contacts with keyset pagination
+-- Returns the page that follows the given key instead of skipping rows
+-- with OFFSET, so every page costs the same. p_sort is 'id' or 'name'
+-- (last name, first name); pass the key of the last row of the previous
+-- page, or NULLs for the first page. Name order is backed by
+-- contacts_name_keyset_idx (migration 4 in migrations.py).
+CREATE OR REPLACE FUNCTION get_contacts_keyset(
+    p_limit INTEGER DEFAULT 10,
+    p_sort TEXT DEFAULT 'id',
+    p_after_id INTEGER DEFAULT NULL,
+    p_after_last_name VARCHAR(50) DEFAULT NULL,
+    p_after_first_name VARCHAR(50) DEFAULT NULL
+)
+RETURNS TABLE (
+    id INTEGER,
+    first_name VARCHAR(50),
+    last_name VARCHAR(50),
+    phone VARCHAR(20),
+    email VARCHAR(100),
+    created_at TIMESTAMP
+) AS $$
+BEGIN
+    IF p_sort = 'id' THEN
+        IF p_after_id IS NULL THEN
+            RETURN QUERY
+            SELECT c.id, c.first_name, c.last_name, c.phone, c.email, c.created_at
+            FROM contacts c
+            ORDER BY c.id
+            LIMIT p_limit;
+        ELSE
+            RETURN QUERY
+            SELECT c.id, c.first_name, c.last_name, c.phone, c.email, c.created_at
+            FROM contacts c
+            WHERE c.id > p_after_id
+            ORDER BY c.id
+            LIMIT p_limit;
+        END IF;
+    ELSIF p_sort = 'name' THEN
+        IF p_after_id IS NULL THEN
+            RETURN QUERY
+            SELECT c.id, c.first_name, c.last_name, c.phone, c.email, c.created_at
+            FROM contacts c
+            ORDER BY COALESCE(c.last_name, ''), c.first_name, c.id
+            LIMIT p_limit;
+        ELSE
+            RETURN QUERY
+            SELECT c.id, c.first_name, c.last_name, c.phone, c.email, c.created_at
+            FROM contacts c
+            WHERE (COALESCE(c.last_name, ''), c.first_name, c.id)
+                > (COALESCE(p_after_last_name, ''), p_after_first_name, p_after_id)
+            ORDER BY COALESCE(c.last_name, ''), c.first_name, c.id
+            LIMIT p_limit;
+        END IF;
+    ELSE
+        RAISE EXCEPTION 'Unsupported sort order: %', p_sort;
+    END IF;
+END;
+$$ LANGUAGE plpgsql;
+
 -- Procedure to delete contact by username or phone
 CREATE OR REPLACE PROCEDURE delete_contact_by_identifier(p_identifier VARCHAR)
 AS $$
 DECLARE
     v_deleted_count INTEGER;
 BEGIN
-    -- Delete by first name or phone
+    -- Delete by first name or phone, in any formatting of the number
     WITH deleted AS (
         DELETE FROM contacts
-        WHERE first_name = p_identifier OR phone = p_identifier
+        WHERE first_name = p_identifier OR phone_normalized = normalize_phone(p_identifier)
         RETURNING *
     )
     SELECT COUNT(*) INTO v_deleted_count FROM deleted;
@@ -185,4 +341,106 @@ BEGIN
         RAISE NOTICE 'No contacts found with identifier: %', p_identifier;
     END IF;
 END;
-$$ LANGUAGE plpgsql; 
\ No newline at end of file
+$$ LANGUAGE plpgsql; 
+
+-- Function to delete contacts by many usernames or phones at once
+-- One statement in the caller's transaction; returns how many contacts
+-- each identifier matched, in input order. A contact matched by several
+-- identifiers counts for each of them.
+CREATE OR REPLACE FUNCTION delete_contacts_by_identifiers(p_identifiers VARCHAR[])
+RETURNS TABLE (
+    identifier VARCHAR,
+    deleted_count INTEGER
+) AS $$
+DECLARE
+    -- A plain array rather than a subquery, so the planner can use the
+    -- phone_normalized index instead of scanning for every element
+    v_phones VARCHAR[] := ARRAY(
+        SELECT p.phone
+        FROM (SELECT normalize_phone(i) AS phone FROM unnest(p_identifiers) AS i) p
+        WHERE p.phone IS NOT NULL
+    );
+BEGIN
+    RETURN QUERY
+    WITH keys AS (
+        SELECT i.identifier, normalize_phone(i.identifier) AS phone, i.n
+        FROM unnest(p_identifiers) WITH ORDINALITY AS i(identifier, n)
+    ),
+    deleted AS (
+        DELETE FROM contacts c
+        WHERE c.first_name = ANY(p_identifiers)
+           OR c.phone_normalized = ANY(v_phones)
+        RETURNING c.id, c.first_name, c.phone_normalized
+    ),
+    matches AS (
+        -- Two equi-joins rather than one join on OR, so both can hash
+        SELECT k.n, d.id FROM keys k JOIN deleted d ON d.first_name = k.identifier
+        UNION
+        SELECT k.n, d.id FROM keys k JOIN deleted d ON d.phone_normalized = k.phone
+    )
+    SELECT k.identifier, COUNT(m.id)::INTEGER
+    FROM keys k
+    LEFT JOIN matches m ON m.n = k.n
+    GROUP BY k.n, k.identifier
+    ORDER BY k.n;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Trigger function to announce contact changes to cache listeners
+-- Sends one notification per statement on the contacts_changed channel,
+-- listing the (first_name, normalized phone) keys it touched, or {"all": true} when
+-- it touched too many rows to list or the table was truncated.
+CREATE OR REPLACE FUNCTION notify_contacts_changed()
+RETURNS TRIGGER AS $$
+DECLARE
+    v_max_keys CONSTANT INTEGER := 50;
+    v_keys JSON;
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        SELECT json_agg(k) INTO v_keys
+        FROM (SELECT first_name, phone_normalized AS phone FROM new_rows LIMIT v_max_keys + 1) k;
+    ELSIF TG_OP = 'UPDATE' THEN
+        SELECT json_agg(k) INTO v_keys
+        FROM (
+            SELECT first_name, phone_normalized AS phone FROM old_rows
+            UNION
+            SELECT first_name, phone_normalized AS phone FROM new_rows
+            LIMIT v_max_keys + 1
+        ) k;
+    ELSIF TG_OP = 'DELETE' THEN
+        SELECT json_agg(k) INTO v_keys
+        FROM (SELECT first_name, phone_normalized AS phone FROM old_rows LIMIT v_max_keys + 1) k;
+    END IF;
+    
+    IF TG_OP = 'TRUNCATE' OR json_array_length(v_keys) > v_max_keys THEN
+        PERFORM pg_notify('contacts_changed', '{"all": true}');
+    ELSIF v_keys IS NOT NULL THEN
+        PERFORM pg_notify('contacts_changed', json_build_object('contacts', v_keys)::text);
+    END IF;
+    
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS contacts_notify_insert ON contacts;
+CREATE TRIGGER contacts_notify_insert
+    AFTER INSERT ON contacts
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION notify_contacts_changed();
+
+DROP TRIGGER IF EXISTS contacts_notify_update ON contacts;
+CREATE TRIGGER contacts_notify_update
+    AFTER UPDATE ON contacts
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION notify_contacts_changed();
+
+DROP TRIGGER IF EXISTS contacts_notify_delete ON contacts;
+CREATE TRIGGER contacts_notify_delete
+    AFTER DELETE ON contacts
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION notify_contacts_changed();
+
+DROP TRIGGER IF EXISTS contacts_notify_truncate ON contacts;
+CREATE TRIGGER contacts_notify_truncate
+    AFTER TRUNCATE ON contacts
+    FOR EACH STATEMENT EXECUTE FUNCTION notify_contacts_changed();
@@ -1,49 +1,48 @@
 #!/usr/bin/env python3
 
+import argparse
 import psycopg2
 import sys
 sys.path.append("..")
-from config import DB_CONFIG
+from db_pool import transaction
+from migrations import migrate
 
-def create_tables():
-    """Create tables in PostgreSQL database"""
+def drop_tables():
+    """Drop the contacts table and its migration history"""
     commands = (
         """
         DROP TABLE IF EXISTS contacts CASCADE
         """,
         """
-        CREATE TABLE contacts (
-            id SERIAL PRIMARY KEY,
-            first_name VARCHAR(50) NOT NULL,
-            last_name VARCHAR(50),
-            phone VARCHAR(20) NOT NULL,
-            email VARCHAR(100),
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
+        DROP TABLE IF EXISTS schema_migrations
         """
     )
     
-    conn = None
     try:
-        conn = psycopg2.connect(**DB_CONFIG)
-        cur = conn.cursor()
-        
-        # Create tables
-        for command in commands:
-            cur.execute(command)
-        
-        # Close communication with the PostgreSQL database
-        cur.close()
-        
-        # Commit the changes
-        conn.commit()
-        print("Tables created successfully")
+        with transaction() as cur:
+            for command in commands:
+                cur.execute(command)
+        print("Tables dropped")
+        return True
         
     except (Exception, psycopg2.DatabaseError) as error:
         print(f"Error: {error}")
-    finally:
-        if conn is not None:
-            conn.close()
+        return False
+
+def create_tables():
+    """Create or upgrade tables in PostgreSQL database
+    
+    Applies the pending migrations from migrations.py, so existing data
+    is kept.
+    """
+    if migrate():
+        print("Tables created successfully")
 
 if __name__ == '__main__':
-    create_tables() 
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Create or upgrade the contacts schema")
+    parser.add_argument("--reset", action="store_true",
+                        help="drop the contacts table first (destroys all contacts)")
+    args = parser.parse_args()
+    
+    if not args.reset or drop_tables():
+        create_tables()
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+
+import argparse
+import gzip
+import io
+import time
+import psycopg2
+import sys
+sys.path.append("..")
+from db_pool import transaction
+
+WRITE_BUFFER_SIZE = 1024 * 1024
+
+class CountingWriter:
+    """Binary file wrapper that counts the bytes written through it"""
+    def __init__(self, raw):
+        self.raw = raw
+        self.bytes_written = 0
+
+    def write(self, data):
+        self.bytes_written += len(data)
+        return self.raw.write(data)
+
+def copy_to_csv(output, sql, values=None, compress=None, compress_level=1):
+    """Export the result of a query as CSV with COPY ... TO STDOUT
+
+    The server formats the CSV and the bytes are streamed straight into the
+    output, so no Python row objects are built and memory use is constant.
+
+    Args:
+        output: File path, '-' for stdout, or a writable binary file object
+        sql: SELECT statement to export
+        values: Parameters for sql
+        compress: gzip the output; defaults to True for paths ending in .gz
+        compress_level: gzip level, 1 (fastest) to 9 (smallest)
+
+    Returns:
+        Tuple (rows, bytes) with the number of rows and uncompressed CSV bytes
+    """
+    if compress is None:
+        compress = isinstance(output, str) and output.endswith('.gz')
+
+    if output == '-':
+        target, owned = sys.stdout.buffer, False
+    elif isinstance(output, str):
+        target, owned = open(output, 'wb'), True
+    else:
+        target, owned = output, False
+
+    stream = target
+    gzip_stream = None
+    buffered = None
+    try:
+        if compress:
+            gzip_stream = gzip.GzipFile(fileobj=target, mode='wb', compresslevel=compress_level)
+            stream = gzip_stream
+        # COPY hands over one row per write; batch them before gzip or the file
+        buffered = io.BufferedWriter(stream, buffer_size=WRITE_BUFFER_SIZE)
+        writer = CountingWriter(buffered)
+
+        with transaction() as cur:
+            # COPY takes no parameters, so inline them safely first
+            query = cur.mogrify(sql, values).decode()
+            cur.copy_expert(f"COPY ({query}) TO STDOUT WITH (FORMAT csv, HEADER true)", writer)
+            rows = cur.rowcount
+
+        return rows, writer.bytes_written
+    finally:
+        # Detach rather than close, so the buffer never closes the target
+        if buffered is not None:
+            buffered.flush()
+            buffered.detach()
+        if gzip_stream is not None:
+            gzip_stream.close()
+        if owned:
+            target.close()
+        else:
+            target.flush()
+
+def main():
+    from phonebook import PhoneBook
+
+    parser = argparse.ArgumentParser(description="Export contacts to CSV with COPY")
+    parser.add_argument("-o", "--output", default="-",
+                        help="output file, '-' for stdout (default); .gz enables gzip")
+    parser.add_argument("--gzip", action="store_true", help="gzip the output")
+    parser.add_argument("--compress-level", type=int, default=1,
+                        help="gzip compression level 1-9 (default: 1, fastest)")
+    parser.add_argument("--first-name", help="only contacts whose first name contains this")
+    parser.add_argument("--last-name", help="only contacts whose last name contains this")
+    parser.add_argument("--phone", help="only contacts whose phone contains this")
+    args = parser.parse_args()
+
+    # Keep stdout clean for the CSV when exporting to it
+    log = sys.stderr if args.output == '-' else sys.stdout
+    filters = {'first_name': args.first_name, 'last_name': args.last_name, 'phone': args.phone}
+
+    try:
+        started = time.perf_counter()
+        rows, size = PhoneBook().export_contacts(args.output, filters, args.gzip or None, args.compress_level)
+        elapsed = time.perf_counter() - started
+    except (Exception, psycopg2.DatabaseError) as error:
+        print(f"Error exporting contacts: {error}", file=log)
+        sys.exit(1)
+
+    megabytes = size / (1024 * 1024)
+    print(f"Exported {rows} contacts ({megabytes:.1f} MB of CSV) in {elapsed:.2f}s: "
+          f"{rows / elapsed:,.0f} rows/sec, {megabytes / elapsed:.1f} MB/sec", file=log)
+
+if __name__ == "__main__":
+    main()
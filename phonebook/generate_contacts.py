@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+
+import argparse
+import csv
+import random
+import sys
+sys.path.append("..")
+from batch_import import CONTACT_COLUMNS
+from benchmark_search import BENCH_EMAIL_DOMAIN, FIRST_NAMES, LAST_NAMES
+
+# Phone values that is_valid_phone rejects, in the shapes seen in real files
+INVALID_PHONES = ['123456', '+1XXX222333Y', 'ABC123', '+1234567890123456789', '555-CALL-NOW']
+
+def generate_contacts(rows, duplicate_ratio=0.0, invalid_ratio=0.0, seed=42, start=1):
+    """Yield synthetic (first_name, last_name, phone, email) contacts
+
+    Contact g is named and numbered like the contacts seeded by
+    benchmark_search, so its search patterns hit the generated data, and
+    has an @bench.example email so cleanup_contacts removes it again.
+
+    Args:
+        rows: Number of contacts to generate
+        duplicate_ratio: Share of rows that repeat the name of an earlier
+            row with a new phone, which an import turns into an update
+        invalid_ratio: Share of rows with a phone number is_valid_phone rejects
+        seed: Random seed; the same arguments always give the same rows
+        start: Number of the first contact, to generate disjoint sets
+    """
+    rng = random.Random(seed)
+    for g in range(start, start + rows):
+        name = g
+        if g > start and rng.random() < duplicate_ratio:
+            name = rng.randrange(start, g)
+        if rng.random() < invalid_ratio:
+            phone = rng.choice(INVALID_PHONES)
+        else:
+            phone = '+1' + str(g).zfill(10)
+        yield (f"{FIRST_NAMES[name % 10]}{name}", f"{LAST_NAMES[(name // 10) % 10]}{name}",
+               phone, f"user{g}@{BENCH_EMAIL_DOMAIN}")
+
+def write_contacts_csv(file_path, rows, duplicate_ratio=0.0, invalid_ratio=0.0, seed=42):
+    """Write a synthetic contacts CSV in the format batch_import reads"""
+    with open(file_path, 'w', newline='') as file:
+        writer = csv.writer(file)
+        writer.writerow(CONTACT_COLUMNS)
+        writer.writerows(generate_contacts(rows, duplicate_ratio, invalid_ratio, seed))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate a synthetic contacts CSV file")
+    parser.add_argument("file_path", help="CSV file to write")
+    parser.add_argument("--rows", type=int, default=100000,
+                        help="number of contacts to generate (default: 100000)")
+    parser.add_argument("--duplicate-ratio", type=float, default=0.1,
+                        help="share of rows repeating an earlier contact's name (default: 0.1)")
+    parser.add_argument("--invalid-ratio", type=float, default=0.05,
+                        help="share of rows with an invalid phone number (default: 0.05)")
+    parser.add_argument("--seed", type=int, default=42, help="random seed (default: 42)")
+    args = parser.parse_args()
+
+    write_contacts_csv(args.file_path, args.rows, args.duplicate_ratio, args.invalid_ratio, args.seed)
+    print(f"Wrote {args.rows} contacts to {args.file_path}")
@@ -0,0 +1,408 @@
+#!/usr/bin/env python3
+
+import argparse
+import json
+import psycopg2
+import sys
+sys.path.append("..")
+from db_pool import connection
+
+# Arbitrary key for the advisory lock that keeps two runners from migrating at once
+MIGRATION_LOCK_ID = 720_615_001
+
+def index(name, definition, unique=False):
+    """Migration step that builds an index with CREATE INDEX CONCURRENTLY"""
+    return {'index': name, 'definition': definition, 'unique': unique}
+
+# Which of two same-named contacts to keep is not ours to guess, so stop
+# with the names to merge by hand before adding a unique name key. GROUP BY
+# puts contacts with no last name together, as the key does.
+DUPLICATE_NAMES_CHECK = """
+    DO $$
+    DECLARE
+        v_groups INTEGER;
+        v_examples TEXT;
+    BEGIN
+        SELECT COUNT(*), string_agg(name, ', ') FILTER (WHERE n <= 5)
+        INTO v_groups, v_examples
+        FROM (
+            SELECT first_name || ' ' || COALESCE(last_name, '') AS name,
+                   ROW_NUMBER() OVER (ORDER BY first_name, last_name) AS n
+            FROM contacts
+            GROUP BY first_name, last_name
+            HAVING COUNT(*) > 1
+        ) duplicates;
+        IF v_groups > 0 THEN
+            RAISE EXCEPTION 'contacts has % name(s) shared by several contacts, e.g. %', v_groups, v_examples
+                USING HINT = 'Merge or delete the duplicates, then run the migrations again.';
+        END IF;
+    END;
+    $$
+    """
+
+# Each migration is a list of steps applied in order: plain SQL strings run
+# together in one transaction, index() steps are built concurrently outside
+# of any transaction so that the table stays writable. Steps must be safe to
+# re-run, since a failed concurrent build leaves earlier steps applied.
+# A migration with 'requires' needs that extension; on a server that does not
+# ship it, the migration is skipped and stays pending, and later migrations
+# must not depend on it.
+MIGRATIONS = [
+    {
+        'version': 1,
+        'description': 'Create contacts table',
+        'steps': [
+            """
+            CREATE TABLE IF NOT EXISTS contacts (
+                id SERIAL PRIMARY KEY,
+                first_name VARCHAR(50) NOT NULL,
+                last_name VARCHAR(50),
+                phone VARCHAR(20) NOT NULL,
+                email VARCHAR(100),
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+            """,
+        ]
+    },
+    {
+        'version': 2,
+        'description': 'Unique contact key (first_name, last_name)',
+        'steps': [
+            DUPLICATE_NAMES_CHECK,
+            index('contacts_name_key', 'contacts (first_name, last_name)', unique=True),
+            """
+            DO $$
+            BEGIN
+                IF NOT EXISTS (SELECT 1 FROM pg_constraint WHERE conname = 'contacts_name_key') THEN
+                    ALTER TABLE contacts
+                    ADD CONSTRAINT contacts_name_key UNIQUE USING INDEX contacts_name_key;
+                END IF;
+            END;
+            $$
+            """,
+        ]
+    },
+    {
+        # first_name lookups are served by the leading column of contacts_name_key
+        'version': 3,
+        'description': 'Index phone lookups',
+        'steps': [
+            index('contacts_phone_idx', 'contacts (phone)'),
+        ]
+    },
+    {
+        'version': 4,
+        'description': 'Index keyset pagination by name',
+        'steps': [
+            index('contacts_name_keyset_idx', "contacts ((COALESCE(last_name, '')), first_name, id)"),
+        ]
+    },
+    {
+        # Optional: search_contacts_indexed falls back to plain ILIKE without it
+        'version': 5,
+        'description': 'Trigram indexes for substring search',
+        'requires': 'pg_trgm',
+        'steps': [
+            "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+            index('contacts_first_name_trgm_idx', 'contacts USING gin (first_name gin_trgm_ops)'),
+            index('contacts_last_name_trgm_idx', 'contacts USING gin (last_name gin_trgm_ops)'),
+            index('contacts_phone_trgm_idx', 'contacts USING gin (phone gin_trgm_ops)'),
+            index('contacts_email_trgm_idx', 'contacts USING gin (email gin_trgm_ops)'),
+        ]
+    },
+    {
+        # Phone lookups compare phone_normalized, so '+7701...' and
+        # '7 701 ...' find the same contact; phone itself keeps what was entered
+        'version': 6,
+        'description': 'Normalized phone column for exact phone lookups',
+        'steps': [
+            r"""
+            CREATE OR REPLACE FUNCTION normalize_phone(phone TEXT)
+            RETURNS TEXT AS $$
+                SELECT CASE
+                    WHEN phone ~ '^\s*\+?[0-9][0-9\s().-]*$'
+                    THEN '+' || regexp_replace(phone, '[^0-9]', '', 'g')
+                END
+            $$ LANGUAGE sql IMMUTABLE STRICT PARALLEL SAFE
+            """,
+            # Not online: adding a STORED column rewrites the whole table
+            # under an ACCESS EXCLUSIVE lock, blocking reads and writes until
+            # it is done. Run it in a quiet window on a large table.
+            # 21 characters: the '+' plus up to 20 digits of phone
+            """
+            ALTER TABLE contacts ADD COLUMN IF NOT EXISTS phone_normalized VARCHAR(21)
+                GENERATED ALWAYS AS (normalize_phone(phone)) STORED
+            """,
+            index('contacts_phone_normalized_idx', 'contacts (phone_normalized)'),
+            # Superseded: nothing looks up the raw phone any more
+            "DROP INDEX IF EXISTS contacts_phone_idx",
+        ]
+    },
+    {
+        # 'simple' keeps names unstemmed; emails are split on punctuation so
+        # that 'gmail' matches john.smith@gmail.com
+        'version': 7,
+        'description': 'Full-text search vector over names and email',
+        'steps': [
+            # Rewrites the table under an ACCESS EXCLUSIVE lock, like migration 6
+            """
+            ALTER TABLE contacts ADD COLUMN IF NOT EXISTS search_vector tsvector
+                GENERATED ALWAYS AS (
+                    setweight(to_tsvector('simple', COALESCE(first_name, '')), 'A') ||
+                    setweight(to_tsvector('simple', COALESCE(last_name, '')), 'A') ||
+                    setweight(to_tsvector('simple',
+                        regexp_replace(COALESCE(email, ''), '[@._+-]', ' ', 'g')), 'B')
+                ) STORED
+            """,
+            index('contacts_search_vector_idx', 'contacts USING gin (search_vector)'),
+        ]
+    },
+    {
+        # normalize_phone adds a '+', so a 20-digit phone did not fit the
+        # VARCHAR(20) migration 6 first created. Widening a VARCHAR only
+        # changes the catalog: on PostgreSQL 16 the table and
+        # contacts_phone_normalized_idx keep their relfilenode, so neither is
+        # rewritten. The ACCESS EXCLUSIVE lock is still taken, but only for
+        # the catalog update.
+        'version': 8,
+        'description': 'Widen phone_normalized to 21 characters',
+        'steps': [
+            "ALTER TABLE contacts ALTER COLUMN phone_normalized TYPE VARCHAR(21)",
+        ]
+    },
+    {
+        # A plain UNIQUE treats NULLs as distinct, so any number of contacts
+        # with no last name could share a first name and ON CONFLICT never
+        # fired for them. NULLS NOT DISTINCT needs PostgreSQL 15. The new
+        # index is built concurrently; swapping the constraint onto it only
+        # holds an ACCESS EXCLUSIVE lock for the catalog change.
+        'version': 9,
+        'description': 'Treat a missing last name as a name in the unique contact key',
+        'steps': [
+            DUPLICATE_NAMES_CHECK,
+            index('contacts_name_nulls_key', 'contacts (first_name, last_name) NULLS NOT DISTINCT',
+                  unique=True),
+            """
+            DO $$
+            BEGIN
+                IF EXISTS (SELECT 1 FROM pg_class WHERE relname = 'contacts_name_nulls_key') THEN
+                    ALTER TABLE contacts
+                    DROP CONSTRAINT IF EXISTS contacts_name_key,
+                    ADD CONSTRAINT contacts_name_key UNIQUE USING INDEX contacts_name_nulls_key;
+                END IF;
+            END;
+            $$
+            """,
+        ]
+    },
+]
+
+# Application queries that should be answered from an index, with sample
+# parameters for EXPLAIN
+INDEXED_QUERIES = [
+    ('update_contact by phone',
+     "UPDATE contacts SET email = %s WHERE phone_normalized = normalize_phone(%s)",
+     ('x@example.com', '+10000000000')),
+    ('update_contact by first name',
+     "UPDATE contacts SET email = %s WHERE first_name = %s", ('x@example.com', 'John')),
+    ('delete_contact by phone',
+     "DELETE FROM contacts WHERE phone_normalized = normalize_phone(%s)", ('+10000000000',)),
+    ('delete_contact by first name',
+     "DELETE FROM contacts WHERE first_name = %s", ('John',)),
+    ('delete_contact_by_identifier',
+     "DELETE FROM contacts WHERE first_name = %s OR phone_normalized = normalize_phone(%s)",
+     ('John', '+10000000000')),
+    ('lookup_contact by phone',
+     "SELECT * FROM contacts WHERE phone_normalized = normalize_phone(%s)", ('+10000000000',)),
+    ('upsert_contact lookup',
+     "SELECT 1 FROM contacts WHERE first_name = %s AND last_name IS NOT DISTINCT FROM %s", ('John', 'Doe')),
+    ('get_contacts_keyset by id',
+     "SELECT * FROM contacts WHERE id > %s ORDER BY id LIMIT 10", (100,)),
+    ('get_contacts_keyset by name',
+     """
+     SELECT * FROM contacts
+     WHERE (COALESCE(last_name, ''), first_name, id) > (%s, %s, %s)
+     ORDER BY COALESCE(last_name, ''), first_name, id LIMIT 10
+     """, ('Doe', 'John', 100)),
+    ('search_contacts_fulltext',
+     "SELECT * FROM contacts WHERE search_vector @@ to_tsquery('simple', %s)", ("'john':* & 'smith':*",)),
+    ('search_contacts_indexed',
+     """
+     SELECT * FROM contacts
+     WHERE first_name ILIKE %s OR last_name ILIKE %s OR phone ILIKE %s OR email ILIKE %s
+     """, ('%john%',) * 4),
+]
+
+def ensure_migrations_table(cur):
+    """Create the table that records applied migrations"""
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version INTEGER PRIMARY KEY,
+            description TEXT NOT NULL,
+            applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+def applied_versions(cur):
+    """Return the set of migration versions already applied"""
+    cur.execute("SELECT version FROM schema_migrations")
+    return {row[0] for row in cur.fetchall()}
+
+def available_extensions(cur):
+    """Return the names of the extensions this server can install"""
+    cur.execute("SELECT name FROM pg_available_extensions")
+    return {row[0] for row in cur.fetchall()}
+
+def build_index(conn, step):
+    """Build one index concurrently, replacing a leftover invalid build"""
+    cur = conn.cursor()
+    cur.execute("""
+        SELECT i.indisvalid
+        FROM pg_class c
+        JOIN pg_index i ON i.indexrelid = c.oid
+        WHERE c.relname = %s
+    """, (step['index'],))
+    row = cur.fetchone()
+    if row and not row[0]:
+        # An interrupted CONCURRENTLY build leaves an invalid index behind
+        cur.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {step['index']}")
+    cur.execute("CREATE {}INDEX CONCURRENTLY IF NOT EXISTS {} ON {}".format(
+        'UNIQUE ' if step['unique'] else '', step['index'], step['definition']))
+    cur.close()
+
+def apply_migration(conn, migration):
+    """Apply one migration and record it in schema_migrations"""
+    cur = conn.cursor()
+    for step in migration['steps']:
+        if isinstance(step, dict):
+            # CREATE INDEX CONCURRENTLY cannot run inside a transaction
+            conn.commit()
+            conn.autocommit = True
+            try:
+                build_index(conn, step)
+            finally:
+                conn.autocommit = False
+        else:
+            cur.execute(step)
+    cur.execute(
+        "INSERT INTO schema_migrations (version, description) VALUES (%s, %s)",
+        (migration['version'], migration['description'])
+    )
+    conn.commit()
+    cur.close()
+
+def migrate():
+    """Apply all pending migrations in version order, without dropping data
+
+    Migrations needing an extension the server does not have are skipped
+    and stay pending.
+    """
+    try:
+        with connection() as conn:
+            cur = conn.cursor()
+            # Session-level lock, so it survives the commits between steps
+            cur.execute("SELECT pg_advisory_lock(%s)", (MIGRATION_LOCK_ID,))
+            try:
+                ensure_migrations_table(cur)
+                conn.commit()
+                done = applied_versions(cur)
+                extensions = available_extensions(cur)
+                pending = [m for m in MIGRATIONS if m['version'] not in done]
+
+                applied = 0
+                for migration in pending:
+                    required = migration.get('requires')
+                    if required is not None and required not in extensions:
+                        print(f"Skipping migration {migration['version']}: {migration['description']} "
+                              f"(the {required} extension is not available on this server)")
+                        continue
+                    print(f"Applying migration {migration['version']}: {migration['description']}...")
+                    apply_migration(conn, migration)
+                    applied += 1
+                if applied:
+                    print(f"Applied {applied} migration(s).")
+                elif not pending:
+                    print("Schema is up to date.")
+            except (Exception, psycopg2.DatabaseError):
+                conn.rollback()
+                raise
+            finally:
+                cur.execute("SELECT pg_advisory_unlock(%s)", (MIGRATION_LOCK_ID,))
+                conn.commit()
+                cur.close()
+        return True
+    except (Exception, psycopg2.DatabaseError) as error:
+        print(f"Error applying migrations: {error}")
+        return False
+
+def print_status():
+    """Print every known migration and whether it has been applied"""
+    try:
+        with connection() as conn:
+            cur = conn.cursor()
+            ensure_migrations_table(cur)
+            conn.commit()
+            done = applied_versions(cur)
+            cur.close()
+        for migration in MIGRATIONS:
+            state = "applied" if migration['version'] in done else "pending"
+            note = f" (needs {migration['requires']})" if 'requires' in migration else ""
+            print("{:>4}  {:<8} {}{}".format(migration['version'], state, migration['description'], note))
+    except (Exception, psycopg2.DatabaseError) as error:
+        print(f"Error reading migration status: {error}")
+
+def seq_scans(plan):
+    """Return the relations read with a sequential scan anywhere in a plan"""
+    found = []
+    if plan.get('Node Type') == 'Seq Scan':
+        found.append(plan.get('Relation Name'))
+    for child in plan.get('Plans', []):
+        found.extend(seq_scans(child))
+    return found
+
+def check_indexes():
+    """EXPLAIN the application queries and report those without index support
+
+    Sequential scans are disabled while planning, so a query that still
+    plans a Seq Scan on contacts has no usable index at all, whatever the
+    current table size.
+    """
+    missing = []
+    try:
+        with connection() as conn:
+            cur = conn.cursor()
+            cur.execute("SET LOCAL enable_seqscan = off")
+            for name, sql, params in INDEXED_QUERIES:
+                cur.execute("EXPLAIN (FORMAT JSON) " + sql, params)
+                plan = cur.fetchone()[0]
+                if isinstance(plan, str):
+                    plan = json.loads(plan)
+                if 'contacts' in seq_scans(plan[0]['Plan']):
+                    missing.append(name)
+                    print(f"  MISSING  {name}")
+                else:
+                    print(f"  ok       {name}")
+            conn.rollback()
+            cur.close()
+    except (Exception, psycopg2.DatabaseError) as error:
+        print(f"Error checking indexes: {error}")
+        return None
+
+    if missing:
+        print(f"\n{len(missing)} quer(ies) still lack index support.")
+    else:
+        print("\nAll application queries are index-supported.")
+    return missing
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Apply and inspect contacts schema migrations")
+    parser.add_argument("--status", action="store_true", help="list migrations and whether they are applied")
+    parser.add_argument("--check", action="store_true", help="EXPLAIN application queries and report missing indexes")
+    args = parser.parse_args()
+
+    if args.status:
+        print_status()
+    elif args.check:
+        check_indexes()
+    else:
+        migrate()
@@ -0,0 +1,26 @@
+#!/usr/bin/env python3
+
+import re
+
+# Same rule as the normalize_phone database function (migration 6), which
+# maintains contacts.phone_normalized
+PHONE_SHAPE = re.compile(r'^\s*\+?[0-9][0-9\s().-]*$')
+NON_DIGITS = re.compile(r'[^0-9]')
+
+def normalize_phone(phone):
+    """Return the canonical '+digits' form of a phone number
+
+    Spaces, dashes, dots and brackets are dropped and a leading + is added,
+    so '+7 701 123-45-67' and '77011234567' give the same key. Returns None
+    for anything that does not look like a phone number, such as a name.
+    """
+    if phone is None or not PHONE_SHAPE.match(phone):
+        return None
+    return '+' + NON_DIGITS.sub('', phone)
+
+# Same rule as the is_valid_phone database function
+VALID_PHONE = re.compile(r'\+?[0-9]{10,15}')
+
+def is_valid_phone(phone):
+    """Check a phone number the way the import validates it"""
+    return phone is not None and VALID_PHONE.fullmatch(phone) is not None
@@ -1,21 +1,51 @@
 #!/usr/bin/env python3
 
 import psycopg2
+import psycopg2.extras
 import sys
-import pandas as pd
+import time
+from collections import Counter
 sys.path.append("..")
-from config import DB_CONFIG
+from db_pool import connection, transaction, close_pool
+from db_metrics import instrumented
+from batch_import import (CONTACT_COLUMNS, DEFAULT_CHUNK_SIZE, read_csv_chunks, print_progress,
+                          print_invalid_records)
+from export_contacts import copy_to_csv
+from phone_utils import normalize_phone
+from prepared_statements import execute_prepared
+from buffered_writer import BATCH_SQL, BufferedContactWriter, merge_upserts
+from contact_autocomplete import ContactAutocomplete, load_autocomplete
 
+# Rows fetched per round-trip when streaming from a server-side cursor
+DEFAULT_ITERSIZE = 2000
+
+# Fields update_contact and update_contacts may change
+UPDATABLE_FIELDS = ('first_name', 'last_name', 'phone', 'email')
+
+@instrumented
 class PhoneBook:
-    def __init__(self):
-        self.conn = None
-        self.cur = None
+    """Contacts data access
+    
+    Every call checks out its own connection from the shared pool in
+    db_pool, so one instance can be used from several threads at once.
+    
+    Pass a ContactCache to serve repeated lookups and queries from memory;
+    writes made through this instance invalidate it straight away, and
+    cache.listen() picks up writes made anywhere else.
+    
+    Pass a loaded ContactAutocomplete to keep it up to date with the writes
+    made through this instance; they hand it the rows they changed, so it
+    never has to query for them.
+    """
+    def __init__(self, cache=None, autocomplete=None):
+        self.cache = cache
+        self.autocomplete = autocomplete
         
     def connect(self):
         """Connect to the PostgreSQL database server"""
         try:
-            self.conn = psycopg2.connect(**DB_CONFIG)
-            self.cur = self.conn.cursor()
+            with connection():
+                pass
             print("Connected to the database")
             return True
         except (Exception, psycopg2.DatabaseError) as error:
@@ -23,91 +53,247 @@ class PhoneBook:
             return False
             
     def disconnect(self):
-        """Close database connection"""
-        if self.cur is not None:
-            self.cur.close()
-        if self.conn is not None:
-            self.conn.close()
-            print("Database connection closed.")
+        """Close the shared connection pool"""
+        close_pool()
+        print("Database connection closed.")
+
+    def invalidate(self, first_names=(), phones=()):
+        """Pass the contact keys a committed write touched to the cache"""
+        if self.cache:
+            self.cache.invalidate(first_names=first_names, phones=phones)
+
+    def reindex(self, changed=(), deleted=()):
+        """Apply the rows a write returned to the autocomplete index
+        
+        Called inside the write's transaction, while its rows are still
+        locked, so two writes to the same contact reach the index in the
+        order they commit. Should the commit itself fail, the index shows
+        the write until the next load().
+        """
+        if self.autocomplete:
+            self.autocomplete.apply(changed=changed, deleted=deleted)
 
     def insert_contact(self, first_name, last_name, phone, email=None):
-        """Insert a new contact into the contacts table"""
-        sql = """
-        INSERT INTO contacts(first_name, last_name, phone, email)
-        VALUES(%s, %s, %s, %s)
-        RETURNING id;
+        """Insert a new contact into the contacts table
+        
+        A contact with the same first and last name is left as it is; use
+        AdvancedPhoneBook.upsert_contact to update it instead.
+        
+        Returns:
+            The new contact's id, or None if it already exists or the
+            insert failed
         """
         try:
-            self.cur.execute(sql, (first_name, last_name, phone, email))
-            contact_id = self.cur.fetchone()[0]
-            self.conn.commit()
+            with transaction() as cur:
+                execute_prepared(cur, 'insert_contact', (first_name, last_name, phone, email))
+                row = cur.fetchone()
+                if row is not None:
+                    self.reindex(changed=[(row[0], first_name, last_name, normalize_phone(phone))])
+            if row is None:
+                print(f"Contact already exists: {first_name} {last_name}")
+                return None
+            contact_id = row[0]
+            self.invalidate(first_names=[first_name], phones=[normalize_phone(phone)])
             print(f"Contact added with ID: {contact_id}")
             return contact_id
         except (Exception, psycopg2.DatabaseError) as error:
-            self.conn.rollback()
             print(f"Error inserting contact: {error}")
             return None
 
-    def import_from_csv(self, file_path):
-        """Import contacts from a CSV file"""
+    def buffered_writer(self, **options):
+        """Return a write-behind writer for adding many contacts
+        
+        Use it as a context manager and call insert() or upsert() on it;
+        contacts are written in batches instead of one commit per call.
+        Options are passed to BufferedContactWriter.
+        """
+        return BufferedContactWriter(cache=self.cache, autocomplete=self.autocomplete, **options)
+        
+    def import_from_csv(self, file_path, chunk_size=DEFAULT_CHUNK_SIZE):
+        """Import contacts from a CSV file
+        
+        The file is read chunk_size rows at a time and each chunk is
+        upserted by one multi-row INSERT ... ON CONFLICT, committed before
+        the next is read. A contact that already exists, or appears again
+        later in the file, is updated rather than rejected. Phone numbers
+        are accepted in any formatting normalize_phone understands, such as
+        '+1-555-123-4567', and stored as written; rows with anything else
+        are reported and skipped. A chunk the database rejects is reported
+        and the import goes on with the next one.
+        """
+        sql = BATCH_SQL['upsert'] + " RETURNING (xmax = 0)"
         try:
-            df = pd.read_csv(file_path)
-            print(f"Importing {len(df)} contacts from {file_path}...")
-            
-            for index, row in df.iterrows():
-                first_name = row['first_name']
-                last_name = row['last_name']
-                phone = row['phone']
-                email = row['email'] if 'email' in row and pd.notna(row['email']) else None
-                
-                self.insert_contact(first_name, last_name, phone, email)
-                
-            print("CSV import completed.")
+            print(f"Importing contacts from {file_path}...")
+            total = inserted = updated = invalid = failed = 0
+            started = time.perf_counter()
+
+            for records in read_csv_chunks(file_path, chunk_size):
+                valid, invalid_records = [], []
+                for record in records:
+                    if normalize_phone(record[2]) is None:
+                        invalid_records.append(dict(
+                            zip(CONTACT_COLUMNS, record), reason='Invalid phone number format'))
+                    else:
+                        valid.append(record)
+                if valid:
+                    try:
+                        with transaction() as cur:
+                            rows = merge_upserts(valid)
+                            results = psycopg2.extras.execute_values(
+                                cur, sql, rows, page_size=len(rows), fetch=True)
+                        # A valid row either creates its contact or updates
+                        # one, possibly created earlier in the same file
+                        created = sum(1 for row in results if row[0])
+                        inserted += created
+                        updated += len(valid) - created
+                    except (Exception, psycopg2.DatabaseError) as error:
+                        print()
+                        print(f"Error importing rows {total + 1}-{total + len(records)}: {error}")
+                        failed += len(valid)
+                if invalid_records:
+                    print()
+                    print_invalid_records(invalid_records)
+
+                total += len(records)
+                invalid += len(invalid_records)
+                print_progress(total, started)
+
+            print()
+            print(f"CSV import completed. {inserted} contact(s) inserted, {updated} updated, "
+                  f"{invalid} invalid, {failed} failed.")
         except Exception as error:
+            print()
             print(f"Error importing from CSV: {error}")
+        finally:
+            if self.cache:
+                self.cache.clear()
+            if self.autocomplete:
+                self.autocomplete.clear()
 
     def update_contact(self, identifier, field, value):
         """Update a contact's information
         
         Args:
-            identifier: The username (first_name) or phone number to identify the contact
+            identifier: The username (first_name) or phone number to identify the contact;
+                phone numbers match however they are formatted
             field: The field to update (first_name, last_name, phone, email)
             value: The new value
         """
+        # field is part of the SQL text, so only known columns may get there
+        if field not in UPDATABLE_FIELDS:
+            print(f"Cannot update field: {field}")
+            return
+
         # First, check if we're looking up by name or phone
-        if identifier.startswith('+') or identifier.isdigit():
-            lookup_field = "phone"
-        else:
-            lookup_field = "first_name"
-            
+        lookup_field, lookup_value = self.lookup_key(identifier)
+
+        # Return the keys before and after, so both can be dropped from the cache
         sql = f"""
-        UPDATE contacts
+        UPDATE contacts c
         SET {field} = %s
-        WHERE {lookup_field} = %s
+        FROM (
+            SELECT id, first_name, phone_normalized FROM contacts
+            WHERE {lookup_field} = %s
+            FOR UPDATE
+        ) old
+        WHERE c.id = old.id
+        RETURNING old.first_name, old.phone_normalized, c.first_name, c.phone_normalized,
+                  c.id, c.last_name
         """
         try:
-            self.cur.execute(sql, (value, identifier))
-            count = self.cur.rowcount
-            self.conn.commit()
+            with transaction() as cur:
+                cur.execute(sql, (value, lookup_value))
+                changed = cur.fetchall()
+                count = cur.rowcount
+                self.reindex(changed=[(row[4], row[2], row[5], row[3]) for row in changed])
+            self.invalidate(
+                first_names=[row[0] for row in changed] + [row[2] for row in changed],
+                phones=[row[1] for row in changed] + [row[3] for row in changed]
+            )
             if count:
                 print(f"Contact updated successfully. {count} record(s) modified.")
             else:
                 print(f"No contact found with {lookup_field} = {identifier}")
         except (Exception, psycopg2.DatabaseError) as error:
-            self.conn.rollback()
             print(f"Error updating contact: {error}")
     
-    def query_contacts(self, filters=None):
-        """Query contacts with optional filters
+    def update_contacts(self, updates):
+        """Apply many updates in one statement and one transaction
+        
+        Updates are applied in order, later values winning, whether they
+        name the same identifier or different identifiers that match the
+        same contact; such a contact is updated once, with every change,
+        and counts for each identifier that matched it.
         
         Args:
-            filters: Dictionary with field:value pairs to filter results
+            updates: Iterable of (identifier, field, value) tuples, with
+                identifier and field as in update_contact
+        
+        Returns:
+            Dictionary of identifier: number of contacts updated, or None
+            if the batch failed and nothing was changed
+        """
+        rows = []
+        identifiers = {}
+        for n, (identifier, field, value) in enumerate(updates):
+            if field not in UPDATABLE_FIELDS:
+                raise ValueError(f"Cannot update field: {field}")
+            if identifier not in identifiers:
+                identifiers[identifier] = self.lookup_key(identifier)
+            lookup_field, lookup_value = identifiers[identifier]
+            name = lookup_value if lookup_field == 'first_name' else None
+            phone = lookup_value if lookup_field == 'phone_normalized' else None
+            rows.append((n, identifier, name, phone, field, value))
+        if not rows:
+            return {}
+            
+        # merged has one row per matched contact: its keys before the
+        # update, so both can be dropped from the cache, the identifiers
+        # that matched it, and all their changes folded in input order. Each
+        # field changes only where its key is present in those changes.
+        assignments = ",\n            ".join(
+            f"{field} = CASE WHEN m.changes ? '{field}' THEN m.changes->>'{field}' ELSE c.{field} END"
+            for field in UPDATABLE_FIELDS)
+        sql = f"""
+        UPDATE contacts c
+        SET {assignments}
+        FROM (
+            SELECT old.id, old.first_name, old.phone_normalized,
+                   array_agg(DISTINCT v.identifier) AS identifiers,
+                   jsonb_object_agg(v.field, v.value ORDER BY v.n) AS changes
+            FROM (VALUES %s) AS v(n, identifier, first_name, phone_normalized, field, value)
+            JOIN contacts old
+              ON old.first_name = v.first_name OR old.phone_normalized = v.phone_normalized
+            GROUP BY old.id, old.first_name, old.phone_normalized
+        ) m
+        WHERE c.id = m.id
+        RETURNING m.identifiers, m.first_name, m.phone_normalized, c.first_name, c.phone_normalized,
+                  c.id, c.last_name
         """
+        try:
+            with transaction() as cur:
+                changed = psycopg2.extras.execute_values(
+                    cur, sql, rows, template="(%s, %s, %s::varchar, %s::varchar, %s, %s::text)",
+                    page_size=len(rows), fetch=True)
+                self.reindex(changed=[(row[5], row[3], row[6], row[4]) for row in changed])
+        except (Exception, psycopg2.DatabaseError) as error:
+            print(f"Error updating contacts: {error}")
+            return None
+            
+        self.invalidate(
+            first_names=[row[1] for row in changed] + [row[3] for row in changed],
+            phones=[row[2] for row in changed] + [row[4] for row in changed]
+        )
+        counts = Counter(identifier for row in changed for identifier in row[0])
+        return {identifier: counts[identifier] for identifier in identifiers}
+    
+    def contacts_query(self, filters=None):
+        """Build the SQL and parameters for a filtered contacts query"""
         sql = "SELECT id, first_name, last_name, phone, email, created_at FROM contacts"
+        values = []
         
         if filters:
             conditions = []
-            values = []
             
             for field, value in filters.items():
                 if value:
@@ -116,70 +302,198 @@ class PhoneBook:
                     
             if conditions:
                 sql += " WHERE " + " AND ".join(conditions)
+                
+        return sql, values
+    
+    def query_contacts(self, filters=None):
+        """Query contacts with optional filters
         
-            try:
-                self.cur.execute(sql, values)
-            except (Exception, psycopg2.DatabaseError) as error:
-                print(f"Error querying contacts: {error}")
-                return []
-        else:
-            try:
-                self.cur.execute(sql)
-            except (Exception, psycopg2.DatabaseError) as error:
-                print(f"Error querying contacts: {error}")
-                return []
+        Args:
+            filters: Dictionary with field:value pairs to filter results
+        """
+        sql, values = self.contacts_query(filters)
+        
+        def load():
+            with transaction() as cur:
+                cur.execute(sql, values)
+                return cur.fetchall()
+        
+        try:
+            if self.cache:
+                key = ('query', tuple(sorted((f, v) for f, v in (filters or {}).items() if v)))
+                return self.cache.get_or_load(key, load)
+            return load()
+        except (Exception, psycopg2.DatabaseError) as error:
+            print(f"Error querying contacts: {error}")
+            return []
+    
+    def lookup_key(self, identifier):
+        """Return the (column, value) pair that finds contacts by identifier
+        
+        Phone numbers are matched on phone_normalized, one index probe
+        whatever formatting was used; anything else is a first name.
+        """
+        phone = normalize_phone(identifier)
+        if phone is not None:
+            return "phone_normalized", phone
+        return "first_name", identifier
+    
+    def lookup_contact(self, identifier):
+        """Get the contacts with an exact first name or phone number
+        
+        Args:
+            identifier: The username (first_name) or phone number to look up
+        """
+        lookup_field, lookup_value = self.lookup_key(identifier)
+        kind = 'phone' if lookup_field == 'phone_normalized' else 'name'
+        
+        def load():
+            with transaction() as cur:
+                execute_prepared(cur, f'lookup_by_{kind}', (lookup_value,))
+                return cur.fetchall()
+        
+        try:
+            if self.cache:
+                return self.cache.get_or_load((kind, lookup_value), load)
+            return load()
+        except (Exception, psycopg2.DatabaseError) as error:
+            print(f"Error looking up contact: {error}")
+            return []
+    
+    def iter_contacts(self, filters=None, itersize=DEFAULT_ITERSIZE):
+        """Stream contacts with optional filters
         
-        rows = self.cur.fetchall()
-        return rows
+        Rows come from a server-side cursor, itersize at a time, and are
+        yielded as they arrive, so memory use stays constant however many
+        rows match and the first row is available immediately. The pooled
+        connection is held until the generator is exhausted or closed.
+        
+        Args:
+            filters: Dictionary with field:value pairs to filter results
+            itersize: Number of rows fetched from the server per round-trip
+        """
+        sql, values = self.contacts_query(filters)
+        
+        try:
+            with transaction(name='contacts_stream') as cur:
+                cur.itersize = itersize
+                cur.execute(sql, values)
+                for row in cur:
+                    yield row
+        except (Exception, psycopg2.DatabaseError) as error:
+            print(f"Error querying contacts: {error}")
+    
+    def export_contacts(self, output, filters=None, compress=None, compress_level=1):
+        """Export contacts with optional filters to CSV using COPY
+        
+        Args:
+            output: File path, '-' for stdout, or a writable binary file object
+            filters: Dictionary with field:value pairs to filter results
+            compress: gzip the output; defaults to True for paths ending in .gz
+            compress_level: gzip level, 1 (fastest) to 9 (smallest)
+        
+        Returns:
+            Tuple (rows, bytes) with the number of rows and uncompressed CSV bytes
+        """
+        sql, values = self.contacts_query(filters)
+        return copy_to_csv(output, sql, values, compress, compress_level)
     
     def delete_contact(self, identifier):
         """Delete a contact by username or phone
         
         Args:
-            identifier: The username (first_name) or phone number to identify the contact
+            identifier: The username (first_name) or phone number to identify the contact;
+                phone numbers match however they are formatted
         """
         # Determine if we're looking up by name or phone
-        if identifier.startswith('+') or identifier.isdigit():
-            lookup_field = "phone"
-        else:
-            lookup_field = "first_name"
+        lookup_field, lookup_value = self.lookup_key(identifier)
+        kind = 'phone' if lookup_field == 'phone_normalized' else 'name'
             
-        sql = f"""
-        DELETE FROM contacts
-        WHERE {lookup_field} = %s
-        """
         try:
-            self.cur.execute(sql, (identifier,))
-            count = self.cur.rowcount
-            self.conn.commit()
+            with transaction() as cur:
+                execute_prepared(cur, f'delete_by_{kind}', (lookup_value,))
+                deleted = cur.fetchall()
+                count = cur.rowcount
+                self.reindex(deleted=[row[2] for row in deleted])
+            self.invalidate(
+                first_names=[row[0] for row in deleted],
+                phones=[row[1] for row in deleted]
+            )
             if count:
                 print(f"Contact deleted successfully. {count} record(s) removed.")
             else:
                 print(f"No contact found with {lookup_field} = {identifier}")
         except (Exception, psycopg2.DatabaseError) as error:
-            self.conn.rollback()
             print(f"Error deleting contact: {error}")
+    
+    def delete_contacts(self, identifiers):
+        """Delete the contacts for many identifiers in one statement
+        
+        Matches as the delete_contacts_by_identifiers database function
+        does: every identifier is compared with first names, and one that
+        looks like a phone number with normalized phones too.
+        
+        Args:
+            identifiers: Iterable of usernames (first_name) or phone numbers,
+                as in delete_contact
+        
+        Returns:
+            Dictionary of identifier: number of contacts deleted, or None
+            if the batch failed and nothing was deleted
+        """
+        keys = {identifier: normalize_phone(identifier) for identifier in identifiers}
+        if not keys:
+            return {}
+        phones = [phone for phone in keys.values() if phone is not None]
+        
+        sql = """
+        DELETE FROM contacts
+        WHERE first_name = ANY(%s) OR phone_normalized = ANY(%s)
+        RETURNING first_name, phone_normalized, id
+        """
+        try:
+            with transaction() as cur:
+                cur.execute(sql, (list(keys), phones))
+                deleted = cur.fetchall()
+                self.reindex(deleted=[row[2] for row in deleted])
+        except (Exception, psycopg2.DatabaseError) as error:
+            print(f"Error deleting contacts: {error}")
+            return None
             
-    def print_contacts(self, contacts):
-        """Pretty print contacts list"""
-        if not contacts:
-            print("No contacts found.")
-            return
+        self.invalidate(
+            first_names=[row[0] for row in deleted],
+            phones=[row[1] for row in deleted]
+        )
+        # A contact matching an identifier by both name and phone counts once
+        by_name = Counter(row[0] for row in deleted)
+        by_phone = Counter(row[1] for row in deleted)
+        by_both = Counter((row[0], row[1]) for row in deleted)
+        return {identifier: by_name[identifier] + by_phone[phone] - by_both[(identifier, phone)]
+                for identifier, phone in keys.items()}
             
-        print("\nContact List:")
-        print("{:<5} {:<15} {:<15} {:<20} {:<30} {:<20}".format(
-            "ID", "First Name", "Last Name", "Phone", "Email", "Created At"))
-        print("-" * 100)
-        
+    def print_contacts(self, contacts):
+        """Pretty print contacts, from a list or lazily from iter_contacts"""
+        count = 0
         for contact in contacts:
+            if count == 0:
+                print("\nContact List:")
+                print("{:<5} {:<15} {:<15} {:<20} {:<30} {:<20}".format(
+                    "ID", "First Name", "Last Name", "Phone", "Email", "Created At"))
+                print("-" * 100)
+            count += 1
+            
             id, first_name, last_name, phone, email, created_at = contact
             print("{:<5} {:<15} {:<15} {:<20} {:<30} {:<20}".format(
                 id, first_name, last_name, phone, email or '', created_at.strftime('%Y-%m-%d %H:%M:%S') if created_at else ''))
+            
+        if count == 0:
+            print("No contacts found.")
 
 def main():
-    phonebook = PhoneBook()
+    phonebook = PhoneBook(autocomplete=ContactAutocomplete())
     if not phonebook.connect():
         return
+    load_autocomplete(phonebook.autocomplete)
     
     while True:
         print("\nPhoneBook Application")
@@ -189,9 +503,10 @@ def main():
         print("4. Search contacts")
         print("5. List all contacts")
         print("6. Delete contact")
+        print("7. Export contacts to CSV")
         print("0. Exit")
         
-        choice = input("\nEnter your choice (0-6): ")
+        choice = input("\nEnter your choice (0-7): ")
         
         if choice == '1':
             first_name = input("Enter first name: ")
@@ -242,17 +557,28 @@ def main():
             if phone:
                 filters['phone'] = phone
                 
-            contacts = phonebook.query_contacts(filters)
+            contacts = phonebook.iter_contacts(filters)
             phonebook.print_contacts(contacts)
             
         elif choice == '5':
-            contacts = phonebook.query_contacts()
+            contacts = phonebook.iter_contacts()
             phonebook.print_contacts(contacts)
             
         elif choice == '6':
             identifier = input("Enter first name or phone number of contact to delete: ")
             phonebook.delete_contact(identifier)
             
+        elif choice == '7':
+            file_path = input("Enter the output file path (.gz to compress): ")
+            try:
+                started = time.perf_counter()
+                rows, size = phonebook.export_contacts(file_path)
+                elapsed = time.perf_counter() - started
+                print(f"Exported {rows} contacts to {file_path} in {elapsed:.2f}s "
+                      f"({size / (1024 * 1024) / elapsed:.1f} MB/sec).")
+            except (Exception, psycopg2.DatabaseError) as error:
+                print(f"Error exporting contacts: {error}")
+            
         elif choice == '0':
             break
             
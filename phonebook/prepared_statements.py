@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+
+CONTACT_COLUMNS = "id, first_name, last_name, phone, email, created_at"
+
+# Hot statements, prepared once per pooled connection the first time they
+# run on it: name -> (parameter types, statement). Postgres then skips
+# parsing and, after a few executions, planning on every later call.
+STATEMENTS = {
+    'insert_contact': (
+        "varchar, varchar, varchar, varchar",
+        """
+        INSERT INTO contacts(first_name, last_name, phone, email)
+        VALUES ($1, $2, $3, $4)
+        ON CONFLICT (first_name, last_name) DO NOTHING
+        RETURNING id
+        """
+    ),
+    'lookup_by_phone': (
+        "varchar",
+        f"SELECT {CONTACT_COLUMNS} FROM contacts WHERE phone_normalized = $1 ORDER BY id"
+    ),
+    'lookup_by_name': (
+        "varchar",
+        f"SELECT {CONTACT_COLUMNS} FROM contacts WHERE first_name = $1 ORDER BY id"
+    ),
+    'delete_by_phone': (
+        "varchar",
+        "DELETE FROM contacts WHERE phone_normalized = $1 RETURNING first_name, phone_normalized, id"
+    ),
+    'delete_by_name': (
+        "varchar",
+        "DELETE FROM contacts WHERE first_name = $1 RETURNING first_name, phone_normalized, id"
+    ),
+    # The body of the get_contacts_paginated function; going through the
+    # function adds a call per page that preparing it does not remove
+    'get_contacts_paginated': (
+        "integer, integer",
+        f"SELECT {CONTACT_COLUMNS} FROM contacts ORDER BY id LIMIT $1 OFFSET $2"
+    ),
+}
+
+def execute_prepared(cur, name, params=()):
+    """Run a registered statement on cur, preparing it on first use
+
+    The connection must come from the db_pool pool, which records what has
+    been prepared on it. PREPARE is not undone by a rollback, so a
+    statement stays prepared whatever happens to the transaction.
+    """
+    conn = cur.connection
+    if name not in conn.prepared:
+        types, sql = STATEMENTS[name]
+        cur.execute(f"PREPARE {name} ({types}) AS {sql}")
+        conn.prepared.add(name)
+    if params:
+        cur.execute("EXECUTE {} ({})".format(name, ", ".join(["%s"] * len(params))), params)
+    else:
+        cur.execute(f"EXECUTE {name}")
@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+
+import argparse
+import random
+import timeit
+from levels import create_levels
+from grid import EMPTY, SNAKE, bake_walls
+
+DEFAULT_BOARDS = ['40x30', '400x300', '2000x2000']
+DEFAULT_LENGTHS = [5, 100, 1000, 10000]
+
+def serpentine(width, height, length):
+    """Positions of a snake of the given length folded back and forth across the board"""
+    positions = []
+    for y in range(height):
+        row = range(width) if y % 2 == 0 else range(width - 1, -1, -1)
+        for x in row:
+            positions.append((x, y))
+            if len(positions) == length:
+                return positions
+    raise ValueError(f"A snake of {length} does not fit a {width}x{height} board")
+
+def time_checks(check, heads, repeat):
+    """Best time per check in ns over repeat runs through heads"""
+    timer = timeit.Timer(lambda: [check(head) for head in heads])
+    return min(timer.repeat(repeat, 1)) / len(heads) * 1e9
+
+def compare(width, height, length, walls, checks, repeat, rng):
+    """Time the list scans Game used against the occupancy grid"""
+    positions = serpentine(width, height, length)
+    grid = bake_walls(width, height, walls)
+    # The engine checks the new head before marking it, so it is not on the grid
+    for position in positions[1:]:
+        grid.set(position, SNAKE)
+    # Heads anywhere on the board, so hits and misses are both measured
+    heads = [(rng.randrange(width), rng.randrange(height)) for _ in range(checks)]
+
+    def list_check(head):
+        return head in positions[1:] or head in walls
+
+    def grid_check(head):
+        return grid.get(head) != EMPTY
+
+    # Both must agree before either is timed
+    assert [list_check(head) for head in heads] == [grid_check(head) for head in heads]
+    return time_checks(list_check, heads, repeat), time_checks(grid_check, heads, repeat)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare list-scan and occupancy-grid collision checks")
+    parser.add_argument("--boards", nargs="+", default=DEFAULT_BOARDS,
+                        help="board sizes as WIDTHxHEIGHT (default: 40x30 400x300 2000x2000)")
+    parser.add_argument("--lengths", nargs="+", type=int, default=DEFAULT_LENGTHS,
+                        help="snake lengths (default: 5 100 1000 10000)")
+    parser.add_argument("--level", type=int, default=4, help="level whose walls are used (default: 4)")
+    parser.add_argument("--checks", type=int, default=2000, help="collision checks per run (default: 2000)")
+    parser.add_argument("--repeat", type=int, default=5, help="runs per measurement, best kept (default: 5)")
+    parser.add_argument("--seed", type=int, default=42, help="random seed (default: 42)")
+    args = parser.parse_args()
+
+    walls = create_levels()[args.level - 1].get_walls()
+    rng = random.Random(args.seed)
+    print(f"{len(walls)} walls from level {args.level}\n")
+    print("{:<12} {:>8} {:>14} {:>14} {:>9}".format("Board", "Length", "List ns/check", "Grid ns/check", "Speedup"))
+    print("-" * 61)
+    for board in args.boards:
+        width, height = (int(size) for size in board.split('x'))
+        for length in args.lengths:
+            if length > width * height:
+                continue
+            list_ns, grid_ns = compare(width, height, length, walls, args.checks, args.repeat, rng)
+            print("{:<12} {:>8} {:>14.0f} {:>14.0f} {:>8.1f}x".format(
+                board, length, list_ns, grid_ns, list_ns / grid_ns))
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+
+import argparse
+import hashlib
+import random
+import time
+from levels import create_levels
+from engine import SnakeEngine, GRID_WIDTH, GRID_HEIGHT, OPPOSITE, UP, DOWN, LEFT, RIGHT
+
+DIRECTIONS = (UP, DOWN, LEFT, RIGHT)
+
+def random_policy(rng):
+    """Turn to a random direction every tick"""
+    def policy(engine):
+        return rng.choice(DIRECTIONS)
+    return policy
+
+def greedy_policy(rng):
+    """Head straight for the food, ignoring walls and the body
+
+    Cheap enough not to hide the engine's cost, and it grows the snake, so
+    eating, level changes and self collisions all happen.
+    """
+    def policy(engine):
+        if engine.food.position is None:
+            return None
+        x, y = engine.snake.get_head_position()
+        food_x, food_y = engine.food.position
+        wanted = []
+        if food_x != x:
+            wanted.append(RIGHT if food_x > x else LEFT)
+        if food_y != y:
+            wanted.append(DOWN if food_y > y else UP)
+        for direction in wanted:
+            if direction != OPPOSITE[engine.snake.direction]:
+                return direction
+        return None
+    return policy
+
+POLICIES = {'random': random_policy, 'greedy': greedy_policy}
+
+def run(engine, policy, ticks):
+    """Step the engine for ticks ticks, starting a new snake after each game over
+
+    Returns a dictionary of counters and a digest of every step's outcome,
+    which must not change for the same seed unless the rules do.
+    """
+    games = eaten = level_ups = longest = 0
+    digest = hashlib.sha256()
+    started = time.perf_counter()
+    for _ in range(ticks):
+        result = engine.step(policy(engine))
+        if result['ate']:
+            eaten += 1
+            digest.update(repr(engine.food.position).encode())
+        if result['level_up']:
+            level_ups += 1
+        if result['game_over']:
+            games += 1
+            longest = max(longest, engine.snake.length)
+            digest.update(repr(engine.snake.get_head_position()).encode())
+            engine.reset()
+    elapsed = time.perf_counter() - started
+    longest = max(longest, engine.snake.length)
+    return {
+        'ticks': ticks,
+        'seconds': elapsed,
+        'ticks_per_sec': ticks / elapsed,
+        'games': games,
+        'eaten': eaten,
+        'level_ups': level_ups,
+        'longest': longest,
+        'digest': digest.hexdigest()[:16]
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the headless snake engine")
+    parser.add_argument("--ticks", type=int, default=500000, help="ticks to simulate (default: 500000)")
+    parser.add_argument("--policy", choices=sorted(POLICIES), default='greedy',
+                        help="how the bot picks its moves (default: greedy)")
+    parser.add_argument("--level", type=int, default=1, help="level to start on (default: 1)")
+    parser.add_argument("--width", type=int, default=GRID_WIDTH, help="board width in cells (default: 40)")
+    parser.add_argument("--height", type=int, default=GRID_HEIGHT, help="board height in cells (default: 30)")
+    parser.add_argument("--seed", type=int, default=42, help="random seed (default: 42)")
+    args = parser.parse_args()
+
+    engine = SnakeEngine(create_levels(), level=args.level, width=args.width, height=args.height, seed=args.seed)
+    policy = POLICIES[args.policy](random.Random(args.seed))
+    result = run(engine, policy, args.ticks)
+
+    print(f"{result['ticks']} ticks in {result['seconds']:.2f}s: {result['ticks_per_sec']:,.0f} ticks/sec")
+    print(f"{result['games']} games, {result['eaten']} food eaten, {result['level_ups']} level ups, "
+          f"longest snake {result['longest']}")
+    print(f"Outcome digest: {result['digest']}")
@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+
+import argparse
+import random
+import time
+from grid import OccupancyGrid, SNAKE
+
+DEFAULT_BOARDS = ['40x30', '400x300', '2000x2000']
+DEFAULT_FILLS = [0.5, 0.9, 0.99, 0.999, 1.0]
+
+# Rejection sampling gives up after this many draws per placement
+MAX_DRAWS = 1000000
+
+def fill_grid(width, height, fill, rng):
+    """Return a grid with the given share of its cells taken by the snake"""
+    cells = bytearray(width * height)
+    taken = round(fill * len(cells))
+    for cell in rng.sample(range(len(cells)), taken):
+        cells[cell] = SNAKE
+    return OccupancyGrid(width, height, cells)
+
+def rejection_sampling(grid, rng):
+    """Draw random cells until one is free, as Food used to
+
+    Membership is a grid lookup here, so only the number of draws is
+    measured, not the list scans the old code did on top.
+    """
+    for draws in range(1, MAX_DRAWS + 1):
+        position = (rng.randrange(grid.width), rng.randrange(grid.height))
+        if grid.is_free(position):
+            return position, draws
+    return None, MAX_DRAWS
+
+def time_placements(place, placements):
+    """Mean time per placement in us, and the largest result of place"""
+    worst = 0
+    started = time.perf_counter()
+    for _ in range(placements):
+        worst = max(worst, place())
+    return (time.perf_counter() - started) / placements * 1e6, worst
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare rejection sampling and free-cell food placement")
+    parser.add_argument("--boards", nargs="+", default=DEFAULT_BOARDS,
+                        help="board sizes as WIDTHxHEIGHT (default: 40x30 400x300 2000x2000)")
+    parser.add_argument("--fills", nargs="+", type=float, default=DEFAULT_FILLS,
+                        help="shares of the board taken (default: 0.5 0.9 0.99 0.999 1.0)")
+    parser.add_argument("--placements", type=int, default=200, help="placements per measurement (default: 200)")
+    parser.add_argument("--seed", type=int, default=42, help="random seed (default: 42)")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    print("{:<12} {:>7} {:>16} {:>12} {:>15}".format(
+        "Board", "Fill", "Rejection us", "Max draws", "Free-cell us"))
+    print("-" * 66)
+    for board in args.boards:
+        width, height = (int(size) for size in board.split('x'))
+        for fill in args.fills:
+            grid = fill_grid(width, height, fill, rng)
+            if len(grid.free):
+                rejection_us, draws = time_placements(lambda: rejection_sampling(grid, rng)[1], args.placements)
+                rejection = f"{rejection_us:>16.1f} {draws:>12}"
+            else:
+                # With no free cell the old loop never ends
+                rejection = f"{'never ends':>16} {'-':>12}"
+            free_us, _ = time_placements(lambda: grid.random_free_position(rng) is not None, args.placements)
+            print("{:<12} {:>7.1%} {} {:>15.2f}".format(board, fill, rejection, free_us))
@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+
+import argparse
+import os
+import random
+import statistics
+import time
+import pygame
+from levels import create_levels
+from engine import SnakeEngine
+from renderer import RENDERERS, WINDOW_WIDTH, WINDOW_HEIGHT
+from benchmark_engine import greedy_policy
+
+def play(renderer_class, screen, fonts, args):
+    """Render args.frames frames of a bot game and return the frame times in ms and the last frame"""
+    engine = SnakeEngine(create_levels(), level=args.level, seed=args.seed)
+    policy = greedy_policy(random.Random(args.seed))
+    renderer = renderer_class(screen, *fonts)
+    times = []
+    for _ in range(args.frames):
+        if engine.step(policy(engine))['game_over']:
+            engine.reset()
+        started = time.perf_counter()
+        renderer.render(engine, False)
+        times.append((time.perf_counter() - started) * 1000)
+        # Keep the window responsive when it is shown
+        pygame.event.pump()
+    return times, pygame.image.tostring(screen, 'RGB')
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare frame times of the full and dirty-rectangle renderers")
+    parser.add_argument("--frames", type=int, default=3000, help="frames per renderer (default: 3000)")
+    parser.add_argument("--level", type=int, default=4, help="level to play, for its walls (default: 4)")
+    parser.add_argument("--seed", type=int, default=42, help="random seed (default: 42)")
+    parser.add_argument("--window", action="store_true",
+                        help="render to a real window instead of SDL's headless dummy driver")
+    args = parser.parse_args()
+
+    if not args.window:
+        os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+    pygame.init()
+    screen = pygame.display.set_mode((WINDOW_WIDTH, WINDOW_HEIGHT))
+    fonts = (pygame.font.SysFont('Arial', 20), pygame.font.SysFont('Arial', 36))
+
+    results = {}
+    frames = {}
+    for name in ('full', 'dirty'):
+        times, frames[name] = play(RENDERERS[name], screen, fonts, args)
+        times.sort()
+        results[name] = statistics.fmean(times)
+        print(f"{name:<6} mean {results[name]:.3f} ms  p50 {statistics.median(times):.3f} ms  "
+              f"p95 {times[int(len(times) * 0.95)]:.3f} ms  max {times[-1]:.3f} ms")
+
+    print(f"\nDirty rectangles are {results['full'] / results['dirty']:.1f}x faster per frame")
+    print(f"Last frames identical: {'yes' if frames['full'] == frames['dirty'] else 'no'}")
+    pygame.quit()
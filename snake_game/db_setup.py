@@ -3,7 +3,7 @@
 import psycopg2
 import sys
 sys.path.append("..")
-from config import DB_CONFIG
+from db_pool import transaction
 
 def create_tables():
     """Create tables in PostgreSQL database for Snake Game"""
@@ -40,27 +40,16 @@ def create_tables():
         """
     )
     
-    conn = None
     try:
-        conn = psycopg2.connect(**DB_CONFIG)
-        cur = conn.cursor()
+        with transaction() as cur:
+            # Create tables
+            for command in commands:
+                cur.execute(command)
         
-        # Create tables
-        for command in commands:
-            cur.execute(command)
-        
-        # Close communication with the PostgreSQL database
-        cur.close()
-        
-        # Commit the changes
-        conn.commit()
         print("Snake Game tables created successfully")
         
     except (Exception, psycopg2.DatabaseError) as error:
         print(f"Error: {error}")
-    finally:
-        if conn is not None:
-            conn.close()
 
 if __name__ == '__main__':
     create_tables() 
\ No newline at end of file
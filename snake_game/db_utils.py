@@ -4,49 +4,58 @@ import psycopg2
 import sys
 import json
 sys.path.append("..")
-from config import DB_CONFIG
+from db_pool import connection, transaction, close_pool
+from db_metrics import instrumented
+from engine import SnakeBody
 
+@instrumented
 class SnakeGameDB:
-    def __init__(self):
-        self.conn = None
-        self.cur = None
-        
+    """Snake game persistence
+    
+    Every call checks out its own connection from the shared pool in
+    db_pool, so one instance can be used from several threads at once.
+    """
     def connect(self):
         """Connect to the PostgreSQL database server"""
         try:
-            self.conn = psycopg2.connect(**DB_CONFIG)
-            self.cur = self.conn.cursor()
+            with connection():
+                pass
             return True
         except (Exception, psycopg2.DatabaseError) as error:
             print(f"Error connecting to the database: {error}")
             return False
             
     def disconnect(self):
-        """Close database connection"""
-        if self.cur is not None:
-            self.cur.close()
-        if self.conn is not None:
-            self.conn.close()
+        """Close the shared connection pool"""
+        close_pool()
 
     def get_or_create_user(self, username):
         """Get user ID by username or create a new user if not exists"""
         # First try to get existing user
         sql = "SELECT id FROM users WHERE username = %s"
         try:
-            self.cur.execute(sql, (username,))
-            user = self.cur.fetchone()
-            
-            if user:
-                return user[0]
-            
-            # If user doesn't exist, create a new user
-            sql = "INSERT INTO users (username) VALUES (%s) RETURNING id"
-            self.cur.execute(sql, (username,))
-            user_id = self.cur.fetchone()[0]
-            self.conn.commit()
+            with transaction() as cur:
+                cur.execute(sql, (username,))
+                user = cur.fetchone()
+                
+                if user:
+                    return user[0]
+                
+                # If user doesn't exist, create a new user; another thread may
+                # create it first, in which case read back its row
+                sql = """
+                INSERT INTO users (username) VALUES (%s)
+                ON CONFLICT (username) DO NOTHING
+                RETURNING id
+                """
+                cur.execute(sql, (username,))
+                user = cur.fetchone()
+                if user is None:
+                    cur.execute("SELECT id FROM users WHERE username = %s", (username,))
+                    user = cur.fetchone()
+                user_id = user[0]
             return user_id
         except (Exception, psycopg2.DatabaseError) as error:
-            self.conn.rollback()
             print(f"Error with user operation: {error}")
             return None
 
@@ -57,8 +66,9 @@ class SnakeGameDB:
         WHERE user_id = %s
         """
         try:
-            self.cur.execute(sql, (user_id,))
-            result = self.cur.fetchone()
+            with transaction() as cur:
+                cur.execute(sql, (user_id,))
+                result = cur.fetchone()
             return result[0] if result and result[0] else 1
         except (Exception, psycopg2.DatabaseError) as error:
             print(f"Error getting user level: {error}")
@@ -71,18 +81,20 @@ class SnakeGameDB:
         WHERE user_id = %s
         """
         try:
-            self.cur.execute(sql, (user_id,))
-            result = self.cur.fetchone()
+            with transaction() as cur:
+                cur.execute(sql, (user_id,))
+                result = cur.fetchone()
             return result[0] if result and result[0] else 0
         except (Exception, psycopg2.DatabaseError) as error:
             print(f"Error getting user score: {error}")
             return 0
             
-    def save_game_state(self, user_id, level, score, snake_positions, food_pos, direction):
+    def save_game_state(self, user_id, level, score, snake_body, food_pos, direction):
         """Save the current game state to the database"""
-        # Convert snake positions list to JSON string
-        snake_x_json = json.dumps([pos[0] for pos in snake_positions])
-        snake_y_json = json.dumps([pos[1] for pos in snake_positions])
+        # Store the SnakeBody as JSON lists of x and y positions
+        snake_x_positions, snake_y_positions = snake_body.to_coordinates()
+        snake_x_json = json.dumps(snake_x_positions)
+        snake_y_json = json.dumps(snake_y_positions)
         
         sql = """
         INSERT INTO user_score (user_id, level, score, snake_x_positions, snake_y_positions, food_x, food_y, direction)
@@ -91,21 +103,20 @@ class SnakeGameDB:
         """
         
         try:
-            self.cur.execute(sql, (
-                user_id, 
-                level, 
-                score, 
-                snake_x_json, 
-                snake_y_json, 
-                food_pos[0], 
-                food_pos[1], 
-                direction
-            ))
-            score_id = self.cur.fetchone()[0]
-            self.conn.commit()
+            with transaction() as cur:
+                cur.execute(sql, (
+                    user_id, 
+                    level, 
+                    score, 
+                    snake_x_json, 
+                    snake_y_json, 
+                    food_pos[0] if food_pos else None, 
+                    food_pos[1] if food_pos else None, 
+                    direction
+                ))
+                score_id = cur.fetchone()[0]
             return score_id
         except (Exception, psycopg2.DatabaseError) as error:
-            self.conn.rollback()
             print(f"Error saving game state: {error}")
             return None
             
@@ -120,8 +131,9 @@ class SnakeGameDB:
         """
         
         try:
-            self.cur.execute(sql, (user_id,))
-            result = self.cur.fetchone()
+            with transaction() as cur:
+                cur.execute(sql, (user_id,))
+                result = cur.fetchone()
             
             if not result:
                 return None
@@ -132,14 +144,14 @@ class SnakeGameDB:
             snake_x_positions = json.loads(snake_x_json)
             snake_y_positions = json.loads(snake_y_json)
             
-            # Combine x and y coordinates into position tuples
-            snake_positions = list(zip(snake_x_positions, snake_y_positions))
+            # Combine x and y coordinates into the snake's body
+            snake_body = SnakeBody(zip(snake_x_positions, snake_y_positions))
             
             return {
                 'level': level,
                 'score': score,
-                'snake_positions': snake_positions,
-                'food_pos': (food_x, food_y),
+                'snake_body': snake_body,
+                'food_pos': (food_x, food_y) if food_x is not None else None,
                 'direction': direction
             }
         except (Exception, psycopg2.DatabaseError) as error:
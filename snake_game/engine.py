@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+
+import random
+from collections import deque
+from grid import EMPTY, WALL, SNAKE, bake_walls
+
+# Board size in cells: an 800x600 window with 20-pixel cells
+GRID_WIDTH = 40
+GRID_HEIGHT = 30
+
+# Directions
+UP = 'UP'
+DOWN = 'DOWN'
+LEFT = 'LEFT'
+RIGHT = 'RIGHT'
+
+MOVES = {UP: (0, -1), DOWN: (0, 1), LEFT: (-1, 0), RIGHT: (1, 0)}
+OPPOSITE = {UP: DOWN, DOWN: UP, LEFT: RIGHT, RIGHT: LEFT}
+
+# Points per food, and points per level needed to unlock the next level
+FOOD_SCORE = 10
+LEVEL_SCORE = 50
+
+class SnakeBody:
+    """Cells of the snake from head to tail
+
+    Kept in a deque, so moving adds the new head and drops the tail in
+    constant time whatever the length.
+    """
+    def __init__(self, positions=()):
+        self.cells = deque(positions)
+
+    def __len__(self):
+        return len(self.cells)
+
+    def __iter__(self):
+        return iter(self.cells)
+
+    def head(self):
+        return self.cells[0]
+
+    def tail(self):
+        return self.cells[-1]
+
+    def push_head(self, position):
+        self.cells.appendleft(position)
+
+    def pop_tail(self):
+        return self.cells.pop()
+
+    def to_coordinates(self):
+        """Return (x positions, y positions) from head to tail, as the database stores them
+
+        SnakeBody(zip(xs, ys)) turns them back into a body.
+        """
+        return [x for x, _ in self.cells], [y for _, y in self.cells]
+
+class Snake:
+    def __init__(self, width=GRID_WIDTH, height=GRID_HEIGHT):
+        self.body = SnakeBody([(width // 2, height // 2)])
+        self.length = 1
+        self.direction = RIGHT
+        self.score = 0
+
+    def get_head_position(self):
+        return self.body.head()
+
+    def turn(self, direction):
+        """Change direction, unless it would turn straight back"""
+        if direction != OPPOSITE[self.direction]:
+            self.direction = direction
+
+    def update(self, width, height):
+        """Move one cell and return the cell the tail left, or None while growing"""
+        x, y = self.get_head_position()
+        dx, dy = MOVES[self.direction]
+
+        # Wrap around the board edges
+        new_head = ((x + dx) % width, (y + dy) % height)
+        self.body.push_head(new_head)
+
+        if len(self.body) > self.length:
+            return self.body.pop_tail()
+        return None
+
+class Food:
+    def __init__(self):
+        self.position = (0, 0)
+
+    def randomize_position(self, rng, grid):
+        """Move to a random empty cell of the grid, or to None if there is none
+
+        Picks straight from the grid's free cells, so it takes the same
+        time on an empty board as on an almost full one.
+        """
+        self.position = grid.random_free_position(rng)
+
+class SnakeEngine:
+    """Snake game rules with no window, clock or database
+
+    The game advances one tick per step(), so it runs as fast as the rules
+    allow: the pygame Game drives it at the level's speed, while bots and
+    tests can step it in a tight loop. With a seed, the same actions always
+    give the same game.
+
+    An occupancy grid holds the walls and the snake, updated as the head
+    moves and the tail follows, so collision checks take the same time
+    whatever the snake's length or the number of walls.
+
+    Args:
+        levels: Levels from levels.create_levels()
+        level: Level number to start on
+        highest_score: Best score so far, kept up to date as the game runs
+        width, height: Board size in cells
+        seed: Seed for food placement; None for a different game every time
+    """
+    def __init__(self, levels, level=1, highest_score=0, width=GRID_WIDTH, height=GRID_HEIGHT, seed=None):
+        self.levels = levels
+        self.width = width
+        self.height = height
+        self.highest_score = highest_score
+        self.rng = random.Random(seed)
+        # Walls of each level, baked into a grid the first time it is played
+        self.wall_grids = {}
+        self.set_level(level)
+        self.reset()
+
+    def set_level(self, level):
+        """Switch to a level; call build_grid() once the snake is in place"""
+        self.level = level
+        self.current_level = self.levels[min(level, len(self.levels)) - 1]
+        self.wall_grid = self.wall_grids.get(self.current_level.number)
+        if self.wall_grid is None:
+            self.wall_grid = self.wall_grids[self.current_level.number] = bake_walls(
+                self.width, self.height, self.current_level.get_walls())
+
+    def build_grid(self):
+        """Start the occupancy grid from the level's walls and add the snake"""
+        self.grid = self.wall_grid.copy()
+        for position in self.snake.body:
+            self.grid.set(position, SNAKE)
+
+    def reset(self):
+        """Start a new snake on the current level"""
+        self.snake = Snake(self.width, self.height)
+        self.build_grid()
+        self.food = Food()
+        self.place_food()
+        self.alive = True
+
+    def place_food(self):
+        """Move the food to a random cell not taken by the snake or a wall
+
+        Once the snake fills every free cell there is no food left to eat.
+        """
+        self.food.randomize_position(self.rng, self.grid)
+
+    def step(self, action=None):
+        """Advance the game by one tick
+
+        Args:
+            action: Direction to turn to before moving, or None to keep going;
+                turning straight back is ignored
+
+        Returns:
+            Dictionary of what happened: ate, level_up and game_over. Once
+            the game is over, reset() starts a new snake.
+        """
+        if not self.alive:
+            raise RuntimeError("Game is over; call reset() to play again")
+        if action is not None:
+            self.snake.turn(action)
+        tail = self.snake.update(self.width, self.height)
+        if tail is not None:
+            # A level change can put a wall under the body; it stays when the tail leaves
+            self.grid.set(tail, self.wall_grid.get(tail))
+        head = self.snake.get_head_position()
+        # The tail has already moved on, so the head may take its cell
+        collided = self.grid.get(head) != EMPTY
+        self.grid.set(head, SNAKE)
+        ate = level_up = False
+
+        # Check for food collision
+        if head == self.food.position:
+            ate = True
+            self.snake.length += 1
+            self.snake.score += FOOD_SCORE
+            if self.snake.score > self.highest_score:
+                self.highest_score = self.snake.score
+
+            # If score reaches a threshold, unlock next level
+            if self.snake.score >= self.level * LEVEL_SCORE and self.level < len(self.levels):
+                self.set_level(self.level + 1)
+                self.build_grid()
+                collided = collided or self.wall_grid.get(head) == WALL
+                level_up = True
+
+            self.place_food()
+
+        # Check for self collision (except the head) and wall collision
+        if collided:
+            self.alive = False
+
+        return {'ate': ate, 'level_up': level_up, 'game_over': not self.alive}
+
+    def state(self):
+        """Return the game state in the form SnakeGameDB saves and loads"""
+        return {
+            'level': self.level,
+            'score': self.snake.score,
+            'snake_body': SnakeBody(self.snake.body),
+            'food_pos': self.food.position,
+            'direction': self.snake.direction
+        }
+
+    def load_state(self, game_state):
+        """Resume a game from a state returned by state() or the database"""
+        self.set_level(game_state['level'])
+        self.snake = Snake(self.width, self.height)
+        self.snake.body = SnakeBody(tuple(position) for position in game_state['snake_body'])
+        self.snake.length = len(self.snake.body)
+        self.snake.score = game_state['score']
+        self.snake.direction = game_state['direction']
+        self.build_grid()
+        self.food.position = tuple(game_state['food_pos']) if game_state['food_pos'] else None
+        self.alive = True
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+
+from array import array
+
+# Cell contents
+EMPTY = 0
+WALL = 1
+SNAKE = 2
+
+class FreeCells:
+    """Indexed set of the empty cells of a grid
+
+    The cells are kept in an array, with each cell's slot in that array,
+    so adding a cell, removing one (the last cell moves into its slot) and
+    picking one at random all take constant time however full the board.
+    """
+    def __init__(self, cells, slots):
+        self.cells = cells
+        self.slots = slots
+
+    def __len__(self):
+        return len(self.cells)
+
+    def __contains__(self, cell):
+        return self.slots[cell] >= 0
+
+    def add(self, cell):
+        if self.slots[cell] < 0:
+            self.slots[cell] = len(self.cells)
+            self.cells.append(cell)
+
+    def remove(self, cell):
+        slot = self.slots[cell]
+        if slot < 0:
+            return
+        last = self.cells.pop()
+        if last != cell:
+            self.cells[slot] = last
+            self.slots[last] = slot
+        self.slots[cell] = -1
+
+    def choice(self, rng):
+        """Return a random free cell, or None if there are none"""
+        if not self.cells:
+            return None
+        return self.cells[rng.randrange(len(self.cells))]
+
+    def copy(self):
+        return FreeCells(array('i', self.cells), array('i', self.slots))
+
+def free_cells_of(cells):
+    """Build the FreeCells of a grid's bytes"""
+    if not any(cells):
+        # Every cell is free and sits in the slot of its own number
+        return FreeCells(array('i', range(len(cells))), array('i', range(len(cells))))
+    free = array('i', (cell for cell, value in enumerate(cells) if value == EMPTY))
+    slots = array('i', [-1]) * len(cells)
+    for slot, cell in enumerate(free):
+        slots[cell] = slot
+    return FreeCells(free, slots)
+
+class OccupancyGrid:
+    """What occupies each cell of the board, one byte per cell
+
+    Cell (x, y) is byte y * width + x, so reading or changing a cell costs
+    the same however long the snake is or however many walls there are.
+    The empty cells are also kept in a FreeCells index, updated by set().
+    """
+    def __init__(self, width, height, cells=None, free=None):
+        self.width = width
+        self.height = height
+        self.cells = bytearray(cells) if cells is not None else bytearray(width * height)
+        self.free = free if free is not None else free_cells_of(self.cells)
+
+    def get(self, position):
+        x, y = position
+        return self.cells[y * self.width + x]
+
+    def set(self, position, value):
+        x, y = position
+        cell = y * self.width + x
+        old = self.cells[cell]
+        if old == value:
+            return
+        self.cells[cell] = value
+        if old == EMPTY:
+            self.free.remove(cell)
+        elif value == EMPTY:
+            self.free.add(cell)
+
+    def is_free(self, position):
+        return self.get(position) == EMPTY
+
+    def random_free_position(self, rng):
+        """Return a random empty (x, y), or None if the board is full"""
+        cell = self.free.choice(rng)
+        if cell is None:
+            return None
+        return cell % self.width, cell // self.width
+
+    def copy(self):
+        return OccupancyGrid(self.width, self.height, self.cells, self.free.copy())
+
+    def count(self, value):
+        """Number of cells holding value"""
+        return self.cells.count(value)
+
+def bake_walls(width, height, walls):
+    """Return a grid with the given walls; walls outside the board are left out"""
+    grid = OccupancyGrid(width, height)
+    for x, y in walls:
+        if 0 <= x < width and 0 <= y < height:
+            grid.set((x, y), WALL)
+    return grid
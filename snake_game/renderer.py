@@ -0,0 +1,246 @@
+#!/usr/bin/env python3
+
+import pygame
+from engine import GRID_WIDTH, GRID_HEIGHT
+from grid import SNAKE, WALL
+
+# Constants
+GRID_SIZE = 20
+WINDOW_WIDTH = GRID_WIDTH * GRID_SIZE
+WINDOW_HEIGHT = GRID_HEIGHT * GRID_SIZE
+
+# Colors
+BLACK = (0, 0, 0)
+WHITE = (255, 255, 255)
+GREEN = (0, 255, 0)
+RED = (255, 0, 0)
+BLUE = (0, 0, 255)
+GRAY = (128, 128, 128)
+
+# Rendered label texts kept by DirtyRectRenderer before starting over
+MAX_CACHED_LABELS = 64
+
+def cell_rect(position):
+    """Window rectangle of a grid cell"""
+    return pygame.Rect(
+        position[0] * GRID_SIZE,
+        position[1] * GRID_SIZE,
+        GRID_SIZE, GRID_SIZE
+    )
+
+class FullRenderer:
+    """Redraws the whole window every frame"""
+    def __init__(self, screen, font, font_large):
+        self.screen = screen
+        self.font = font
+        self.font_large = font_large
+
+    def invalidate(self):
+        """Forget what is on the screen, after something else was drawn over it"""
+
+    def render_cell(self, position, color, surface=None):
+        """Render one grid cell with a white outline and return its rectangle"""
+        if surface is None:
+            surface = self.screen
+        rect = cell_rect(position)
+        pygame.draw.rect(surface, color, rect)
+        pygame.draw.rect(surface, WHITE, rect, 1)
+        return rect
+
+    def render_snake(self, engine):
+        """Render every segment of the snake"""
+        for position in engine.snake.body:
+            self.render_cell(position, GREEN)
+
+    def render_food(self, engine):
+        """Render the food, if there is room left for any"""
+        if engine.food.position is not None:
+            self.render_cell(engine.food.position, RED)
+
+    def render_walls(self, engine, surface=None):
+        """Render the walls for the current level"""
+        for wall_pos in engine.current_level.get_walls():
+            self.render_cell(wall_pos, GRAY, surface)
+
+    def labels(self, engine):
+        """Text shown over the board, as (text, x, y, aligned right)"""
+        return [
+            (f"Score: {engine.snake.score}", 10, 10, False),
+            (f"Level {engine.level}: {engine.current_level.name}", WINDOW_WIDTH - 10, 10, True),
+            (f"High Score: {engine.highest_score}", 10, WINDOW_HEIGHT - 30, False),
+            ("Press 'P' to pause/save", WINDOW_WIDTH - 10, WINDOW_HEIGHT - 30, True)
+        ]
+
+    def label_surface(self, text):
+        return self.font.render(text, True, WHITE)
+
+    def place_label(self, label):
+        """Return the rendered label and the rectangle it is drawn in"""
+        text, x, y, right = label
+        surface = self.label_surface(text)
+        if right:
+            x -= surface.get_width()
+        return surface, surface.get_rect(topleft=(x, y))
+
+    def render_labels(self, engine):
+        for label in self.labels(engine):
+            surface, rect = self.place_label(label)
+            self.screen.blit(surface, rect)
+
+    def render_pause(self):
+        """Dim the board and show the pause message"""
+        # Create a semi-transparent overlay
+        overlay = pygame.Surface((WINDOW_WIDTH, WINDOW_HEIGHT), pygame.SRCALPHA)
+        overlay.fill((0, 0, 0, 128))  # Black with alpha
+        self.screen.blit(overlay, (0, 0))
+
+        paused_text = self.font_large.render("PAUSED", True, WHITE)
+        resume_text = self.font.render("Press 'P' to resume", True, WHITE)
+        saved_text = self.font.render("Game state saved", True, GREEN)
+
+        self.screen.blit(paused_text,
+                        (WINDOW_WIDTH // 2 - paused_text.get_width() // 2,
+                        WINDOW_HEIGHT // 2 - 40))
+        self.screen.blit(resume_text,
+                        (WINDOW_WIDTH // 2 - resume_text.get_width() // 2,
+                        WINDOW_HEIGHT // 2 + 10))
+        self.screen.blit(saved_text,
+                        (WINDOW_WIDTH // 2 - saved_text.get_width() // 2,
+                        WINDOW_HEIGHT // 2 + 40))
+
+    def render(self, engine, paused):
+        """Draw the current frame and put it on the display"""
+        self.screen.fill(BLACK)
+        self.render_snake(engine)
+        self.render_food(engine)
+        self.render_walls(engine)
+        self.render_labels(engine)
+        if paused:
+            self.render_pause()
+        pygame.display.update()
+
+class DirtyRectRenderer(FullRenderer):
+    """Redraws only the cells that changed since the last frame
+
+    The walls of each level are drawn once into a cached background. A
+    normal tick then costs three cells: the new head, the cell the tail
+    left (copied back from the background) and the new food, plus any
+    label whose text changed, and only those rectangles are sent to
+    display.update(). A new snake, a level change or pausing redraws the
+    whole window.
+
+    FullRenderer draws the walls last, so a wall a level change put under
+    the snake shows on top of it; cells are drawn the same way here.
+    """
+    def __init__(self, screen, font, font_large):
+        super().__init__(screen, font, font_large)
+        self.backgrounds = {}
+        self.label_surfaces = {}
+        self.drawn = None
+
+    def invalidate(self):
+        self.drawn = None
+
+    def label_surface(self, text):
+        surface = self.label_surfaces.get(text)
+        if surface is None:
+            if len(self.label_surfaces) >= MAX_CACHED_LABELS:
+                self.label_surfaces.clear()
+            surface = self.label_surfaces[text] = super().label_surface(text)
+        return surface
+
+    def background(self, engine):
+        """Return the level's walls on a black window, drawn the first time it is needed"""
+        background = self.backgrounds.get(engine.current_level.number)
+        if background is None:
+            background = pygame.Surface(self.screen.get_size()).convert(self.screen)
+            background.fill(BLACK)
+            self.render_walls(engine, background)
+            self.backgrounds[engine.current_level.number] = background
+        return background
+
+    def render(self, engine, paused):
+        drawn = self.drawn
+        if (drawn is None or drawn['snake'] is not engine.snake or drawn['paused'] != paused
+                or drawn['level'] != engine.current_level.number):
+            self.redraw(engine, paused)
+            return
+        if paused:
+            # Nothing moves while paused
+            return
+
+        background = self.background(engine)
+        body = engine.snake.body
+        head, tail, food = body.head(), body.tail(), engine.food.position
+        dirty = []
+
+        # The old tail first, in case the head has just moved into its cell
+        if tail != drawn['tail']:
+            rect = cell_rect(drawn['tail'])
+            self.screen.blit(background, rect, rect)
+            dirty.append(rect)
+        dirty.append(self.render_board_cell(engine, head, GREEN))
+        if food != drawn['food'] and food is not None:
+            dirty.append(self.render_board_cell(engine, food, RED))
+
+        # Clear the text of labels that changed
+        labels = self.labels(engine)
+        for old, new in zip(drawn['labels'], labels):
+            if old != new:
+                dirty.append(self.redraw_area(engine, background, self.place_label(old)[1]))
+
+        # Labels are drawn over the board; one touched by a change is drawn
+        # again on a freshly drawn area, since blending it twice would show
+        for label in labels:
+            surface, rect = self.place_label(label)
+            if rect.collidelist(dirty) != -1:
+                dirty.append(self.redraw_area(engine, background, rect))
+                self.screen.blit(surface, rect)
+
+        pygame.display.update(dirty)
+        drawn.update(tail=tail, food=food, labels=labels)
+
+    def redraw(self, engine, paused):
+        """Draw the whole window and remember what is on it"""
+        self.screen.blit(self.background(engine), (0, 0))
+        for position in engine.snake.body:
+            self.render_board_cell(engine, position, GREEN)
+        if engine.food.position is not None:
+            self.render_board_cell(engine, engine.food.position, RED)
+        self.render_labels(engine)
+        if paused:
+            self.render_pause()
+        pygame.display.update()
+        self.drawn = {
+            'snake': engine.snake,
+            'level': engine.current_level.number,
+            'paused': paused,
+            'tail': engine.snake.body.tail(),
+            'food': engine.food.position,
+            'labels': self.labels(engine)
+        }
+
+    def render_board_cell(self, engine, position, color):
+        """Render a snake or food cell, or the wall on it if there is one"""
+        if engine.wall_grid.get(position) == WALL:
+            color = GRAY
+        return self.render_cell(position, color)
+
+    def redraw_area(self, engine, background, area):
+        """Redraw the cells under a window area, without labels, and return the area they cover"""
+        left = max(area.left // GRID_SIZE, 0)
+        top = max(area.top // GRID_SIZE, 0)
+        right = min((area.right - 1) // GRID_SIZE, engine.width - 1)
+        bottom = min((area.bottom - 1) // GRID_SIZE, engine.height - 1)
+        area = pygame.Rect(left * GRID_SIZE, top * GRID_SIZE,
+                           (right - left + 1) * GRID_SIZE, (bottom - top + 1) * GRID_SIZE)
+        self.screen.blit(background, area, area)
+        for y in range(top, bottom + 1):
+            for x in range(left, right + 1):
+                if engine.grid.get((x, y)) == SNAKE:
+                    self.render_board_cell(engine, (x, y), GREEN)
+                elif (x, y) == engine.food.position:
+                    self.render_board_cell(engine, (x, y), RED)
+        return area
+
+RENDERERS = {'full': FullRenderer, 'dirty': DirtyRectRenderer}
@@ -1,113 +1,26 @@
-s#!/usr/bin/env python3
+#!/usr/bin/env python3
 
+import argparse
 import pygame
 import sys
-import random
-import time
 from db_utils import SnakeGameDB
 from levels import create_levels
+from engine import SnakeEngine, UP, DOWN, LEFT, RIGHT
+from renderer import RENDERERS, WINDOW_WIDTH, WINDOW_HEIGHT, BLACK, WHITE, GREEN, RED
 
 # Initialize Pygame
 pygame.init()
 
-# Constants
-WINDOW_WIDTH = 800
-WINDOW_HEIGHT = 600
-GRID_SIZE = 20
-GRID_WIDTH = WINDOW_WIDTH // GRID_SIZE
-GRID_HEIGHT = WINDOW_HEIGHT // GRID_SIZE
-
-# Colors
-BLACK = (0, 0, 0)
-WHITE = (255, 255, 255)
-GREEN = (0, 255, 0)
-RED = (255, 0, 0)
-BLUE = (0, 0, 255)
-GRAY = (128, 128, 128)
-
-# Directions
-UP = 'UP'
-DOWN = 'DOWN'
-LEFT = 'LEFT'
-RIGHT = 'RIGHT'
-
-class Snake:
-    def __init__(self):
-        self.positions = [(GRID_WIDTH // 2, GRID_HEIGHT // 2)]
-        self.length = 1
-        self.direction = RIGHT
-        self.color = GREEN
-        self.score = 0
-        
-    def get_head_position(self):
-        return self.positions[0]
-        
-    def update(self):
-        head = self.get_head_position()
-        x, y = head
-        
-        if self.direction == UP:
-            y -= 1
-        elif self.direction == DOWN:
-            y += 1
-        elif self.direction == LEFT:
-            x -= 1
-        elif self.direction == RIGHT:
-            x += 1
-            
-        # Wrap around screen edges
-        if x < 0:
-            x = GRID_WIDTH - 1
-        elif x >= GRID_WIDTH:
-            x = 0
-        if y < 0:
-            y = GRID_HEIGHT - 1
-        elif y >= GRID_HEIGHT:
-            y = 0
-            
-        new_head = (x, y)
-        self.positions.insert(0, new_head)
-        
-        if len(self.positions) > self.length:
-            self.positions.pop()
-            
-    def render(self, surface):
-        for position in self.positions:
-            rect = pygame.Rect(
-                position[0] * GRID_SIZE,
-                position[1] * GRID_SIZE,
-                GRID_SIZE, GRID_SIZE
-            )
-            pygame.draw.rect(surface, self.color, rect)
-            pygame.draw.rect(surface, WHITE, rect, 1)
-
-class Food:
-    def __init__(self):
-        self.position = (0, 0)
-        self.color = RED
-        self.randomize_position()
-        
-    def randomize_position(self, occupied_positions=None):
-        occupied_positions = occupied_positions if occupied_positions else []
-        while True:
-            self.position = (
-                random.randint(0, GRID_WIDTH - 1),
-                random.randint(0, GRID_HEIGHT - 1)
-            )
-            if self.position not in occupied_positions:
-                break
-    
-    def render(self, surface):
-        rect = pygame.Rect(
-            self.position[0] * GRID_SIZE,
-            self.position[1] * GRID_SIZE,
-            GRID_SIZE, GRID_SIZE
-        )
-        pygame.draw.rect(surface, self.color, rect)
-        pygame.draw.rect(surface, WHITE, rect, 1)
+# Key bindings for the directions
+DIRECTION_KEYS = {
+    pygame.K_UP: UP,
+    pygame.K_DOWN: DOWN,
+    pygame.K_LEFT: LEFT,
+    pygame.K_RIGHT: RIGHT
+}
 
 class Game:
-    def __init__(self, username):
+    def __init__(self, username, renderer='dirty'):
         # Set up the game window
         self.screen = pygame.display.set_mode((WINDOW_WIDTH, WINDOW_HEIGHT))
         pygame.display.set_caption(f"Snake Game - {username}")
@@ -115,9 +28,8 @@ class Game:
         self.font = pygame.font.SysFont('Arial', 20)
         self.font_large = pygame.font.SysFont('Arial', 36)
         
-        # Init game objects
-        self.snake = Snake()
-        self.food = Food()
+        # 'dirty' redraws only the cells that changed, 'full' the whole window
+        self.renderer = RENDERERS[renderer](self.screen, self.font, self.font_large)
         
         # Load game levels
         self.levels = create_levels()
@@ -132,11 +44,13 @@ class Game:
         # User data
         self.username = username
         self.user_id = self.db.get_or_create_user(username)
-        self.level = self.db.get_user_highest_level(self.user_id)
-        self.highest_score = self.db.get_user_highest_score(self.user_id)
         
-        # Initialize level
-        self.current_level = self.levels[min(self.level, len(self.levels)) - 1]
+        # Game rules and state
+        self.engine = SnakeEngine(
+            self.levels,
+            level=self.db.get_user_highest_level(self.user_id),
+            highest_score=self.db.get_user_highest_score(self.user_id)
+        )
         
         # Game state
         self.running = True
@@ -149,31 +63,20 @@ class Game:
         """Try to load the last saved game state"""
         game_state = self.db.load_last_game_state(self.user_id)
         if game_state:
-            # Set level
-            self.level = game_state['level']
-            self.current_level = self.levels[min(self.level, len(self.levels)) - 1]
-            
-            # Set snake position and score
-            self.snake.positions = game_state['snake_positions']
-            self.snake.length = len(self.snake.positions)
-            self.snake.score = game_state['score']
-            self.snake.direction = game_state['direction']
-            
-            # Set food position
-            self.food.position = game_state['food_pos']
-            
+            self.engine.load_state(game_state)
             print(f"Game state loaded for {self.username}!")
             
     def save_game_state(self):
         """Save the current game state to the database"""
         if self.user_id:
+            game_state = self.engine.state()
             self.db.save_game_state(
                 self.user_id,
-                self.level,
-                self.snake.score,
-                self.snake.positions,
-                self.food.position,
-                self.snake.direction
+                game_state['level'],
+                game_state['score'],
+                game_state['snake_body'],
+                game_state['food_pos'],
+                game_state['direction']
             )
             print("Game state saved!")
             
@@ -196,58 +99,18 @@ class Game:
                     if self.paused:
                         self.save_game_state()
                         
-                # Direction controls (prevent 180-degree turns)
-                if not self.paused:
-                    if event.key == pygame.K_UP and self.snake.direction != DOWN:
-                        self.snake.direction = UP
-                    elif event.key == pygame.K_DOWN and self.snake.direction != UP:
-                        self.snake.direction = DOWN
-                    elif event.key == pygame.K_LEFT and self.snake.direction != RIGHT:
-                        self.snake.direction = LEFT
-                    elif event.key == pygame.K_RIGHT and self.snake.direction != LEFT:
-                        self.snake.direction = RIGHT
+                # Direction controls (the engine prevents 180-degree turns)
+                if not self.paused and event.key in DIRECTION_KEYS:
+                    self.engine.snake.turn(DIRECTION_KEYS[event.key])
                         
-    def check_collisions(self):
-        """Check for collisions with food, walls, or self"""
-        head = self.snake.get_head_position()
-        
-        # Check for food collision
-        if head == self.food.position:
-            self.snake.length += 1
-            self.snake.score += 10
-            # Update highest score if needed
-            if self.snake.score > self.highest_score:
-                self.highest_score = self.snake.score
-            
-            # If score reaches a threshold, unlock next level
-            if self.snake.score >= self.level * 50 and self.level < len(self.levels):
-                self.level += 1
-                self.current_level = self.levels[self.level - 1]
-                
-            # Generate new food
-            occupied_positions = self.snake.positions + self.current_level.get_walls()
-            self.food.randomize_position(occupied_positions)
-        
-        # Check for self collision (except the head)
-        if head in self.snake.positions[1:]:
-            self.game_over()
-            return True
-            
-        # Check for wall collision
-        if head in self.current_level.get_walls():
-            self.game_over()
-            return True
-            
-        return False
-        
     def game_over(self):
         """Handle game over state"""
         self.screen.fill(BLACK)
         
         # Display game over message
         game_over_text = self.font_large.render("GAME OVER", True, RED)
-        score_text = self.font.render(f"Final Score: {self.snake.score}", True, WHITE)
-        level_text = self.font.render(f"Level: {self.level}", True, WHITE)
+        score_text = self.font.render(f"Final Score: {self.engine.snake.score}", True, WHITE)
+        level_text = self.font.render(f"Level: {self.engine.level}", True, WHITE)
         restart_text = self.font.render("Press ENTER to restart or ESC to quit", True, WHITE)
         
         self.screen.blit(game_over_text, 
@@ -274,89 +137,31 @@ class Game:
                 if event.type == pygame.KEYDOWN:
                     if event.key == pygame.K_RETURN:
                         # Reset the game
-                        self.snake = Snake()
-                        occupied_positions = self.snake.positions + self.current_level.get_walls()
-                        self.food.randomize_position(occupied_positions)
+                        self.engine.reset()
                         waiting_for_key = False
                     elif event.key == pygame.K_ESCAPE:
                         self.running = False
                         waiting_for_key = False
-    
-    def render_walls(self):
-        """Render the walls for the current level"""
-        for wall_pos in self.current_level.get_walls():
-            rect = pygame.Rect(
-                wall_pos[0] * GRID_SIZE,
-                wall_pos[1] * GRID_SIZE,
-                GRID_SIZE, GRID_SIZE
-            )
-            pygame.draw.rect(self.screen, GRAY, rect)
-            pygame.draw.rect(self.screen, WHITE, rect, 1)
-    
-    def render_ui(self):
-        """Render UI elements"""
-        # Display score
-        score_text = self.font.render(f"Score: {self.snake.score}", True, WHITE)
-        self.screen.blit(score_text, (10, 10))
-        
-        # Display level information
-        level_text = self.font.render(f"Level {self.level}: {self.current_level.name}", True, WHITE)
-        self.screen.blit(level_text, (WINDOW_WIDTH - level_text.get_width() - 10, 10))
-        
-        # Display high score
-        high_score_text = self.font.render(f"High Score: {self.highest_score}", True, WHITE)
-        self.screen.blit(high_score_text, (10, WINDOW_HEIGHT - 30))
-        
-        # Display pause instructions
-        pause_text = self.font.render("Press 'P' to pause/save", True, WHITE)
-        self.screen.blit(pause_text, (WINDOW_WIDTH - pause_text.get_width() - 10, WINDOW_HEIGHT - 30))
-        
-        # Display pause screen if paused
-        if self.paused:
-            # Create a semi-transparent overlay
-            overlay = pygame.Surface((WINDOW_WIDTH, WINDOW_HEIGHT), pygame.SRCALPHA)
-            overlay.fill((0, 0, 0, 128))  # Black with alpha
-            self.screen.blit(overlay, (0, 0))
-            
-            paused_text = self.font_large.render("PAUSED", True, WHITE)
-            resume_text = self.font.render("Press 'P' to resume", True, WHITE)
-            saved_text = self.font.render("Game state saved", True, GREEN)
-            
-            self.screen.blit(paused_text, 
-                            (WINDOW_WIDTH // 2 - paused_text.get_width() // 2, 
-                            WINDOW_HEIGHT // 2 - 40))
-            self.screen.blit(resume_text, 
-                            (WINDOW_WIDTH // 2 - resume_text.get_width() // 2, 
-                            WINDOW_HEIGHT // 2 + 10))
-            self.screen.blit(saved_text, 
-                            (WINDOW_WIDTH // 2 - saved_text.get_width() // 2, 
-                            WINDOW_HEIGHT // 2 + 40))
         
+        # The game over screen covered the board
+        self.renderer.invalidate()
+    
     def run(self):
         """Main game loop"""
         while self.running:
             self.handle_events()
             
             if not self.paused:
-                # Update game state
-                self.snake.update()
-                
-                # Check for collisions
-                if self.check_collisions():
+                # Advance the game by one tick
+                if self.engine.step()['game_over']:
+                    self.game_over()
                     continue  # Restart the loop after game over
             
-            # Render everything
-            self.screen.fill(BLACK)
-            self.snake.render(self.screen)
-            self.food.render(self.screen)
-            self.render_walls()
-            self.render_ui()
-            
-            # Update the display
-            pygame.display.update()
+            # Render the frame and update the display
+            self.renderer.render(self.engine, self.paused)
             
             # Control game speed based on level
-            self.clock.tick(self.current_level.snake_speed)
+            self.clock.tick(self.engine.current_level.snake_speed)
         
         # Cleanup
         self.save_game_state()
@@ -414,6 +219,11 @@ def get_username():
         pygame.display.update()
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Snake game")
+    parser.add_argument("--renderer", choices=sorted(RENDERERS), default='dirty',
+                        help="redraw only changed cells (dirty) or the whole window (full) every frame")
+    args = parser.parse_args()
+    
     username = get_username()
-    game = Game(username)
+    game = Game(username, args.renderer)
     game.run() 
\ No newline at end of file